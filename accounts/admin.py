@@ -1,5 +1,11 @@
-from django.contrib import admin
-from .models import Profile
+from django.contrib import admin, messages
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.http import HttpResponseRedirect
+
+from .forms import ACTIVE_EMAIL_CONSTRAINT, ACTIVE_EMAIL_TAKEN, AdminUserAddForm, AdminUserChangeForm
+from .models import OutboundEmail, Profile
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
@@ -7,3 +13,37 @@ class ProfileAdmin(admin.ModelAdmin):
     list_filter = ['role', 'email_verified']
     search_fields = ['user__username', 'user__email', 'full_name', 'student_id']
     list_editable = ['role', 'email_verified']
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['subject']
+    readonly_fields = ['created_at', 'sent_at']
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class VentUserAdmin(UserAdmin):
+    """Django's user admin, keeping to one active account per email when users are added or reactivated"""
+    form = AdminUserChangeForm
+    add_form = AdminUserAddForm
+    add_fieldsets = (
+        (None, {
+            'classes': ('wide',),
+            'fields': ('username', 'email', 'usable_password', 'password1', 'password2'),
+        }),
+    )
+
+    def changeform_view(self, request, *args, **kwargs):
+        try:
+            return super().changeform_view(request, *args, **kwargs)
+        except IntegrityError as e:
+            # Another account took the email between the form's check and the save
+            if ACTIVE_EMAIL_CONSTRAINT not in str(e):
+                raise
+            self.message_user(request, ACTIVE_EMAIL_TAKEN, messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
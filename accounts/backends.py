@@ -0,0 +1,146 @@
+import functools
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .models import Profile
+
+UserModel = get_user_model()
+
+# What a request needs of the user and profile; the password hash is never cached
+CACHED_USER_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email', 'is_active', 'is_staff', 'is_superuser')
+CACHED_PROFILE_FIELDS = ('id', 'user_id', 'role', 'full_name', 'email_verified')
+
+
+def active_email_q(email):
+    # Served by the LOWER(email) index from accounts.0003; its unique index allows one active match at most
+    return Q(email_lower=email.lower(), is_active=True)
+
+
+def users_by_email(email):
+    """The active user whose email matches case-insensitively, as a queryset"""
+    return UserModel._default_manager.alias(email_lower=Lower('email')).filter(active_email_q(email))
+
+
+def user_cache_key(user_id):
+    return f'accounts:user:{user_id}'
+
+
+def use_user_cache():
+    # Invalidation must reach every process, see CACHE_SHARED
+    return getattr(settings, 'CACHE_SHARED', False)
+
+
+def user_cache_data(user):
+    """The cache entry for a user loaded with its profile"""
+    try:
+        profile = user.profile
+    except Profile.DoesNotExist:
+        profile = None
+    return {
+        'user': {name: getattr(user, name) for name in CACHED_USER_FIELDS},
+        'profile': None if profile is None else {name: getattr(profile, name) for name in CACHED_PROFILE_FIELDS},
+        'session_auth_hash': user.get_session_auth_hash(),
+    }
+
+
+def from_cached_fields(model, db, data):
+    # Fields not cached stay deferred: they load on first access and save() leaves them alone
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in data]
+    return model.from_db(db, names, [data[name] for name in names])
+
+
+def cached_session_auth_hash(user, session_auth_hash):
+    if 'password' in user.get_deferred_fields():
+        return session_auth_hash
+    # The password was loaded, to check or change it, so the hash may have moved on
+    return UserModel.get_session_auth_hash(user)
+
+
+def user_from_cache(data):
+    db = router.db_for_read(UserModel)
+    user = from_cached_fields(UserModel, db, data['user'])
+    user.get_session_auth_hash = functools.partial(cached_session_auth_hash, user, data['session_auth_hash'])
+    if data['profile'] is None:
+        # As select_related records a missing profile, so user.profile raises without a query
+        UserModel.profile.related.set_cached_value(user, None)
+    else:
+        user.profile = from_cached_fields(Profile, db, data['profile'])
+    return user
+
+
+def invalidate_user(user_id):
+    """Drop a cached user now and again once the surrounding transaction commits"""
+    invalidate_users([user_id])
+
+
+def invalidate_users(user_ids):
+    keys = [user_cache_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class ProfileBackend(ModelBackend):
+    """ModelBackend that signs in by username or email and loads the user and profile in one joined query.
+
+    With a shared cache, get_user keeps what a request needs of the user and profile for a short while. authenticate leaves the account it matched, if any, on
+    request.login_candidate so the login view can explain a failure without looking it up again.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        candidates = list(
+            UserModel._default_manager.select_related('profile')
+            .alias(email_lower=Lower('email'))
+            .filter(Q(username=username) | active_email_q(username))[:2]
+        )
+        # An exact username wins over another account's email
+        user = next((candidate for candidate in candidates if candidate.username == username), None)
+        if user is None and candidates:
+            user = candidates[0]
+        if request is not None:
+            request.login_candidate = user
+        if user is None:
+            # Hash anyway so response time does not reveal whether the account exists
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        data = cache.get(key) if use_user_cache() else None
+        if data is not None:
+            user = user_from_cache(data)
+        else:
+            try:
+                user = UserModel._default_manager.select_related('profile').get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            if use_user_cache():
+                cache.set(key, user_cache_data(user), getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # request.auser() (async login_required) comes here; ModelBackend's version would skip the cache
+        key = user_cache_key(user_id)
+        data = await cache.aget(key) if use_user_cache() else None
+        if data is not None:
+            user = user_from_cache(data)
+        else:
+            try:
+                user = await UserModel._default_manager.select_related('profile').aget(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            if use_user_cache():
+                await cache.aset(key, user_cache_data(user), getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+        return user if self.user_can_authenticate(user) else None
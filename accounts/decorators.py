@@ -0,0 +1,47 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect
+
+from .middleware import get_role
+
+
+def request_role(request):
+    if not hasattr(request, 'role'):
+        request.role = get_role(request.user)
+    return request.role
+
+
+async def arequest_role(request):
+    if not hasattr(request, 'role'):
+        request.role = await sync_to_async(get_role)(request.user)
+    return request.role
+
+
+def role_required(test, redirect_to):
+    """Require a logged-in user whose role passes test, otherwise redirect to the named URL"""
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            async def _wrapped_view(request, *args, **kwargs):
+                role = await arequest_role(request)
+                if not test(role):
+                    return redirect(redirect_to)
+                return await view_func(request, *args, **kwargs)
+        else:
+            def _wrapped_view(request, *args, **kwargs):
+                if not test(request_role(request)):
+                    return redirect(redirect_to)
+                return view_func(request, *args, **kwargs)
+        return login_required(wraps(view_func)(_wrapped_view))
+    return decorator
+
+
+def admin_required(view_func):
+    """Only admins; everyone else is sent to the student dashboard"""
+    return role_required(lambda role: role == 'admin', 'student_dashboard')(view_func)
+
+
+def student_required(view_func):
+    """Students and accounts without a profile; admins are sent to their dashboard"""
+    return role_required(lambda role: role != 'admin', 'admin_dashboard')(view_func)
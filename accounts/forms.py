@@ -1,9 +1,16 @@
 from django import forms
-from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, SetPasswordForm
+from django.contrib.auth.forms import (
+    AdminUserCreationForm, UserCreationForm, UserChangeForm, AuthenticationForm, SetPasswordForm,
+)
 from django.contrib.auth.models import User
 from django.db import IntegrityError
+from .backends import users_by_email
 from .models import Profile
 
+# Enforced by the database since accounts.0003
+ACTIVE_EMAIL_CONSTRAINT = 'auth_user_active_email_ci_uniq'
+ACTIVE_EMAIL_TAKEN = 'Another active account already uses this email address. Deactivate it or use a different address.'
+
 class UserRegistrationForm(UserCreationForm):
     email = forms.EmailField(required=True)
     full_name = forms.CharField(max_length=150, required=True)
@@ -24,8 +31,8 @@ class UserRegistrationForm(UserCreationForm):
     def clean_email(self):
         email = self.cleaned_data.get('email')
         if email:
-            # Check if email already exists
-            if User.objects.filter(email=email).exists():
+            # Same LOWER(email) lookup as the accounts.0003 index and constraint
+            if users_by_email(email).exists():
                 raise forms.ValidationError('A user with this email address already exists. Please use a different email or try logging in.')
         return email
 
@@ -64,7 +71,7 @@ class UserRegistrationForm(UserCreationForm):
         return user
 
 class EmailAuthenticationForm(AuthenticationForm):
-    """Custom authentication form that allows login with email or username"""
+    """Custom authentication form that allows login with email or username (resolved by ProfileBackend)"""
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -77,29 +84,6 @@ class EmailAuthenticationForm(AuthenticationForm):
             'class': 'form-control',
             'placeholder': 'Enter password'
         })
-    
-    def clean_username(self):
-        username = self.cleaned_data.get('username')
-        if username:
-            # Check if it's an email format
-            if '@' in username:
-                matching_users = User.objects.filter(email=username)
-                if not matching_users.exists():
-                    # No user with this email; leave as-is so auth machinery can handle
-                    return username
-                if matching_users.count() > 1:
-                    # If multiple users exist with the same email, 
-                    # we need to handle this differently
-                    # For now, we'll use the most recent active user
-                    active_users = matching_users.filter(is_active=True).order_by('-date_joined')
-                    if active_users.exists():
-                        return active_users.first().username
-                    else:
-                        # If no active users, use the most recent one
-                        return matching_users.order_by('-date_joined').first().username
-                # Exactly one user found: map email to that username for auth
-                return matching_users.first().username
-        return username
 
 class PasswordResetForm(forms.Form):
     email = forms.EmailField(
@@ -108,4 +92,29 @@ class PasswordResetForm(forms.Form):
             'class': 'form-control',
             'placeholder': 'Enter your email address'
         })
-    )
\ No newline at end of file
+    )
+
+class ActiveEmailFormMixin:
+    """Reject an email another active account has, which the database would refuse with an IntegrityError"""
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Fields the form leaves out keep the instance's values
+        email = cleaned_data.get('email', self.instance.email)
+        is_active = cleaned_data.get('is_active', self.instance.is_active)
+        if email and is_active:
+            others = users_by_email(email)
+            if self.instance.pk is not None:
+                others = others.exclude(pk=self.instance.pk)
+            if others.exists():
+                raise forms.ValidationError(ACTIVE_EMAIL_TAKEN)
+        return cleaned_data
+
+
+class AdminUserAddForm(ActiveEmailFormMixin, AdminUserCreationForm):
+    class Meta(AdminUserCreationForm.Meta):
+        fields = ('username', 'email')
+
+
+class AdminUserChangeForm(ActiveEmailFormMixin, UserChangeForm):
+    pass
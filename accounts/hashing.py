@@ -0,0 +1,14 @@
+"""Password hashing run in worker processes; importable before Django is set up"""
+import os
+
+import django
+
+
+def init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def hash_password(raw_password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(raw_password)
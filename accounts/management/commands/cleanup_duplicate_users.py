@@ -1,7 +1,23 @@
-from django.core.management.base import BaseCommand
+import json
+import os
+
 from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When, Window
+from django.db.models.functions import FirstValue, Lower, RowNumber
+
+from accounts.backends import invalidate_users
 from accounts.models import Profile
-from collections import Counter
+from complaints import fragments
+from complaints.models import Complaint, ComplaintSearchDocument
+
+# The account that stays active: an active one before inactive ones, then the newest
+KEEPER_ORDER = [F('is_active').desc(), F('date_joined').desc(), F('id').desc()]
+
+
+def window(expression):
+    return Window(expression, partition_by=[Lower('email')], order_by=KEEPER_ORDER)
 
 
 class Command(BaseCommand):
@@ -13,57 +29,139 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be done without actually doing it',
         )
+        parser.add_argument(
+            '--reassign',
+            action='store_true',
+            help="Move the duplicates' complaints, and a profile the kept account lacks, to the kept account",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Duplicate email addresses per transaction')
+        parser.add_argument(
+            '--checkpoint', default='cleanup_duplicate_users.json',
+            help='File recording progress after every batch; removed when the run completes',
+        )
+        parser.add_argument('--resume', action='store_true', help='Continue after the email recorded in --checkpoint')
 
     def handle(self, *args, **options):
+        self.options = options
         dry_run = options['dry_run']
-        
-        # Find all users with emails
-        users_with_emails = User.objects.exclude(email='').exclude(email__isnull=True)
-        emails = [user.email for user in users_with_emails]
-        
-        # Find duplicate emails
-        email_counts = Counter(emails)
-        duplicate_emails = [email for email, count in email_counts.items() if count > 1]
-        
-        if not duplicate_emails:
+        progress = {'last_email': None, 'groups': 0, 'deactivated': 0, 'complaints': 0, 'profiles': 0}
+        if options['resume']:
+            try:
+                with open(options['checkpoint']) as checkpoint:
+                    progress.update(json.load(checkpoint))
+            except FileNotFoundError:
+                raise CommandError(f"No checkpoint at {options['checkpoint']} to resume from")
+            self.stdout.write(f"Resuming after {progress['last_email']}")
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN - No changes will be made'))
+
+        while True:
+            emails = self.duplicate_emails(progress['last_email'], options['batch_size'])
+            if not emails:
+                break
+            with transaction.atomic():
+                counts = self.clean_batch(emails, dry_run)
+            progress['last_email'] = emails[-1]
+            progress['groups'] += len(emails)
+            for name, value in counts.items():
+                progress[name] += value
+            if not dry_run:
+                with open(options['checkpoint'], 'w') as checkpoint:
+                    json.dump(progress, checkpoint)
+            self.stdout.write(
+                f"  {progress['groups']} duplicate addresses, {progress['deactivated']} accounts deactivated "
+                f"(through {progress['last_email']})"
+            )
+
+        if not progress['groups']:
             self.stdout.write(
                 self.style.SUCCESS('No duplicate email addresses found.')
             )
-            return
-        
-        self.stdout.write(
-            self.style.WARNING(f'Found {len(duplicate_emails)} duplicate email addresses:')
+        else:
+            verb = 'Would clean up' if dry_run else 'Cleaned up'
+            summary = f"{verb} {progress['deactivated']} duplicate users across {progress['groups']} email addresses"
+            if options['reassign']:
+                summary += f"; reassigned {progress['complaints']} complaints and {progress['profiles']} profiles"
+            self.stdout.write(self.style.SUCCESS(summary + '.'))
+        if not dry_run and os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+
+    def duplicate_emails(self, after, limit):
+        """Next lower-cased emails shared by more than one account, in key order (GROUP BY ... HAVING)"""
+        groups = User.objects.exclude(email='').annotate(email_key=Lower('email'))
+        if after is not None:
+            groups = groups.filter(email_key__gt=after)
+        return list(
+            groups.values('email_key').annotate(accounts=Count('id')).filter(accounts__gt=1)
+            .order_by('email_key').values_list('email_key', flat=True)[:limit]
         )
-        
-        for email in duplicate_emails:
-            self.stdout.write(f'  - {email}')
-        
+
+    def clean_batch(self, emails, dry_run):
+        # Every account but the first in each address's ranking, with the id of that first account
+        duplicates = list(
+            User.objects.annotate(email_key=Lower('email'))
+            .filter(email_key__in=emails)
+            .annotate(rank=window(RowNumber()), keeper_id=window(FirstValue('id')))
+            .filter(rank__gt=1)
+            .order_by('email_key', 'rank')
+            .values_list('id', 'keeper_id', 'is_active', 'email_key')
+        )
+        active_ids = [user_id for user_id, _, is_active, _ in duplicates if is_active]
+        if self.options['verbosity'] >= 2:
+            for user_id, keeper_id, is_active, email in duplicates:
+                action = 'Deactivating' if is_active else 'Already inactive'
+                self.stdout.write(f'  {email}: {action} ID {user_id}, keeping ID {keeper_id}')
+        counts = {'deactivated': len(active_ids), 'complaints': 0, 'profiles': 0}
         if dry_run:
-            self.stdout.write(
-                self.style.WARNING('\nDRY RUN - No changes will be made')
-            )
-            return
-        
-        # Clean up duplicates
-        cleaned_count = 0
-        for email in duplicate_emails:
-            users = User.objects.filter(email=email).order_by('-date_joined')
-            
-            # Keep the most recent user, deactivate the others
-            keep_user = users.first()
-            users_to_deactivate = users[1:]
-            
-            self.stdout.write(f'\nEmail: {email}')
-            self.stdout.write(f'  Keeping: {keep_user.username} (ID: {keep_user.id}, Created: {keep_user.date_joined})')
-            
-            for user in users_to_deactivate:
-                self.stdout.write(f'  Deactivating: {user.username} (ID: {user.id}, Created: {user.date_joined})')
-                
-                # Deactivate the user instead of deleting to preserve data integrity
-                user.is_active = False
-                user.save()
-                cleaned_count += 1
-        
-        self.stdout.write(
-            self.style.SUCCESS(f'\nCleaned up {cleaned_count} duplicate users.')
+            return counts
+
+        User.objects.filter(pk__in=active_ids).update(is_active=False)
+        touched = set(active_ids)
+        if self.options['reassign']:
+            keepers = {user_id: keeper_id for user_id, keeper_id, _, _ in duplicates}
+            counts['complaints'] = self.reassign_complaints(keepers)
+            counts['profiles'] = self.reassign_profiles(duplicates)
+            touched.update(keepers, keepers.values())
+        invalidate_users(touched)
+        return counts
+
+    def reassign_complaints(self, keepers):
+        moved = list(Complaint.objects.filter(student_id__in=keepers).values_list('id', 'student_id'))
+        if not moved:
+            return 0
+        new_owner = Case(
+            *[When(student_id=user_id, then=Value(keeper_id)) for user_id, keeper_id in keepers.items()],
+            output_field=IntegerField(),
         )
+        Complaint.objects.filter(student_id__in=keepers).update(student_id=new_owner)
+
+        # Search documents carry the owner's username and email
+        complaints_by_keeper = {}
+        for complaint_id, user_id in moved:
+            complaints_by_keeper.setdefault(keepers[user_id], []).append(complaint_id)
+        labels = User.objects.filter(pk__in=complaints_by_keeper).values_list('id', 'username', 'email')
+        ComplaintSearchDocument.objects.filter(complaint_id__in=[complaint_id for complaint_id, _ in moved]).update(
+            student=Case(*[
+                When(complaint_id__in=complaints_by_keeper[user_id], then=Value(f'{username} {email}'))
+                for user_id, username, email in labels
+            ])
+        )
+        fragments.invalidate(*[fragments.user_scope(user_id) for user_id in {*keepers, *keepers.values()}])
+        return len(moved)
+
+    def reassign_profiles(self, duplicates):
+        """Give a kept account without a profile the profile of its best-ranked duplicate that has one"""
+        user_ids = {user_id for user_id, _, _, _ in duplicates} | {keeper_id for _, keeper_id, _, _ in duplicates}
+        with_profile = set(Profile.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        donors = {}
+        for user_id, keeper_id, _, _ in duplicates:
+            if keeper_id not in with_profile and user_id in with_profile:
+                donors[user_id] = keeper_id
+                with_profile.add(keeper_id)
+        if donors:
+            Profile.objects.filter(user_id__in=donors).update(user_id=Case(
+                *[When(user_id=user_id, then=Value(keeper_id)) for user_id, keeper_id in donors.items()],
+                output_field=IntegerField(),
+            ))
+        return len(donors)
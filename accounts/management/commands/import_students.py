@@ -0,0 +1,163 @@
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from accounts.hashing import hash_password, init_worker
+from accounts.models import OutboundEmail, Profile
+from accounts.views import build_verification_email, verification_path
+
+REQUIRED_COLUMNS = ('username', 'email', 'full_name')
+
+
+class Command(BaseCommand):
+    help = 'Create student accounts and profiles from a CSV roster (username,email,full_name[,student_id][,password])'
+
+    def add_arguments(self, parser):
+        parser.add_argument('roster', help='Path to the CSV file, or - to read standard input')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk_create batch')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes used to hash passwords; 1 hashes in this process',
+        )
+        parser.add_argument('--verified', action='store_true', help='Mark imported email addresses as verified')
+        parser.add_argument(
+            '--send-verification', action='store_true',
+            help='Queue a verification email for every imported student (needs --base-url)',
+        )
+        parser.add_argument('--base-url', help='Site address used in emailed links, e.g. https://vent.example.edu')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the roster without creating accounts')
+
+    def handle(self, *args, **options):
+        if options['send_verification'] and not options['base_url']:
+            raise CommandError('--send-verification needs --base-url to build the verification links')
+        if options['send_verification'] and options['verified']:
+            raise CommandError('--send-verification and --verified cannot be combined')
+        self.options = options
+        self.base_url = (options['base_url'] or '').rstrip('/')
+
+        # Everything the roster must not collide with, from one query
+        self.usernames, self.emails, self.student_ids = set(), set(), set()
+        for username, email, student_id in User.objects.values_list('username', Lower('email'), 'profile__student_id'):
+            self.usernames.add(username)
+            if email:
+                self.emails.add(email)
+            if student_id:
+                self.student_ids.add(student_id)
+
+        self.executor = None
+        if options['workers'] > 1 and not options['dry_run']:
+            self.executor = ProcessPoolExecutor(
+                max_workers=options['workers'], initializer=init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'ventsystem.settings'),),
+            )
+
+        created = skipped = 0
+        roster = sys.stdin if options['roster'] == '-' else open(options['roster'], newline='', encoding='utf-8-sig')
+        try:
+            reader = csv.DictReader(roster)
+            missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+            if missing:
+                raise CommandError(f'Roster is missing columns: {", ".join(missing)}')
+            batch = []
+            for row in reader:
+                error = self.validate(row)
+                if error:
+                    self.stdout.write(self.style.WARNING(f'  line {reader.line_num}: {error}; skipped'))
+                    skipped += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= options['batch_size']:
+                    created += self.import_batch(batch)
+                    batch = []
+            if batch:
+                created += self.import_batch(batch)
+        finally:
+            if roster is not sys.stdin:
+                roster.close()
+            if self.executor:
+                self.executor.shutdown()
+
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {created} students; skipped {skipped} rows.'))
+
+    def validate(self, row):
+        """Normalise the row in place and return why it cannot be imported, if anything"""
+        for column in ('username', 'email', 'full_name', 'student_id'):
+            row[column] = (row.get(column) or '').strip()
+        if not all(row[column] for column in REQUIRED_COLUMNS):
+            return 'username, email and full_name are required'
+        try:
+            User.username_validator(row['username'])
+            validate_email(row['email'])
+        except ValidationError as e:
+            return e.messages[0]
+        if len(row['username']) > 150 or len(row['full_name']) > 150 or len(row['student_id']) > 50:
+            return 'a value is too long'
+        email = row['email'].lower()
+        if row['username'] in self.usernames:
+            return f'username {row["username"]} is taken'
+        if email in self.emails:
+            return f'email {row["email"]} is taken'
+        if row['student_id'] and row['student_id'] in self.student_ids:
+            return f'student ID {row["student_id"]} is taken'
+        self.usernames.add(row['username'])
+        self.emails.add(email)
+        if row['student_id']:
+            self.student_ids.add(row['student_id'])
+        return None
+
+    def hash_passwords(self, passwords):
+        """PBKDF2 is CPU-bound, so a batch is split across the worker processes"""
+        if self.executor is None:
+            return [hash_password(password) for password in passwords]
+        chunksize = max(len(passwords) // (self.options['workers'] * 4), 1)
+        return list(self.executor.map(hash_password, passwords, chunksize=chunksize))
+
+    def import_batch(self, rows):
+        if self.options['dry_run']:
+            return len(rows)
+
+        # Rows without a password get an unusable one and sign in after a password reset
+        raw_passwords = [row.get('password') or None for row in rows]
+        hashed = iter(self.hash_passwords([password for password in raw_passwords if password]))
+        passwords = [next(hashed) if password else make_password(None) for password in raw_passwords]
+
+        now = timezone.now()
+        users = [
+            User(username=row['username'], email=row['email'], password=password, date_joined=now)
+            for row, password in zip(rows, passwords)
+        ]
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            if users[0].pk is None:
+                # Not every backend returns primary keys from bulk inserts
+                ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'id'))
+                for user in users:
+                    user.pk = ids[user.username]
+            Profile.objects.bulk_create([
+                Profile(
+                    user=user,
+                    role='student',
+                    student_id=row['student_id'] or None,
+                    full_name=row['full_name'],
+                    email_verified=self.options['verified'],
+                )
+                for user, row in zip(users, rows)
+            ])
+            if self.options['send_verification']:
+                # Queued with the accounts, so a rolled back batch sends nothing
+                OutboundEmail.objects.bulk_create([
+                    build_verification_email(user, self.base_url + verification_path(user)) for user in users
+                ])
+        self.stdout.write(f'  {len(users)} students created')
+        return len(users)
@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound emails in batches over a single mail connection'
+
+    # Seconds between purges of old sent messages when running with --loop
+    purge_interval = 3600
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of messages claimed from the outbox at a time',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=None,
+            help='Maximum messages sent per second (defaults to EMAIL_OUTBOX_RATE_LIMIT)',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=None,
+            help='Attempts before a message is marked failed (defaults to EMAIL_OUTBOX_MAX_ATTEMPTS)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the outbox instead of exiting once it is drained',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait between polls when running with --loop',
+        )
+
+    def handle(self, *args, **options):
+        failures = 0
+        last_purge = None
+        while True:
+            if last_purge is None or time.monotonic() - last_purge >= self.purge_interval:
+                purged = outbox.purge_sent()
+                if purged:
+                    self.stdout.write(f'Purged {purged} sent messages.')
+                last_purge = time.monotonic()
+            try:
+                sent, retried, failed = outbox.drain(
+                    batch_size=options['batch_size'],
+                    rate=options['rate'],
+                    max_attempts=options['max_attempts'],
+                )
+            except outbox.MailServerUnavailable as e:
+                if not options['loop']:
+                    raise CommandError(str(e))
+                failures += 1
+                (sent, retried, failed), delay = e.counts, self.backoff(options['interval'], failures)
+                self.stderr.write(f'{e}; retrying in {delay:.0f}s.')
+            else:
+                failures = 0
+                delay = options['interval']
+            if sent or retried or failed:
+                self.stdout.write(f'Sent {sent}, will retry {retried}, failed {failed}.')
+            if not options['loop']:
+                break
+            time.sleep(delay)
+        self.stdout.write(self.style.SUCCESS('Outbox drained.'))
+
+    def backoff(self, interval, failures):
+        return min(interval * 2 ** failures, getattr(settings, 'EMAIL_OUTBOX_MAX_BACKOFF', 3600))
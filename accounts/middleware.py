@@ -0,0 +1,37 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from .models import Profile
+
+
+def get_role(user):
+    """'admin', 'student', or None for anonymous users and accounts without a profile"""
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.profile.role
+    except Profile.DoesNotExist:
+        return None
+
+
+class RoleMiddleware:
+    """Set request.role from the profile loaded alongside request.user; must follow AuthenticationMiddleware"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Resolved here, in sync code, so async views can read it without touching the database
+        request.role = get_role(request.user)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # Loads request.user in a worker thread, where templates will find it already cached
+        request.role = await sync_to_async(get_role)(request.user)
+        return await self.get_response(request)
@@ -0,0 +1,77 @@
+from django.db import migrations
+from django.db.models import Case, Count, Index, Q, UniqueConstraint, When
+from django.db.models.functions import Lower
+
+
+def active_email_constraint():
+    # Inactive users and blank emails index as NULL, which never conflicts
+    return UniqueConstraint(
+        Case(When(Q(is_active=True) & ~Q(email=''), then=Lower('email'))),
+        name='auth_user_active_email_ci_uniq',
+    )
+
+
+def email_lookup_index():
+    # Login and password reset search on LOWER(email)
+    return Index(Lower('email'), name='auth_user_email_ci_idx')
+
+
+def check_duplicates(apps, schema_editor):
+    """Stop before adding the constraint while an email belongs to several active accounts.
+
+    Which account keeps the email is for an administrator to decide, not for a deploy.
+    """
+    User = apps.get_model('auth', 'User')
+    emails = (
+        User.objects.filter(is_active=True).exclude(email='')
+        .values(email_key=Lower('email')).annotate(accounts=Count('id')).filter(accounts__gt=1)
+        .order_by('email_key').values_list('email_key', flat=True)
+    )
+    total = emails.count()
+    if total:
+        raise RuntimeError(
+            f"{total} email address(es) belong to more than one active account, e.g. {', '.join(emails[:5])}. "
+            "Run 'python manage.py cleanup_duplicate_users --dry-run' to review them, then "
+            "'python manage.py cleanup_duplicate_users' (with --reassign to move their complaints), and migrate again."
+        )
+
+
+class AddUserEmailConstraints(migrations.operations.base.Operation):
+    """Add the constraint and index to auth.User, whose model state belongs to django.contrib.auth.
+
+    Recording them in the migration state would have makemigrations write a migration into the auth app,
+    so only the schema changes. Unlike RunPython, sqlmigrate shows the statements.
+    """
+
+    reversible = True
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        User = to_state.apps.get_model('auth', 'User')
+        if self.allow_migrate_model(schema_editor.connection.alias, User):
+            schema_editor.add_constraint(User, active_email_constraint())
+            schema_editor.add_index(User, email_lookup_index())
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        User = from_state.apps.get_model('auth', 'User')
+        if self.allow_migrate_model(schema_editor.connection.alias, User):
+            schema_editor.remove_index(User, email_lookup_index())
+            schema_editor.remove_constraint(User, active_email_constraint())
+
+    def describe(self):
+        return 'Add a unique constraint on the emails of active users, and a LOWER(email) index, to auth.User'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_outboundemail'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        AddUserEmailConstraints(),
+    ]
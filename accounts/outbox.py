@@ -0,0 +1,175 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+# How long a claimed message is hidden from other workers while it is being sent
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+class MailServerUnavailable(Exception):
+    """No connection to the mail server could be opened; counts holds what drain() delivered before that"""
+
+    def __init__(self, error, counts):
+        super().__init__(f'Cannot connect to the mail server: {error}')
+        self.counts = counts
+
+
+def build_email(subject, body, to, html_body='', from_email=None):
+    """Unsaved outbox message, for callers that queue many at once with bulk_create"""
+    return OutboundEmail(
+        subject=subject,
+        body=body,
+        html_body=html_body or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+        to=list(to),
+    )
+
+
+def enqueue_email(subject, body, to, html_body='', from_email=None):
+    """Store a rendered message in the outbox; it is committed with the caller's transaction"""
+    message = build_email(subject, body, to, html_body=html_body, from_email=from_email)
+    message.save()
+    return message
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 1, 2, 4, ... minutes, capped at EMAIL_OUTBOX_MAX_BACKOFF seconds"""
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 60)
+    ceiling = getattr(settings, 'EMAIL_OUTBOX_MAX_BACKOFF', 3600)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), ceiling))
+
+
+def claim_batch(batch_size):
+    """Lease up to batch_size due messages to this worker and return them"""
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboundEmail.objects.filter(status='pending', next_attempt_at__lte=now).order_by('next_attempt_at')
+        if db_connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        batch = list(due[:batch_size])
+        if batch:
+            OutboundEmail.objects.filter(pk__in=[message.pk for message in batch]).update(
+                next_attempt_at=now + CLAIM_LEASE
+            )
+    return batch
+
+
+def release_batch(batch):
+    """Hand claimed, unsent messages back to the outbox without waiting for their lease to expire"""
+    OutboundEmail.objects.filter(pk__in=[message.pk for message in batch], status='pending').update(
+        next_attempt_at=timezone.now()
+    )
+
+
+def to_email_message(message, connection):
+    email = EmailMultiAlternatives(
+        subject=message.subject,
+        body=message.body,
+        from_email=message.from_email or None,
+        to=message.to,
+        connection=connection,
+    )
+    if message.html_body:
+        email.attach_alternative(message.html_body, 'text/html')
+    return email
+
+
+class RateLimiter:
+    """Spaces sends so that no more than rate messages go out per second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self.next_slot:
+            time.sleep(self.next_slot - now)
+        self.next_slot = max(now, self.next_slot) + self.interval
+
+
+def reconnect(connection):
+    """Replace a connection that may have been broken by a failed send"""
+    try:
+        connection.close()
+        connection.open()
+    except Exception:
+        pass
+
+
+def deliver_batch(messages, connection, rate_limiter, max_attempts):
+    """Send claimed messages over one open connection; returns (sent, retried, failed) counts"""
+    sent = retried = failed = 0
+    for message in messages:
+        rate_limiter.wait()
+        message.attempts += 1
+        try:
+            connection.send_messages([to_email_message(message, connection)])
+        except Exception as e:
+            message.last_error = str(e)
+            reconnect(connection)
+            if message.attempts >= max_attempts:
+                message.status = 'failed'
+                failed += 1
+            else:
+                message.next_attempt_at = timezone.now() + retry_delay(message.attempts)
+                retried += 1
+        else:
+            message.status = 'sent'
+            message.sent_at = timezone.now()
+            message.last_error = ''
+            sent += 1
+        message.save(update_fields=['attempts', 'status', 'sent_at', 'next_attempt_at', 'last_error'])
+    return sent, retried, failed
+
+
+def drain(batch_size=50, rate=None, max_attempts=None):
+    """Deliver every due message, reusing one mail connection; returns (sent, retried, failed)"""
+    rate = getattr(settings, 'EMAIL_OUTBOX_RATE_LIMIT', 5) if rate is None else rate
+    max_attempts = max_attempts or getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    rate_limiter = RateLimiter(rate)
+    totals = [0, 0, 0]
+    connection = None
+    try:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+            if connection is None:
+                try:
+                    connection = get_connection()
+                    connection.open()
+                except Exception as e:
+                    # Not the messages' fault, so no attempt is counted; if this fails too, their lease expires
+                    connection = None
+                    release_batch(batch)
+                    raise MailServerUnavailable(e, tuple(totals)) from e
+            counts = deliver_batch(batch, connection, rate_limiter, max_attempts)
+            totals = [total + count for total, count in zip(totals, counts)]
+    finally:
+        if connection is not None:
+            connection.close()
+    return tuple(totals)
+
+
+def purge_sent(older_than=None, batch_size=1000):
+    """Delete sent messages older than EMAIL_OUTBOX_RETENTION_DAYS, in batches; returns how many"""
+    if older_than is None:
+        older_than = timedelta(days=getattr(settings, 'EMAIL_OUTBOX_RETENTION_DAYS', 30))
+    cutoff = timezone.now() - older_than
+    deleted = 0
+    while True:
+        ids = list(
+            OutboundEmail.objects.filter(status='sent', sent_at__lt=cutoff).values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += OutboundEmail.objects.filter(pk__in=ids).delete()[0]
@@ -1,3 +1,363 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from complaints.models import Complaint, ComplaintSearchDocument
+from .backends import ProfileBackend, user_cache_key, users_by_email
+from .models import OutboundEmail, Profile
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_OUTBOX_RATE_LIMIT=0)
+class EmailOutboxTests(TestCase):
+    def register(self, username='newstudent', email='newstudent@example.com'):
+        return self.client.post(reverse('register'), {
+            'username': username,
+            'email': email,
+            'full_name': 'New Student',
+            'student_id': '',
+            'password1': 'a-Strong-pass-123',
+            'password2': 'a-Strong-pass-123',
+        })
+
+    def test_register_queues_verification_email(self):
+        response = self.register()
+        self.assertRedirects(response, reverse('login'))
+        self.assertTrue(User.objects.filter(username='newstudent').exists())
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.to, ['newstudent@example.com'])
+        self.assertEqual(queued.status, 'pending')
+
+        call_command('send_queued_email', stdout=mock.MagicMock())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('/accounts/verify-email/', mail.outbox[0].body)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'sent')
+        self.assertEqual(queued.attempts, 1)
+
+    def test_worker_drains_batches_over_one_connection(self):
+        for number in range(7):
+            self.register(username=f'student{number}', email=f'student{number}@example.com')
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as opened:
+            call_command('send_queued_email', '--batch-size', '3', stdout=mock.MagicMock())
+        self.assertEqual(len(mail.outbox), 7)
+        self.assertEqual(opened.call_count, 1)
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.register()
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=SMTPException('relay down')
+        ):
+            call_command('send_queued_email', stdout=mock.MagicMock())
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.status, 'pending')
+        self.assertEqual(queued.attempts, 1)
+        self.assertEqual(queued.last_error, 'relay down')
+        self.assertGreater(queued.next_attempt_at, timezone.now())
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        call_command('send_queued_email', stdout=mock.MagicMock())
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'sent')
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=1)
+    def test_message_fails_after_max_attempts(self):
+        self.register()
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=SMTPException('rejected')
+        ):
+            call_command('send_queued_email', stdout=mock.MagicMock())
+        self.assertEqual(OutboundEmail.objects.get().status, 'failed')
+
+    def test_unreachable_mail_server_releases_the_batch(self):
+        self.register()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError('refused')):
+            with self.assertRaisesMessage(CommandError, 'Cannot connect to the mail server: refused'):
+                call_command('send_queued_email', stdout=mock.MagicMock())
+        queued = OutboundEmail.objects.get()
+        self.assertEqual((queued.status, queued.attempts), ('pending', 0))
+        self.assertLessEqual(queued.next_attempt_at, timezone.now())
+
+    def test_loop_backs_off_while_mail_server_is_unreachable(self):
+        self.register()
+        stop = Exception('stop looping')
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.open', side_effect=[OSError('refused'), OSError('refused'), None],
+        ), mock.patch('accounts.management.commands.send_queued_email.time.sleep', side_effect=[None, None, stop]) as slept:
+            with self.assertRaises(Exception) as raised:
+                call_command('send_queued_email', '--loop', '--interval', '1', stdout=mock.MagicMock(), stderr=io.StringIO())
+        self.assertIs(raised.exception, stop)
+        self.assertEqual([call.args[0] for call in slept.call_args_list], [2, 4, 1])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutboundEmail.objects.get().status, 'sent')
+
+    def test_old_sent_messages_are_purged(self):
+        now = timezone.now()
+        for status, days in (('sent', 40), ('sent', 1), ('failed', 40), ('pending', 40)):
+            OutboundEmail.objects.create(subject=f'{status} {days}', body='', to=['someone@example.com'], status=status,
+                                         sent_at=now - timedelta(days=days) if status == 'sent' else None)
+        call_command('send_queued_email', stdout=mock.MagicMock())
+        self.assertEqual(
+            sorted(OutboundEmail.objects.values_list('subject', flat=True)), ['failed 40', 'pending 40', 'sent 1'],
+        )
+
+
+@override_settings(CACHE_SHARED=True)
+class RoleMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('rolestudent', 'rolestudent@example.com', 'pass12345')
+        cls.profile = Profile.objects.create(user=cls.student, full_name='Role Student', role='student', email_verified=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+
+    def test_role_checks_add_no_queries(self):
+        self.client.get(reverse('student_dashboard'))
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('student_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.role, 'student')
+        tables = ' '.join(query['sql'] for query in captured.captured_queries)
+        self.assertNotIn('accounts_profile', tables)
+        self.assertNotIn('"auth_user"."password"', tables)
+
+    def test_profile_change_is_seen_on_next_request(self):
+        self.assertRedirects(self.client.get(reverse('admin_dashboard')), reverse('student_dashboard'))
+        self.profile.role = 'admin'
+        self.profile.save()
+        self.assertRedirects(
+            self.client.get(reverse('student_dashboard')), reverse('admin_dashboard'), fetch_redirect_response=False
+        )
+
+
+class UserCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('cachestudent', 'cachestudent@example.com', 'pass12345')
+        Profile.objects.create(user=cls.student, full_name='Cache Student', role='student', email_verified=True)
+        cls.orphan = User.objects.create_user('cacheorphan', 'cacheorphan@example.com', 'pass12345')
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(CACHE_SHARED=True)
+    def test_cache_holds_no_password(self):
+        backend = ProfileBackend()
+        backend.get_user(self.student.pk)
+        data = cache.get(user_cache_key(self.student.pk))
+        self.assertNotIn('password', data['user'])
+        self.assertEqual(data['session_auth_hash'], self.student.get_session_auth_hash())
+        with self.assertNumQueries(0):
+            user = backend.get_user(self.student.pk)
+            self.assertEqual(user.profile.role, 'student')
+            self.assertEqual(user.get_session_auth_hash(), self.student.get_session_auth_hash())
+        self.assertIn('password', user.get_deferred_fields())
+
+    @override_settings(CACHE_SHARED=True)
+    def test_user_without_profile(self):
+        backend = ProfileBackend()
+        backend.get_user(self.orphan.pk)
+        with self.assertNumQueries(0), self.assertRaises(Profile.DoesNotExist):
+            backend.get_user(self.orphan.pk).profile
+
+    @override_settings(CACHE_SHARED=True)
+    def test_saving_cached_user_keeps_password(self):
+        backend = ProfileBackend()
+        backend.get_user(self.student.pk)
+        user = backend.get_user(self.student.pk)
+        user.first_name = 'Cached'
+        user.save()
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.first_name, 'Cached')
+        self.assertTrue(self.student.check_password('pass12345'))
+
+    @override_settings(CACHE_SHARED=True)
+    def test_password_change_ends_other_sessions(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('student_dashboard')).status_code, 200)
+        self.student.set_password('changed12345')
+        self.student.save()
+        self.assertRedirects(
+            self.client.get(reverse('student_dashboard')), reverse('login') + '?next=' + reverse('student_dashboard'),
+            fetch_redirect_response=False,
+        )
+
+    @override_settings(CACHE_SHARED=False)
+    def test_unshared_cache_is_not_used(self):
+        self.assertEqual(ProfileBackend().get_user(self.student.pk), self.student)
+        self.assertIsNone(cache.get(user_cache_key(self.student.pk)))
+
+
+class AdminUserTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('superadmin', 'superadmin@example.com', 'pass12345')
+        cls.active = User.objects.create_user('taken', 'Taken@example.com', 'pass12345')
+        cls.retired = User.objects.create_user('retired', 'taken@example.com', 'pass12345', is_active=False)
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def add_user(self):
+        return self.client.post(reverse('admin:auth_user_add'), {
+            'username': 'newcomer', 'email': 'TAKEN@example.com', 'usable_password': 'false',
+        })
+
+    def reactivate_retired(self):
+        return self.client.post(reverse('admin:auth_user_change', args=[self.retired.pk]), {
+            'username': 'retired', 'email': 'taken@example.com', 'is_active': 'on',
+            'date_joined_0': '2026-01-01', 'date_joined_1': '09:00:00',
+        })
+
+    def test_add_with_taken_email(self):
+        response = self.add_user()
+        self.assertContains(response, 'Another active account already uses this email address')
+        self.assertFalse(User.objects.filter(username='newcomer').exists())
+
+    def test_reactivate_with_taken_email(self):
+        response = self.reactivate_retired()
+        self.assertContains(response, 'Another active account already uses this email address')
+        self.retired.refresh_from_db()
+        self.assertFalse(self.retired.is_active)
+
+    def test_email_taken_after_the_check(self):
+        # As if another account took the email between validation and the save
+        with mock.patch('accounts.forms.users_by_email', return_value=User.objects.none()):
+            for response in (self.add_user(), self.reactivate_retired()):
+                self.assertEqual(response.status_code, 302)
+                message = str(list(get_messages(response.wsgi_request))[-1])
+                self.assertIn('Another active account already uses this email address', message)
+        self.assertFalse(User.objects.filter(username='newcomer').exists())
+        self.retired.refresh_from_db()
+        self.assertFalse(self.retired.is_active)
+
+    def test_reactivate_after_the_email_is_freed(self):
+        self.active.is_active = False
+        self.active.save()
+        self.assertRedirects(self.reactivate_retired(), reverse('admin:auth_user_changelist'))
+        self.retired.refresh_from_db()
+        self.assertTrue(self.retired.is_active)
+
+
+class LoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('loginstudent', 'Login.Student@example.com', 'pass12345')
+        Profile.objects.create(user=cls.student, full_name='Login Student', role='student', email_verified=True)
+
+    def post_login(self, username, password):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(reverse('login'), {'username': username, 'password': password})
+        user_lookups = [
+            query for query in captured.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "auth_user"' in query['sql'].replace('`', '"')
+        ]
+        return response, user_lookups
+
+    def test_email_login_uses_one_lookup(self):
+        response, user_lookups = self.post_login('login.student@EXAMPLE.com', 'pass12345')
+        self.assertRedirects(response, reverse('student_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(len(user_lookups), 1)
+
+    def test_failed_login_reuses_lookup(self):
+        response, user_lookups = self.post_login('loginstudent', 'wrong-pass')
+        self.assertIn('Invalid password', str(list(get_messages(response.wsgi_request))[-1]))
+        self.assertEqual(len(user_lookups), 1)
+        response, user_lookups = self.post_login('nobody@example.com', 'wrong-pass')
+        self.assertIn('No account found', str(list(get_messages(response.wsgi_request))[-1]))
+        self.assertEqual(len(user_lookups), 1)
+
+    def test_register_with_taken_email(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(reverse('register'), {
+                'username': 'copycat', 'email': 'LOGIN.student@example.com', 'full_name': 'Copy Cat',
+                'password1': 'a-Strong-pass-123', 'password2': 'a-Strong-pass-123',
+            })
+        self.assertContains(response, 'A user with this email address already exists')
+        self.assertFalse(User.objects.filter(username='copycat').exists())
+        email_checks = [query['sql'] for query in captured.captured_queries if 'email' in query['sql']]
+        self.assertTrue(email_checks)
+        self.assertTrue(all('LOWER(' in sql.upper() for sql in email_checks))
+
+    def test_one_active_account_per_email(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user('loginstudent2', 'login.student@example.com', 'pass12345')
+        User.objects.create_user('retired', 'login.student@example.com', 'pass12345', is_active=False)
+        self.assertEqual(users_by_email('LOGIN.student@example.com').get(), self.student)
+
+
+class ImportStudentsTests(TestCase):
+    def test_import_roster(self):
+        User.objects.create_user('taken', 'taken@example.com', 'pass12345')
+        roster = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        self.addCleanup(os.remove, roster.name)
+        with roster:
+            roster.write(
+                'username,email,full_name,student_id,password\n'
+                'ada,ada@example.com,Ada Student,S001,first-pass-1\n'
+                'ben,ben@example.com,Ben Student,,\n'
+                'cy,TAKEN@example.com,Cy Student,S003,pass\n'
+                'ada,other@example.com,Second Ada,S004,pass\n'
+            )
+        out = io.StringIO()
+        call_command(
+            'import_students', roster.name, '--workers', '2', '--batch-size', '1',
+            '--send-verification', '--base-url', 'https://vent.example.edu/', stdout=out,
+        )
+
+        self.assertIn('Created 2 students; skipped 2 rows.', out.getvalue())
+        ada = User.objects.get(username='ada')
+        self.assertTrue(ada.check_password('first-pass-1'))
+        self.assertEqual(ada.profile.student_id, 'S001')
+        self.assertFalse(ada.profile.email_verified)
+        self.assertFalse(User.objects.get(username='ben').has_usable_password())
+        queued = OutboundEmail.objects.get(to=['ada@example.com'])
+        self.assertIn('https://vent.example.edu/accounts/verify-email/', queued.body)
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+
+class CleanupDuplicateUsersTests(TestCase):
+    def test_reassign_and_resume(self):
+        keeper = User.objects.create_user('keeper', 'Shared@example.com', 'pass12345')
+        old = User.objects.create_user('old', 'shared@example.com', 'pass12345', is_active=False)
+        Profile.objects.create(user=old, full_name='Old Account', role='student', student_id='S100')
+        complaint = Complaint.objects.create(
+            student=old, type='non_anonymous', category='exam', title='Missing result', description='Exam 2',
+        )
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'progress.json')
+        self.addCleanup(os.rmdir, os.path.dirname(checkpoint))
+
+        with open(checkpoint, 'w') as progress:
+            json.dump({'last_email': 'shared@example.com', 'groups': 1}, progress)
+        call_command('cleanup_duplicate_users', '--reassign', '--resume', '--checkpoint', checkpoint, stdout=io.StringIO())
+        complaint.refresh_from_db()
+        self.assertEqual(complaint.student, old)
+
+        out = io.StringIO()
+        call_command('cleanup_duplicate_users', '--reassign', '--batch-size', '1', '--checkpoint', checkpoint, stdout=out)
+        self.assertIn('reassigned 1 complaints and 1 profiles', out.getvalue())
+        complaint.refresh_from_db()
+        self.assertEqual(complaint.student, keeper)
+        self.assertEqual(Profile.objects.get(student_id='S100').user, keeper)
+        self.assertIn('keeper', ComplaintSearchDocument.objects.get(complaint=complaint).student)
+        self.assertFalse(os.path.exists(checkpoint))
@@ -4,14 +4,15 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
-from django.conf import settings
+from django.db import transaction
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.template.loader import render_to_string
 from django.urls import reverse
+from .backends import users_by_email
 from .forms import UserRegistrationForm, EmailAuthenticationForm, PasswordResetForm, SetPasswordForm
 from .models import Profile
+from .outbox import build_email, enqueue_email
 from .token_generator import email_verification_token
 
 def register(request):
@@ -19,9 +20,11 @@ def register(request):
         form = UserRegistrationForm(request.POST)
         if form.is_valid():
             try:
-                user = form.save()
+                # The verification email is queued in the same transaction as the account
+                with transaction.atomic():
+                    user = form.save()
+                    send_verification_email(request, user) # email verification 
                 username = form.cleaned_data.get('username')
-                send_verification_email(request, user) # email verification 
                 
                 messages.success(request, f'Account created for {username}! Please check your email to verify your account before logging in.')
                 return redirect('login')
@@ -38,7 +41,7 @@ def register(request):
 
 def login_view(request):
     if request.method == 'POST':
-        form = EmailAuthenticationForm(data=request.POST)
+        form = EmailAuthenticationForm(request, data=request.POST)
         if form.is_valid():
             user = form.get_user()
             
@@ -82,16 +85,11 @@ def login_view(request):
                 messages.error(request, 'Please enter your email address or username.')
             elif not password:
                 messages.error(request, 'Please enter your password.')
-            else: # Check if user exists by username or email
-                try:
-                    user = User.objects.get(username=username) # First find by username
-                    messages.error(request, 'Invalid password. Please check your password and try again.')
-                except User.DoesNotExist:
-                    try: # If not found by username, by email
-                        user = User.objects.get(email=username)
-                        messages.error(request, 'Invalid password. Please check your password and try again.')
-                    except User.DoesNotExist:
-                        messages.error(request, 'No account found with this email address or username. Please check your credentials or create a new account.')
+            elif getattr(request, 'login_candidate', None) is not None:
+                # The backend already found the account while authenticating
+                messages.error(request, 'Invalid password. Please check your password and try again.')
+            else:
+                messages.error(request, 'No account found with this email address or username. Please check your credentials or create a new account.')
     else:
         form = EmailAuthenticationForm()
     return render(request, 'accounts/login.html', {'form': form})
@@ -102,15 +100,13 @@ def logout_view(request):
     messages.info(request, 'You have been logged out.')
     return redirect('login')
 
-def send_verification_email(request, user):
-    """Send email verification link to user"""
+def verification_path(user):
     token = email_verification_token.make_token(user)
     uid = urlsafe_base64_encode(force_bytes(user.pk))
-    
-    verification_url = request.build_absolute_uri(
-        reverse('verify_email', kwargs={'uidb64': uid, 'token': token})
-    )
-    
+    return reverse('verify_email', kwargs={'uidb64': uid, 'token': token})
+
+def build_verification_email(user, verification_url):
+    """Unsaved outbox message with the verification link for user"""
     subject = 'Verify Your Email Address - Vent'
     # Render HTML email template
     html_message = render_to_string('accounts/emails/email_verification.html', {
@@ -131,14 +127,11 @@ def send_verification_email(request, user):
     Vent Team
     """
     
-    send_mail(
-        subject,
-        plain_message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        html_message=html_message,
-        fail_silently=False,
-    )
+    return build_email(subject, plain_message, [user.email], html_body=html_message)
+
+def send_verification_email(request, user):
+    """Queue email verification link for user"""
+    build_verification_email(user, request.build_absolute_uri(verification_path(user))).save()
 
 def verify_email(request, uidb64, token):
     """Verify user's email address"""
@@ -167,16 +160,11 @@ def password_reset_request(request):
         form = PasswordResetForm(request.POST)
         if form.is_valid():
             email = form.cleaned_data['email']
-            matching_users = User.objects.filter(email=email)
-            if not matching_users.exists():
+            user = users_by_email(email).first()
+            if user is None:
                 messages.error(request, 'No account found with this email address.')
-            elif matching_users.count() > 1:
-                messages.error(
-                    request,
-                    'Multiple accounts are associated with this email. Please use your username to reset your password.'
-                )
             else:
-                send_password_reset_email(request, matching_users.first())
+                send_password_reset_email(request, user)
                 messages.success(request, 'Password reset link has been sent to your email.')
                 return redirect('login')
     else:
@@ -185,7 +173,7 @@ def password_reset_request(request):
     return render(request, 'accounts/password_reset.html', {'form': form})
 
 def send_password_reset_email(request, user):
-    """Send password reset link to user"""
+    """Queue password reset link for user"""
     token = email_verification_token.make_token(user)
     uid = urlsafe_base64_encode(force_bytes(user.pk))
     
@@ -214,14 +202,7 @@ def send_password_reset_email(request, user):
     Vent Team
     """
     
-    send_mail(
-        subject,
-        plain_message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        html_message=html_message,
-        fail_silently=False,
-    )
+    enqueue_email(subject, plain_message, [user.email], html_body=html_message)
 
 def password_reset_confirm(request, uidb64, token):
     """Handle password reset confirmation"""
@@ -1,10 +1,16 @@
 from django.contrib import admin
-from .models import Complaint
+from .models import AttachmentBlob, Complaint, Department
+
+@admin.register(Department)
+class DepartmentAdmin(admin.ModelAdmin):
+    list_display = ['name']
+    search_fields = ['name']
 
 @admin.register(Complaint)
 class ComplaintAdmin(admin.ModelAdmin):
     list_display = ['id', 'title', 'type', 'category', 'status', 'assigned_to', 'student', 'created_at']
-    list_filter = ['type', 'category', 'status', 'created_at']
+    list_filter = ['type', 'category', 'status', 'assigned_to', 'created_at']
+    list_select_related = ['assigned_to', 'student']
     search_fields = ['title', 'description', 'student__username', 'student__email']
     readonly_fields = ['created_at', 'updated_at']
     list_editable = ['status', 'assigned_to']
@@ -22,7 +28,7 @@ class ComplaintAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Attachment', {
-            'fields': ('attachment',),
+            'fields': ('attachment', 'attachment_name'),
             'classes': ('collapse',)
         }),
         ('Timestamps', {
@@ -30,3 +36,10 @@ class ComplaintAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(AttachmentBlob)
+class AttachmentBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'ref_count', 'created_at']
+    search_fields = ['name']
+    readonly_fields = ['name', 'size', 'ref_count', 'created_at']
@@ -0,0 +1,177 @@
+"""Async versions of the read-heavy pages, routed instead of the views in views.py when ASYNC_VIEWS is on.
+
+Under ASGI a request waiting on the database or cache no longer holds a worker thread. The queries
+behind one page are started together with asyncio.gather; Django still runs them one at a time on
+the request's connection, so the gain is in throughput under load rather than in single-page latency.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db import connections
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.utils.functional import SimpleLazyObject
+
+from accounts.decorators import admin_required, arequest_role, student_required
+from ventsystem.routers import reads_from_replica
+from . import fragments, history, live, stats
+from .departments import adepartment_choices
+from .forms import BulkActionForm, ComplaintStatusForm
+from .models import Complaint
+from .pagination import CursorPaginator, RankedPaginator
+from .search import search_complaints
+from .views import can_view_complaint, filter_complaints, filtered, get_complaint_filters
+
+
+async def render_async(request, template_name, context):
+    # Context processors and cache misses may still touch lazy objects, which need sync code
+    return await sync_to_async(render)(request, template_name, context)
+
+
+async def aiterate(queryset):
+    return [obj async for obj in queryset]
+
+
+def release_connections():
+    for connection in connections.all(initialized_only=True):
+        # Left open inside a transaction, which only tests wrap requests in
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+async def unless_cached(fragment_name, vary_on, fetch, fallback):
+    """Await fetch() unless the template fragment showing its result is cached.
+
+    fallback is passed instead and must be lazy, so it only queries if the fragment expires before rendering.
+    """
+    if await fragments.acached(fragment_name, *vary_on):
+        return fallback
+    return await fetch()
+
+
+@student_required
+async def student_dashboard(request):
+    user_id = request.user.id
+    student_complaints = Complaint.objects.filter(student_id=user_id, type='non_anonymous')
+    recent_complaints = student_complaints.order_by('-created_at', '-id')[:5]
+    fragment_context = await fragments.acontext(fragments.user_scope(user_id))
+    version = fragment_context['fragment_version']
+
+    total_complaints, user_complaints = await asyncio.gather(
+        unless_cached('student_total', (user_id, version), student_complaints.acount, student_complaints.count),
+        unless_cached('student_recent_complaints', (user_id, version), lambda: aiterate(recent_complaints), recent_complaints),
+    )
+    context = {
+        'user_complaints': user_complaints,
+        'total_complaints': total_complaints,
+        **fragment_context,
+    }
+    return await render_async(request, 'complaints/student_dashboard.html', context)
+
+
+@student_required
+async def my_complaints(request):
+    user_id = request.user.id
+    complaints = Complaint.objects.select_related('assigned_to').filter(student_id=user_id, type='non_anonymous')
+    cursor = request.GET.get('cursor')
+    paginator = CursorPaginator(complaints, 10)
+    fragment_context = await fragments.acontext(fragments.user_scope(user_id), fragments.DEPARTMENTS)
+
+    page_obj = await unless_cached(
+        'my_complaints', (user_id, cursor or '', fragment_context['fragment_version']),
+        lambda: paginator.aget_page(cursor), SimpleLazyObject(lambda: paginator.get_page(cursor)),
+    )
+    context = {
+        'page_obj': page_obj,
+        'cursor': cursor or '',
+        **fragment_context,
+    }
+    return await render_async(request, 'complaints/my_complaints.html', context)
+
+
+@admin_required
+@reads_from_replica
+async def admin_dashboard(request):
+    current_filters = get_complaint_filters(request.GET)
+    search = current_filters['search']
+    cursor = request.GET.get('cursor')
+    # A department filter given by name is resolved through the cached lookup table
+    complaints = await sync_to_async(filter_complaints)(current_filters)
+    fragment_context = await fragments.acontext(fragments.ADMIN)
+
+    async def page():
+        if search:
+            # Ranked ids come from the full-text index; keep that order instead of newest-first
+            ranked_ids = await sync_to_async(search_complaints)(search, within=filtered(complaints))
+            paginator = await sync_to_async(RankedPaginator)(complaints, ranked_ids, 15)
+            return await sync_to_async(paginator.get_page)(cursor)
+        estimated_count = await stats.acount_matching(**current_filters)
+        return await CursorPaginator(complaints, 15, estimated_count=estimated_count).aget_page(cursor)
+
+    page_obj, status_counts, assigned_departments = await asyncio.gather(
+        page(),
+        unless_cached(
+            'admin_stat_cards', (fragment_context['fragment_version'],),
+            stats.astatus_counts, SimpleLazyObject(stats.status_counts),
+        ),
+        adepartment_choices(),
+    )
+    context = {
+        'page_obj': page_obj,
+        'status_counts': status_counts,
+        'assigned_departments': assigned_departments,
+        'current_filters': current_filters,
+        'bulk_form': BulkActionForm(departments=assigned_departments),
+        'live_events': True,
+        **fragment_context,
+    }
+    return await render_async(request, 'complaints/admin_dashboard.html', context)
+
+
+@admin_required
+async def live_events(request):
+    """Server-Sent Events stream of complaint changes for the admin dashboard (complaints.live)"""
+    # The stream never queries; don't hold the connection the permission checks used for its lifetime
+    await sync_to_async(release_connections)()
+    response = StreamingHttpResponse(
+        live.stream(request.headers.get('Last-Event-ID')), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stops nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+async def complaint_detail(request, complaint_id):
+    try:
+        complaint = await Complaint.objects.select_related('assigned_to', 'student').aget(id=complaint_id)
+    except Complaint.DoesNotExist:
+        raise Http404('No complaint matches the given query.')
+
+    role = await arequest_role(request)
+    if not can_view_complaint(request, complaint):
+        messages.error(request, 'You do not have permission to view this complaint.')
+        return redirect('student_dashboard')
+    is_admin = role == 'admin'
+
+    if request.method == 'POST' and is_admin:
+        form = ComplaintStatusForm(request.POST, instance=complaint)
+        if await sync_to_async(form.is_valid)():
+            await sync_to_async(form.save)(actor=request.user)
+            messages.success(request, 'Complaint status updated successfully!')
+            return redirect('complaint_detail', complaint_id=complaint.id)
+    else:
+        form = ComplaintStatusForm(instance=complaint)
+
+    events = complaint.status_events.select_related('actor').order_by('created_at', 'id')
+    events, departments = await asyncio.gather(aiterate(events), adepartment_choices())
+    context = {
+        'complaint': complaint,
+        'form': form,
+        'is_admin': is_admin,
+        'timeline': history.timeline(events, dict(departments), show_actor=is_admin),
+    }
+    return await render_async(request, 'complaints/complaint_detail.html', context)
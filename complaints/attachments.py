@@ -0,0 +1,77 @@
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from . import thumbnails
+from .models import AttachmentBlob, Complaint
+from .storage import attachment_storage
+
+
+def _size(name):
+    try:
+        return attachment_storage().size(name)
+    except OSError:
+        return 0
+
+
+def add_reference(name):
+    """Count one more complaint pointing at the stored file name"""
+    if not name:
+        return
+    if AttachmentBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1):
+        return
+    try:
+        with transaction.atomic():
+            AttachmentBlob.objects.create(name=name, size=_size(name), ref_count=1)
+    except IntegrityError:
+        # Another transaction created the row first
+        AttachmentBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1)
+
+
+def release_reference(name):
+    """Count one complaint fewer; the file is deleted after commit once nothing references it"""
+    if not name:
+        return
+    AttachmentBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    transaction.on_commit(lambda: delete_if_unreferenced(name))
+
+
+def lock_blob(name):
+    """Lock the row of a stored file for the rest of the transaction, if there is one.
+
+    delete_if_unreferenced takes the same lock, so it waits for a reference added meanwhile, or the
+    locking upload waits for the delete to finish and then finds the file gone.
+    """
+    if transaction.get_connection().in_atomic_block:
+        list(AttachmentBlob.objects.select_for_update().filter(name=name).values_list('pk', flat=True))
+
+
+def delete_if_unreferenced(name):
+    with transaction.atomic():
+        blob = AttachmentBlob.objects.select_for_update().filter(name=name, ref_count=0).first()
+        if blob is None:
+            return
+        # The files go while the row is still locked, before an upload of the same content may reuse them
+        AttachmentBlob.objects.filter(pk=blob.pk).delete()
+        attachment_storage().delete(name)
+        for size in thumbnails.SIZES:
+            default_storage.delete(thumbnails.derivative_name(name, size))
+
+
+def rebuild():
+    """Recount references from the Complaint table; returns the number of stored files"""
+    with transaction.atomic():
+        counts = dict(
+            Complaint.objects.exclude(attachment='').exclude(attachment=None)
+            .values_list('attachment').annotate(total=Count('id')).order_by()
+        )
+        existing = {blob.name: blob for blob in AttachmentBlob.objects.all()}
+        stale = [blob.pk for name, blob in existing.items() if name not in counts]
+        AttachmentBlob.objects.filter(pk__in=stale).delete()
+        for name, total in counts.items():
+            blob = existing.get(name)
+            if blob is None:
+                AttachmentBlob.objects.create(name=name, size=_size(name), ref_count=total)
+            elif blob.ref_count != total:
+                AttachmentBlob.objects.filter(pk=blob.pk).update(ref_count=total)
+    return len(counts)
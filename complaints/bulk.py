@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import history, stats
+from .models import Complaint
+from .signals import complaints_bulk_updated
+
+# Upper bound on ids per UPDATE statement, to stay under database parameter limits
+UPDATE_CHUNK_SIZE = 5000
+
+UNCHANGED = object()
+
+
+def bulk_update(queryset, status=None, assigned_to=UNCHANGED, actor=None):
+    """Set status and/or department on every complaint in queryset.
+
+    Rows are locked and read once, then changed with set-based UPDATEs (one per action per
+    UPDATE_CHUNK_SIZE ids) that also stamp updated_at and the response times (complaints.history);
+    the status counters are adjusted in the same transaction. assigned_to takes a Department or its
+    id, or None to unassign. Returns per-action counts of the complaints that actually changed.
+    """
+    counts = {'selected': 0, 'status': 0, 'assigned_to': 0}
+    assigned_to_id = getattr(assigned_to, 'pk', assigned_to)
+    now = timezone.now()
+
+    with transaction.atomic():
+        rows = list(
+            queryset.order_by().select_for_update()
+            .values_list('id', 'status', 'type', 'category', 'assigned_to_id')
+        )
+        counts['selected'] = len(rows)
+        changes = []
+
+        if status:
+            moved = [row for row in rows if row[1] != status]
+            # The response times read the old status, so they come first: MySQL assigns left to right
+            _update([row[0] for row in moved], **history.response_times(status, now), status=status, updated_at=now)
+            deltas = {}
+            for _, old_status, complaint_type, category, _ in moved:
+                old_key = stats.stat_key({'status': old_status, 'type': complaint_type, 'category': category})
+                new_key = (status,) + old_key[1:]
+                deltas[old_key] = deltas.get(old_key, 0) - 1
+                deltas[new_key] = deltas.get(new_key, 0) + 1
+            for key, delta in deltas.items():
+                stats.adjust(key, delta)
+            counts['status'] = len(moved)
+            changes += [(row[0], 'status', row[1], status) for row in moved]
+
+        if assigned_to is not UNCHANGED:
+            reassigned = [row for row in rows if row[4] != assigned_to_id]
+            _update(
+                [row[0] for row in reassigned], assigned_to_id=assigned_to_id, updated_at=now,
+                first_response_at=history.first_response(now),
+            )
+            counts['assigned_to'] = len(reassigned)
+            changes += [(row[0], 'assigned_to_id', row[4], assigned_to_id) for row in reassigned]
+
+        if changes:
+            complaints_bulk_updated.send(sender=Complaint, changes=changes, updated_at=now, actor=actor)
+    return counts
+
+
+def _update(ids, **values):
+    for start in range(0, len(ids), UPDATE_CHUNK_SIZE):
+        Complaint.objects.filter(pk__in=ids[start:start + UPDATE_CHUNK_SIZE]).update(**values)
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Department
+
+DEPARTMENTS_CACHE_KEY = 'complaints:departments'
+
+
+def _choices():
+    return list(Department.objects.values_list('id', 'name'))
+
+
+def department_choices():
+    """(id, name) pairs for every department, served from the cache when every process shares it"""
+    if not getattr(settings, 'CACHE_SHARED', False):
+        return _choices()
+    return cache.get_or_set(
+        DEPARTMENTS_CACHE_KEY,
+        _choices,
+        getattr(settings, 'DEPARTMENTS_CACHE_TIMEOUT', 3600),
+    )
+
+
+async def adepartment_choices():
+    if not getattr(settings, 'CACHE_SHARED', False):
+        return [choice async for choice in Department.objects.values_list('id', 'name')]
+    choices = await cache.aget(DEPARTMENTS_CACHE_KEY)
+    if choices is None:
+        choices = [choice async for choice in Department.objects.values_list('id', 'name')]
+        await cache.aset(DEPARTMENTS_CACHE_KEY, choices, getattr(settings, 'DEPARTMENTS_CACHE_TIMEOUT', 3600))
+    return choices
+
+
+def resolve_department_id(value):
+    """Map a dashboard filter value (department id, or a legacy department name) to an id"""
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    for department_id, name in department_choices():
+        if name.casefold() == value.strip().casefold():
+            return department_id
+    return None
+
+
+def invalidate_department_cache():
+    cache.delete(DEPARTMENTS_CACHE_KEY)
@@ -0,0 +1,104 @@
+import csv
+import json
+import zlib
+
+from django.db.models import Q
+
+EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('type', 'type'),
+    ('category', 'category'),
+    ('status', 'status'),
+    ('title', 'title'),
+    ('description', 'description'),
+    ('assigned_to', 'assigned_to__name'),
+    ('student_username', 'student__username'),
+    ('student_email', 'student__email'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """File-like object whose write() hands the line back, so csv.writer can feed a generator"""
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset, chunk_size=2000):
+    """Yield export rows as dicts, newest first, fetching one keyset-bounded chunk at a time"""
+    names = [name for name, _ in EXPORT_COLUMNS]
+    lookups = [lookup for _, lookup in EXPORT_COLUMNS]
+    queryset = queryset.order_by('-created_at', '-id').values_list(*lookups)
+    last = None
+    while True:
+        chunk = queryset
+        if last is not None:
+            chunk = chunk.filter(Q(created_at__lt=last['created_at']) | Q(created_at=last['created_at'], id__lt=last['id']))
+        rows = list(chunk[:chunk_size])
+        for values in rows:
+            last = dict(zip(names, values))
+            yield last
+        if len(rows) < chunk_size:
+            break
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+# Spreadsheets run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    value = _text(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Student-written text must not run when the export is opened; a leading quote keeps it text
+        return "'" + value
+    return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row.values()])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps({name: _text(value) for name, value in row.items()}) + '\n'
+
+
+def gzip_stream(lines, flush_every=64 * 1024):
+    """Compress a stream of text lines into a gzip stream, emitting roughly flush_every bytes at a time"""
+    compressor = zlib.compressobj(wbits=31)
+    pending = []
+    pending_size = 0
+    first = True
+    for line in lines:
+        data = line.encode('utf-8')
+        pending.append(data)
+        pending_size += len(data)
+        # The first line is flushed straight away so the client gets bytes immediately
+        if first or pending_size >= flush_every:
+            yield compressor.compress(b''.join(pending)) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending, pending_size, first = [], 0, False
+    yield compressor.compress(b''.join(pending)) + compressor.flush()
+
+
+def export_stream(queryset, export_format='csv', compress=False, chunk_size=2000):
+    rows = iter_rows(queryset, chunk_size=chunk_size)
+    lines = ndjson_lines(rows) if export_format == 'ndjson' else csv_lines(rows)
+    return gzip_stream(lines) if compress else lines
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Complaint
+from .departments import department_choices
 
 class NonAnonymousComplaintForm(forms.ModelForm):
     class Meta:
@@ -35,5 +36,42 @@ class ComplaintStatusForm(forms.ModelForm):
         fields = ['status', 'assigned_to']
         widgets = {
             'status': forms.Select(attrs={'class': 'form-control'}),
-            'assigned_to': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Department or person assigned'}),
-        }
\ No newline at end of file
+            'assigned_to': forms.Select(attrs={'class': 'form-control'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['assigned_to'].empty_label = 'Unassigned'
+
+    def save(self, commit=True, actor=None):
+        # Recorded as the author of the status log entries (complaints.history)
+        self.instance.changed_by = actor
+        return super().save(commit)
+
+class BulkActionForm(forms.Form):
+    status = forms.ChoiceField(required=False, widget=forms.Select(attrs={'class': 'form-select form-select-sm w-auto'}))
+    assigned_to = forms.ChoiceField(required=False, widget=forms.Select(attrs={'class': 'form-select form-select-sm w-auto'}))
+    select_all = forms.BooleanField(required=False)
+
+    def __init__(self, *args, departments=None, **kwargs):
+        # departments: (id, name) pairs already loaded, as async views must pass them
+        super().__init__(*args, **kwargs)
+        if departments is None:
+            departments = department_choices()
+        self.fields['status'].choices = [('', 'Status: no change')] + list(Complaint.STATUS_CHOICES)
+        self.fields['assigned_to'].choices = (
+            [('', 'Department: no change'), ('none', 'Unassigned')]
+            + [(str(dept_id), name) for dept_id, name in departments]
+        )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('status') and not cleaned_data.get('assigned_to'):
+            raise forms.ValidationError('Choose a status or department to apply.')
+        try:
+            cleaned_data['complaint_ids'] = [int(value) for value in self.data.getlist('complaint_ids')]
+        except ValueError:
+            raise forms.ValidationError('Invalid complaint selection.')
+        if not cleaned_data.get('select_all') and not cleaned_data['complaint_ids']:
+            raise forms.ValidationError('Select at least one complaint.')
+        return cleaned_data
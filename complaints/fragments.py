@@ -0,0 +1,92 @@
+import time
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+
+# Generation scopes; a template fragment varies on the generations of the scopes it depends on
+ADMIN = 'admin'
+DEPARTMENTS = 'departments'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def _key(scope):
+    return f'fragments:generation:{scope}'
+
+
+def version(*scopes):
+    """Current generation of each scope joined into one cache-key component"""
+    keys = [_key(scope) for scope in scopes]
+    current = cache.get_many(keys)
+    for key in keys:
+        if key not in current:
+            # Start from the clock so an evicted generation never returns to a value still in use
+            cache.add(key, time.time_ns(), None)
+            current[key] = cache.get(key)
+    return '.'.join(str(current[key]) for key in keys)
+
+
+async def aversion(*scopes):
+    keys = [_key(scope) for scope in scopes]
+    current = await cache.aget_many(keys)
+    for key in keys:
+        if key not in current:
+            await cache.aadd(key, time.time_ns(), None)
+            current[key] = await cache.aget(key)
+    return '.'.join(str(current[key]) for key in keys)
+
+
+def enabled():
+    # A new generation must reach every process, or others keep serving what they cached; see CACHE_SHARED
+    return getattr(settings, 'CACHE_SHARED', False)
+
+
+# A timeout of 0 has {% cache %} expire what it stores at once, so every request renders afresh
+UNCACHED = {'fragment_version': '', 'fragment_timeout': 0}
+
+
+def context(*scopes):
+    """Template context for {% cache fragment_timeout name ... fragment_version %}"""
+    if not enabled():
+        return UNCACHED
+    return {
+        'fragment_version': version(*scopes),
+        'fragment_timeout': getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 600),
+    }
+
+
+async def acontext(*scopes):
+    if not enabled():
+        return UNCACHED
+    return {
+        'fragment_version': await aversion(*scopes),
+        'fragment_timeout': getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 600),
+    }
+
+
+async def acached(fragment_name, *vary_on):
+    """Whether {% cache %} already holds the fragment, so the queries behind it can be skipped"""
+    if not enabled():
+        return False
+    try:
+        fragment_cache = caches['template_fragments']
+    except InvalidCacheBackendError:
+        fragment_cache = caches['default']
+    return await fragment_cache.ahas_key(make_template_fragment_key(fragment_name, vary_on))
+
+
+def invalidate(*scopes):
+    """Move the scopes to a new generation now and again after commit, so no stale render is cached in between"""
+    if not enabled():
+        return
+    keys = [_key(scope) for scope in scopes]
+
+    def bump():
+        cache.set_many({key: time.time_ns() for key in keys}, None)
+
+    bump()
+    transaction.on_commit(bump)
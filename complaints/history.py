@@ -0,0 +1,88 @@
+"""The status log: a ComplaintStatusEvent per change of status or department, and the response times kept with it.
+
+first_response_at is set by the first change of either field. resolved_at is set when the status
+enters Complaint.RESOLVED_STATUSES and cleared when it leaves them, so it always describes the
+current resolution. Single saves are recorded from complaints.signals; complaints.bulk sets the
+response times in its own UPDATEs and the events are inserted in one batch.
+"""
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Complaint, ComplaintStatusEvent
+
+LOGGED_FIELDS = {'status': 'status', 'assigned_to_id': 'assigned_to'}
+EVENT_BATCH_SIZE = 5000
+
+
+def _value(value):
+    return None if value is None else str(value)
+
+
+def event(complaint_id, attname, old, new, actor, at):
+    return ComplaintStatusEvent(
+        complaint_id=complaint_id, field=LOGGED_FIELDS[attname], old_value=_value(old), new_value=_value(new),
+        actor=actor, created_at=at,
+    )
+
+
+def stamp(complaint, changes, at):
+    """Update complaint's response times in memory for changes [(attname, old, new)] about to be saved"""
+    if changes and complaint.first_response_at is None:
+        complaint.first_response_at = at
+    for attname, old, new in changes:
+        if attname != 'status':
+            continue
+        if new not in Complaint.RESOLVED_STATUSES:
+            complaint.resolved_at = None
+        elif old not in Complaint.RESOLVED_STATUSES or complaint.resolved_at is None:
+            complaint.resolved_at = at
+
+
+def first_response(at):
+    """UPDATE value for first_response_at: at, unless it is already set"""
+    return Coalesce('first_response_at', Value(at))
+
+
+def response_times(new_status, at):
+    """UPDATE values for a bulk status change to new_status, read against each row's old status"""
+    if new_status in Complaint.RESOLVED_STATUSES:
+        # Moving between resolved statuses keeps the original resolution time
+        resolved_at = Case(
+            When(status__in=Complaint.RESOLVED_STATUSES, resolved_at__isnull=False, then=F('resolved_at')),
+            default=Value(at),
+        )
+    else:
+        resolved_at = Value(None, output_field=DateTimeField())
+    return {'first_response_at': first_response(at), 'resolved_at': resolved_at}
+
+
+def record_bulk(changes, at, actor=None):
+    """Log bulk_update's changes [(complaint_id, attname, old, new)]; its UPDATEs set the response times"""
+    ComplaintStatusEvent.objects.bulk_create(
+        [event(complaint_id, attname, old, new, actor, at) for complaint_id, attname, old, new in changes],
+        batch_size=EVENT_BATCH_SIZE,
+    )
+
+
+def timeline(events, departments, show_actor):
+    """Display rows for a complaint's events, oldest first; departments maps ids to names"""
+    statuses = dict(Complaint.STATUS_CHOICES)
+
+    def label(field, value):
+        if value is None:
+            return 'Unassigned' if field == 'assigned_to' else '-'
+        if field == 'status':
+            return statuses.get(value, value)
+        return departments.get(int(value), 'Removed department')
+
+    return [
+        {
+            'at': event.created_at,
+            'field': event.get_field_display(),
+            'status': event.new_value if event.field == 'status' else None,
+            'old': label(event.field, event.old_value),
+            'new': label(event.field, event.new_value),
+            'actor': (event.actor.get_username() if event.actor else 'System') if show_actor else None,
+        }
+        for event in events
+    ]
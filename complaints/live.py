@@ -0,0 +1,284 @@
+"""Live admin dashboard updates: complaint changes pushed to connected dashboards as Server-Sent Events.
+
+Signals publish an event once the change has committed. Each process has one Broker, which copies
+every event into the queue of each dashboard it is streaming to. The channel carries events to the
+brokers: with LIVE_EVENTS_URL = local:// (the default) a process only sees its own changes, while
+redis://host:6379/0 publishes them on a Redis channel that every process's broker listens to, so
+several workers share one feed.
+
+Events are numbered per broker and the last LIVE_EVENTS_HISTORY are kept, so a dashboard that
+reconnects with Last-Event-ID gets what it missed. When that is no longer possible (the process
+restarted, or the dashboard fell too far behind) it is sent a resync event instead.
+"""
+import asyncio
+import functools
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.urls import reverse
+from django.utils.text import Truncator
+
+from .models import Complaint, Department
+
+logger = logging.getLogger(__name__)
+
+# Client reconnect delay sent with the stream, in milliseconds
+RETRY_MS = 3000
+
+
+class Event:
+    def __init__(self, id, kind, data):
+        self.id = id
+        self.kind = kind
+        self.data = data
+
+    def encode(self):
+        return f'id: {self.id}\nevent: {self.kind}\ndata: {json.dumps(self.data, cls=DjangoJSONEncoder)}\n\n'
+
+
+class Subscription:
+    """One connected dashboard: a bounded queue filled from any thread and read on its event loop"""
+
+    def __init__(self, loop, size):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+    def push(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop has closed; the stream's cleanup will unsubscribe
+            pass
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class Broker:
+    def __init__(self, history=None, queue_size=None):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+        self.recent = deque(maxlen=history or getattr(settings, 'LIVE_EVENTS_HISTORY', 200))
+        self.queue_size = queue_size or getattr(settings, 'LIVE_EVENTS_QUEUE_SIZE', 100)
+        # Distinguishes this process's event ids from those of an earlier or another process
+        self.epoch = secrets.token_hex(4)
+        self.sequence = 0
+
+    def subscribe(self, last_event_id=None):
+        """Register the running event loop's stream; returns it with the events it missed, or None to resync"""
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self.lock:
+            missed = self.missed_since(last_event_id)
+            self.subscriptions.add(subscription)
+        return subscription, missed
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def missed_since(self, last_event_id):
+        if not last_event_id:
+            return []
+        epoch, _, sequence = last_event_id.partition('-')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        oldest = self.sequence - len(self.recent) + 1
+        if sequence < oldest - 1:
+            return None
+        return list(self.recent)[sequence - oldest + 1:]
+
+    def deliver(self, kind, data):
+        with self.lock:
+            self.sequence += 1
+            event = Event(f'{self.epoch}-{self.sequence}', kind, data)
+            self.recent.append(event)
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    def has_subscribers(self):
+        return bool(self.subscriptions)
+
+
+class LocalChannel:
+    """Events stay in the process that published them"""
+
+    def __init__(self, broker, url):
+        self.broker = broker
+
+    def wanted(self):
+        return self.broker.has_subscribers()
+
+    def publish(self, kind, data):
+        self.broker.deliver(kind, data)
+
+    def listen(self):
+        pass
+
+
+class RedisChannel:
+    """Events go through a Redis pub/sub channel; a thread per process feeds them to its broker"""
+
+    def __init__(self, broker, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('A redis:// LIVE_EVENTS_URL needs the redis package')
+        self.redis = redis
+        self.broker = broker
+        self.client = redis.Redis.from_url(url)
+        self.name = getattr(settings, 'LIVE_EVENTS_CHANNEL', 'vent:live')
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def wanted(self):
+        # Dashboards may be connected to any process
+        return True
+
+    def publish(self, kind, data):
+        try:
+            self.client.publish(self.name, json.dumps({'kind': kind, 'data': data}, cls=DjangoJSONEncoder))
+        except self.redis.RedisError as e:
+            # A missed live update must not fail the change that caused it
+            logger.warning('Cannot publish live event %s: %s', kind, e)
+
+    def listen(self):
+        """Start receiving events for this process's broker, once; only processes serving streams need to"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.receive, name='live-events', daemon=True)
+                self.thread.start()
+
+    def receive(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.name)
+                for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    self.broker.deliver(payload['kind'], payload['data'])
+            except self.redis.RedisError as e:
+                logger.warning('Live events channel lost, reconnecting: %s', e)
+                # Whatever was published meanwhile is lost to this process's dashboards
+                self.broker.deliver('resync', {})
+                time.sleep(1)
+
+
+CHANNELS = {
+    'local': LocalChannel,
+    'redis': RedisChannel,
+    'rediss': RedisChannel,
+}
+
+broker = Broker()
+
+
+@functools.cache
+def channel():
+    url = getattr(settings, 'LIVE_EVENTS_URL', 'local://')
+    scheme = urlsplit(url).scheme
+    if scheme not in CHANNELS:
+        raise ImproperlyConfigured(
+            f"LIVE_EVENTS_URL scheme must be one of {', '.join(sorted(CHANNELS))}, not {scheme!r}"
+        )
+    return CHANNELS[scheme](broker, url)
+
+
+def publish_on_commit(kind, build):
+    """Once the transaction commits, publish the event build() returns, unless no dashboard can be listening.
+
+    build() runs only then, so the saves of a site nobody is watching pay nothing for the payload.
+    """
+    def publish():
+        if channel().wanted():
+            channel().publish(kind, build())
+
+    # A failed live update is logged rather than raised from the commit of the change behind it
+    transaction.on_commit(publish, robust=True)
+
+
+def department(value):
+    """{'id', 'name'} for a Department, or for a department id, which is looked up"""
+    if value is None:
+        return {'id': None, 'name': None}
+    if isinstance(value, Department):
+        return {'id': value.pk, 'name': value.name}
+    name = Department.objects.filter(pk=value).values_list('name', flat=True).first()
+    return {'id': value, 'name': name or 'Removed department'}
+
+
+def complaint_data(complaint):
+    """The fields of a dashboard row, for a new complaint"""
+    return {
+        'id': complaint.pk,
+        'type': complaint.type,
+        'category': complaint.category,
+        'category_display': complaint.get_category_display(),
+        'title': Truncator(complaint.title).chars(40),
+        'status': complaint.status,
+        'status_display': complaint.get_status_display(),
+        'department': department(complaint.assigned_to if complaint.assigned_to_id else None),
+        'created_at': complaint.created_at,
+        'url': reverse('complaint_detail', args=[complaint.pk]),
+    }
+
+
+def change_data(changes, assigned_to=None):
+    """An update event for changes [(complaint_id, attname, old, new)], all to the same new values.
+
+    assigned_to is the new Department, when the caller has it loaded. Bulk actions over more than
+    LIVE_EVENTS_MAX_IDS complaints send no ids; dashboards then patch only their counters.
+    """
+    ids = sorted({complaint_id for complaint_id, _, _, _ in changes})
+    data = {'ids': ids if len(ids) <= getattr(settings, 'LIVE_EVENTS_MAX_IDS', 500) else None, 'moved': {}}
+    for _, attname, old, new in changes:
+        if attname == 'status':
+            data['status'] = new
+            data['status_display'] = dict(Complaint.STATUS_CHOICES).get(new, new)
+            data['moved'][old] = data['moved'].get(old, 0) + 1
+        else:
+            data['department'] = department(assigned_to if assigned_to is not None and assigned_to.pk == new else new)
+    return data
+
+
+async def stream(last_event_id=None):
+    """The text/event-stream body for one dashboard, until it disconnects"""
+    channel().listen()
+    subscription, missed = broker.subscribe(last_event_id)
+    keepalive = getattr(settings, 'LIVE_EVENTS_KEEPALIVE', 15)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        if missed is None:
+            yield Event(f'{broker.epoch}-{broker.sequence}', 'resync', {}).encode()
+        for event in missed or ():
+            yield event.encode()
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                # Comments keep proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            if subscription.overflowed:
+                # Too slow to keep up: drop the backlog and have the dashboard reload instead
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.overflowed = False
+                event = Event(event.id, 'resync', {})
+            yield event.encode()
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,166 @@
+import http.client
+import json
+import re
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark_views import percentile
+
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a running server with concurrent logged-in requests and report throughput and latency as JSON; '
+        'run it against gunicorn (WSGI) and uvicorn (ASGI) to compare the two'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base address of the running server')
+        parser.add_argument('--paths', default='/admin/,/admin/?status=pending', help='Comma-separated paths to request in turn')
+        parser.add_argument('--username', default='seed0', help='Account to sign in as (seed0 is the first seed_vent admin)')
+        parser.add_argument('--password', default='seed-pass-123')
+        parser.add_argument('--concurrency', type=int, default=32, help='Simultaneous clients')
+        parser.add_argument('--duration', type=float, default=20, help='Seconds of timed load')
+        parser.add_argument('--warmup', type=float, default=3, help='Seconds of untimed load first')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--compare', help='Earlier JSON report to print throughput changes against')
+
+    def handle(self, *args, **options):
+        target = urlsplit(options['url'])
+        if target.scheme not in ('http', 'https'):
+            raise CommandError('--url must be an http:// or https:// address')
+        self.target = target
+        paths = [path.strip() for path in options['paths'].split(',') if path.strip()]
+        cookie = self.log_in(options['username'], options['password'])
+
+        samples = []
+        lock = threading.Lock()
+        start = time.monotonic()
+        timed_from = start + options['warmup']
+        deadline = timed_from + options['duration']
+
+        def client(offset):
+            connection = self.connect()
+            own = []
+            turn = offset
+            while True:
+                path = paths[turn % len(paths)]
+                turn += 1
+                sent = time.monotonic()
+                if sent >= deadline:
+                    break
+                try:
+                    connection.request('GET', path, headers={'Cookie': cookie})
+                    response = connection.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    status = 'error'
+                if sent >= timed_from:
+                    own.append((path, status, (time.monotonic() - sent) * 1000))
+            connection.close()
+            with lock:
+                samples.extend(own)
+
+        if options['output']:
+            self.stdout.write(
+                f"{options['concurrency']} clients for {options['warmup']:g}s warm-up + {options['duration']:g}s "
+                f"against {options['url']}"
+            )
+        threads = [threading.Thread(target=client, args=(number,)) for number in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        report = {
+            'url': options['url'],
+            'concurrency': options['concurrency'],
+            'duration_s': options['duration'],
+            'results': {path: self.summarise([s for s in samples if s[0] == path], options['duration']) for path in paths},
+            'total': self.summarise(samples, options['duration']),
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(
+                f"{report['total']['requests_per_s']} requests/s; report written to {options['output']}"
+            ))
+        else:
+            self.stdout.write(output)
+        if options['compare']:
+            self.compare(options['compare'], report)
+
+    def connect(self):
+        connection_class = http.client.HTTPSConnection if self.target.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.target.hostname, self.target.port, timeout=30)
+
+    def log_in(self, username, password):
+        """Sign in through the login form and return the Cookie header for the session"""
+        connection = self.connect()
+        try:
+            connection.request('GET', '/accounts/login/')
+            response = connection.getresponse()
+            page = response.read().decode()
+            cookies = SimpleCookie()
+            for header in response.headers.get_all('Set-Cookie') or []:
+                cookies.load(header)
+            match = CSRF_INPUT_RE.search(page)
+            if match is None or 'csrftoken' not in cookies:
+                raise CommandError('Could not read the CSRF token from the login page')
+            body = urlencode({'csrfmiddlewaretoken': match.group(1), 'username': username, 'password': password})
+            connection.request('POST', '/accounts/login/', body=body, headers={
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'Cookie': f"csrftoken={cookies['csrftoken'].value}",
+                'Referer': f'{self.target.scheme}://{self.target.netloc}/accounts/login/',
+            })
+            response = connection.getresponse()
+            response.read()
+            for header in response.headers.get_all('Set-Cookie') or []:
+                cookies.load(header)
+        finally:
+            connection.close()
+        if response.status != 302 or 'sessionid' not in cookies:
+            raise CommandError(f'Could not sign in as {username}; check --username and --password')
+        return '; '.join(f'{name}={morsel.value}' for name, morsel in cookies.items())
+
+    def summarise(self, samples, duration):
+        timings = [elapsed for _, status, elapsed in samples if status != 'error']
+        statuses = {}
+        for _, status, _ in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if not timings:
+            return {'requests': len(samples), 'requests_per_s': 0, 'status': statuses}
+        return {
+            'requests': len(samples),
+            'requests_per_s': round(len(timings) / duration, 1),
+            'status': statuses,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+        }
+
+    def compare(self, path, report):
+        with open(path) as f:
+            baseline = json.load(f)
+        self.stdout.write('\nPath                            req/s before  req/s now   change   p95 before -> now')
+        rows = list(report['results'].items()) + [('(all)', report['total'])]
+        for name, result in rows:
+            before = baseline['total'] if name == '(all)' else baseline['results'].get(name)
+            if not before or 'p95_ms' not in before or 'p95_ms' not in result:
+                continue
+            rate_before = before['requests_per_s']
+            change = (result['requests_per_s'] - rate_before) / rate_before * 100 if rate_before else 0
+            line = (
+                f"{name:<30} {rate_before:>12.1f} {result['requests_per_s']:>10.1f} {change:>+7.1f}%"
+                f"   {before['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms"
+            )
+            style = self.style.ERROR if change < -10 else self.style.SUCCESS if change > 10 else str
+            self.stdout.write(style(line))
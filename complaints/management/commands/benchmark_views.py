@@ -0,0 +1,149 @@
+import json
+import math
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from complaints import stats
+from complaints.models import Complaint
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = 'Time the main views through the test client and report latency percentiles and query counts as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per scenario')
+        parser.add_argument('--scenarios', default='', help='Comma-separated subset of scenarios to run')
+        parser.add_argument('--password', default='seed-pass-123', help='Password of the accounts created by seed_vent')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--compare', help='Earlier JSON report to print p95 changes against')
+
+    def handle(self, *args, **options):
+        admin = User.objects.filter(profile__role='admin', is_active=True).order_by('id').first()
+        student = (
+            User.objects.filter(profile__role='student', is_active=True, complaint__isnull=False)
+            .order_by('id').first()
+        )
+        if admin is None or student is None:
+            raise CommandError('Need an admin and a student with complaints; run seed_vent first')
+        complaint = Complaint.objects.filter(student=student).order_by('-created_at', '-id').first()
+        self.password = options['password']
+
+        scenarios = self.scenarios(admin, student, complaint)
+        if options['scenarios']:
+            wanted = {name.strip() for name in options['scenarios'].split(',')}
+            unknown = wanted - set(scenarios)
+            if unknown:
+                raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+            scenarios = {name: scenario for name, scenario in scenarios.items() if name in wanted}
+
+        # Allows the 'testserver' host and swaps in the in-memory email backend
+        try:
+            setup_test_environment()
+            teardown = True
+        except RuntimeError:
+            teardown = False
+        try:
+            results = {
+                name: self.measure(user, method, url, data, options['iterations'], options['warmup'])
+                for name, (user, method, url, data) in scenarios.items()
+            }
+        finally:
+            if teardown:
+                teardown_test_environment()
+
+        report = {
+            'database': connection.vendor,
+            'complaints': stats.status_counts()['total'],
+            'iterations': options['iterations'],
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote benchmark report to {options['output']}"))
+        else:
+            self.stdout.write(output)
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def scenarios(self, admin, student, complaint):
+        """name -> (user to log in as, method, url, data); a user of None means a fresh anonymous client"""
+        admin_url = reverse('admin_dashboard')
+        return {
+            'admin_dashboard': (admin, 'get', admin_url, {}),
+            'admin_dashboard_filtered': (admin, 'get', admin_url, {'status': 'pending', 'category': 'fees'}),
+            'admin_dashboard_search': (admin, 'get', admin_url, {'search': 'exam'}),
+            'student_dashboard': (student, 'get', reverse('student_dashboard'), {}),
+            'my_complaints': (student, 'get', reverse('my_complaints'), {}),
+            'complaint_detail_admin': (admin, 'get', reverse('complaint_detail', args=[complaint.id]), {}),
+            'complaint_detail_student': (student, 'get', reverse('complaint_detail', args=[complaint.id]), {}),
+            'login_page': (None, 'get', reverse('login'), {}),
+            'login': (None, 'post', reverse('login'), {'username': student.username, 'password': self.password}),
+            'submit_non_anonymous': (student, 'post', reverse('submit_non_anonymous'), {
+                'category': 'facilities', 'title': 'Benchmark complaint', 'description': 'Submitted by benchmark_views',
+            }),
+            'submit_anonymous': (student, 'post', reverse('submit_anonymous'), {
+                'title': 'Benchmark complaint', 'description': 'Submitted by benchmark_views',
+            }),
+        }
+
+    def measure(self, user, method, url, data, iterations, warmup):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        request = getattr(client, method)
+        timings = []
+        queries = []
+        statuses = set()
+        for run in range(warmup + iterations):
+            # Each request is rolled back so repeated runs see the same data
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = request(url, data)
+                    elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+            if run >= warmup:
+                timings.append(elapsed * 1000)
+                queries.append(len(captured.captured_queries))
+                statuses.add(response.status_code)
+        return {
+            'url': url,
+            'method': method.upper(),
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'queries': max(queries),
+        }
+
+    def compare(self, path, results):
+        with open(path) as f:
+            baseline = json.load(f)['results']
+        self.stdout.write('\nScenario                        p95 before  p95 now   change   queries')
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            line = (
+                f"{name:<30} {before['p95_ms']:>10.2f} {result['p95_ms']:>9.2f} {change:>+7.1f}%"
+                f"   {before['queries']} -> {result['queries']}"
+            )
+            style = self.style.ERROR if change > 10 else self.style.SUCCESS if change < -10 else str
+            self.stdout.write(style(line))
@@ -0,0 +1,107 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ventsystem.database import pool_settings
+
+# Server-wide connection counters; they cover every worker process, unlike the pool's own statistics
+SERVER_QUERIES = {
+    'postgresql': [
+        "SELECT coalesce(state, 'unknown'), count(*) FROM pg_stat_activity "
+        "WHERE datname = current_database() GROUP BY state",
+        "SELECT 'max_connections', setting::int FROM pg_settings WHERE name = 'max_connections'",
+    ],
+    'mysql': [
+        "SHOW GLOBAL STATUS WHERE Variable_name IN "
+        "('Threads_connected', 'Threads_running', 'Max_used_connections', 'Connections', 'Aborted_connects')",
+        "SHOW GLOBAL VARIABLES LIKE 'max_connections'",
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = 'Show how database connections are kept (pool or persistent), pool statistics and server connection counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', help='Alias to report on; repeatable (default: all)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+        parser.add_argument('--interval', type=float, help='Repeat every this many seconds until interrupted')
+
+    def handle(self, *args, **options):
+        aliases = options['database'] or list(connections)
+        unknown = [alias for alias in aliases if alias not in connections]
+        if unknown:
+            raise CommandError(f'Unknown database: {", ".join(unknown)}')
+        try:
+            while True:
+                self.report([self.describe(alias) for alias in aliases], options['json'])
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for alias in aliases:
+                if pool_settings(connections[alias].settings_dict) is not None:
+                    connections[alias].close_pool()
+
+    def describe(self, alias):
+        connection = connections[alias]
+        settings_dict = connection.settings_dict
+        pool = pool_settings(settings_dict)
+        info = {
+            'alias': alias,
+            'vendor': connection.vendor,
+            'name': str(settings_dict['NAME']),
+            'host': settings_dict.get('HOST') or '',
+            'mode': 'pool' if pool is not None else 'persistent' if settings_dict['CONN_MAX_AGE'] != 0 else 'per request',
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'health_checks': settings_dict['CONN_HEALTH_CHECKS'],
+        }
+        if pool is not None:
+            info['pool'] = pool
+        try:
+            connection.ensure_connection()
+            if pool is not None:
+                # Statistics of this process's pool: sizes and waits since it opened
+                info['pool_stats'] = connection.pool.get_stats()
+            info['server'] = self.server_counts(connection)
+        except Exception as e:
+            info['error'] = str(e)
+        finally:
+            connection.close()
+        return info
+
+    def server_counts(self, connection):
+        counts = {}
+        with connection.cursor() as cursor:
+            for sql in SERVER_QUERIES.get(connection.vendor, []):
+                cursor.execute(sql)
+                counts.update((str(name).lower(), int(value)) for name, value in cursor.fetchall())
+        return counts
+
+    def report(self, databases, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(databases, indent=2, default=str))
+            return
+        for info in databases:
+            self.stdout.write(f"{info['alias']}: {info['vendor']} {info['name']} {info['host']}".rstrip())
+            if info['mode'] == 'pool':
+                pool = ', '.join(f'{name}={value}' for name, value in info['pool'].items()) or 'driver defaults'
+                self.stdout.write(f'  connections: pooled ({pool})')
+            elif info['mode'] == 'persistent':
+                age = 'unlimited' if info['conn_max_age'] is None else f"{info['conn_max_age']}s"
+                self.stdout.write(f'  connections: persistent per thread, max age {age}')
+            else:
+                self.stdout.write('  connections: opened and closed per request')
+            self.stdout.write(f"  health checks: {'on' if info['health_checks'] else 'off'}")
+            for section in ('pool_stats', 'server'):
+                if info.get(section):
+                    values = ', '.join(f'{name}={value}' for name, value in sorted(info[section].items()))
+                    self.stdout.write(f"  {section.replace('_', ' ')}: {values}")
+            if 'error' in info:
+                self.stdout.write(self.style.ERROR(f"  could not connect: {info['error']}"))
+            else:
+                self.stdout.write(self.style.SUCCESS('  connected'))
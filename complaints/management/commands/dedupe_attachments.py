@@ -0,0 +1,89 @@
+import hashlib
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from complaints import attachments
+from complaints.models import Complaint
+from complaints.storage import CHUNK_SIZE, attachment_storage, is_content_addressed
+
+
+class Command(BaseCommand):
+    help = 'Move existing complaint attachments into content-addressed storage, keeping one copy per distinct file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Hash the files and report what would be merged without changing anything',
+        )
+        parser.add_argument(
+            '--keep-originals',
+            action='store_true',
+            help='Leave the old files in place after the complaints point at the deduplicated copies',
+        )
+
+    def handle(self, *args, **options):
+        storage = attachment_storage()
+        names = [
+            name for name in (
+                Complaint.objects.exclude(attachment='').exclude(attachment=None)
+                .values_list('attachment', flat=True).distinct().order_by()
+            )
+            if not is_content_addressed(name)
+        ]
+        if not names:
+            self.stdout.write(self.style.SUCCESS('All attachments are already content-addressed.'))
+            attachments.rebuild()
+            return
+
+        self.stdout.write(f'Found {len(names)} attachment files to migrate.')
+        if options['dry_run']:
+            self.report(storage, names)
+            return
+
+        moved = {}
+        for name in names:
+            if not storage.exists(name):
+                self.stdout.write(self.style.WARNING(f'  Missing file, skipped: {name}'))
+                continue
+            with storage.open(name) as original:
+                new_name = storage.save(name, original)
+            with transaction.atomic():
+                Complaint.objects.filter(attachment=name).update(attachment=new_name)
+            moved[name] = new_name
+            self.stdout.write(f'  {name} -> {new_name}')
+
+        attachments.rebuild()
+        if not options['keep_originals']:
+            for name in moved:
+                storage.delete(name)
+
+        distinct = len(set(moved.values()))
+        self.stdout.write(self.style.SUCCESS(
+            f'Migrated {len(moved)} files into {distinct} stored copies.'
+        ))
+
+    def report(self, storage, names):
+        digests = {}
+        total = 0
+        for name in names:
+            if not storage.exists(name):
+                self.stdout.write(self.style.WARNING(f'  Missing file: {name}'))
+                continue
+            digest = hashlib.sha256()
+            with storage.open(name) as original:
+                for chunk in original.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+            size = storage.size(name)
+            total += size
+            digests.setdefault(digest.hexdigest(), []).append((name, size))
+
+        reclaimable = sum(size for files in digests.values() for _, size in files[1:])
+        for files in digests.values():
+            if len(files) > 1:
+                self.stdout.write(f"  Duplicates: {', '.join(name for name, _ in files)}")
+        self.stdout.write(self.style.WARNING(
+            f'\nDRY RUN - {len(names)} files, {len(digests)} distinct, '
+            f'{reclaimable} of {total} bytes would be reclaimed'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from complaints import thumbnails
+from complaints.models import Complaint
+
+
+class Command(BaseCommand):
+    help = 'Create missing thumbnails and previews for image attachments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate derivatives that already exist',
+        )
+
+    def handle(self, *args, **options):
+        names = (
+            Complaint.objects.exclude(attachment='').exclude(attachment=None)
+            .values_list('attachment', flat=True).distinct().order_by()
+        )
+        created = failed = 0
+        for name in names.iterator():
+            if not thumbnails.is_image(name):
+                continue
+            results = thumbnails.generate_all(name, force=options['force'])
+            if None in results.values():
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'  Could not read {name} as an image'))
+            else:
+                created += 1
+        self.stdout.write(self.style.SUCCESS(f'Thumbnails ready for {created} images ({failed} unreadable).'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from complaints import stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the complaint status counters from the complaints table'
+
+    def handle(self, *args, **options):
+        rows = stats.rebuild()
+        counts = stats.status_counts()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {rows} counter rows covering {counts["total"]} complaints.')
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from complaints import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for complaints'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Number of complaints written per batch',
+        )
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        self.stdout.write(f'Reindexing complaints with {backend.__class__.__name__}...')
+        indexed = search.reindex(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} complaints.'))
@@ -0,0 +1,24 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from complaints import rollups
+
+
+class Command(BaseCommand):
+    help = 'Update the daily complaint rollups for the days changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every day instead of the changed ones')
+        parser.add_argument(
+            '--overlap', type=int, default=300,
+            help='Seconds before the previous watermark to look back, covering transactions still open then',
+        )
+
+    def handle(self, *args, **options):
+        days, rows, watermark = rollups.run(
+            full=options['full'], overlap=datetime.timedelta(seconds=options['overlap']),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {days} days into {rows} rows; complaints processed through {watermark:%Y-%m-%d %H:%M:%S}.'
+        ))
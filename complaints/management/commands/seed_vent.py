@@ -0,0 +1,197 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Profile
+from complaints import search, stats
+from complaints.models import Complaint, Department
+
+DEFAULT_DEPARTMENTS = 'Registry,Bursary,Estates,Academic Affairs,Student Affairs,ICT'
+
+TITLES = {
+    'exam': ['Missing exam result', 'Clash in exam timetable', 'Script remarking request', 'Exam hall was overcrowded'],
+    'fees': ['Fee payment not reflected', 'Double charge on tuition', 'Refund still pending', 'Wrong fee balance shown'],
+    'facilities': ['Broken projector in lecture hall', 'No water in hostel', 'Library air conditioning down', 'Lab equipment faulty'],
+    'lecturer': ['Lecturer absent for weeks', 'Course outline not followed', 'Grades released late', 'Unclear marking scheme'],
+    'other': ['Noise near study area', 'Shuttle bus always late', 'Portal keeps timing out', 'Cafeteria hygiene concern'],
+}
+DETAILS = [
+    'This has been going on since the start of the semester.',
+    'Several students in my class are affected.',
+    'I have already reported it at the front desk without any response.',
+    'Please look into it before the next assessment period.',
+    'It is affecting my ability to study and attend classes.',
+]
+
+
+def parse_weights(value, choices):
+    """Parse 'a=3,b=1' into weights aligned with choices; unnamed choices get weight 0"""
+    weights = dict.fromkeys(choices, 0.0)
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in weights:
+            raise CommandError(f'Unknown choice "{name}"; expected one of {", ".join(choices)}')
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Invalid weight for "{name}": {weight!r}')
+    if not any(weights.values()):
+        raise CommandError(f'At least one weight must be positive: {value}')
+    return [weights[choice] for choice in choices]
+
+
+@contextmanager
+def explicit_timestamps():
+    """Let bulk_create keep the created_at/updated_at values we generate"""
+    created_at = Complaint._meta.get_field('created_at')
+    updated_at = Complaint._meta.get_field('updated_at')
+    saved = created_at.auto_now_add, updated_at.auto_now
+    created_at.auto_now_add = updated_at.auto_now = False
+    try:
+        yield
+    finally:
+        created_at.auto_now_add, updated_at.auto_now = saved
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, profiles and complaints for load testing and benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000, help='Number of student accounts to create')
+        parser.add_argument('--admins', type=int, default=3, help='Number of admin accounts to create')
+        parser.add_argument('--complaints', type=int, default=10000, help='Number of complaints to create')
+        parser.add_argument('--status-weights', default='pending=40,in_progress=25,resolved=25,closed=10')
+        parser.add_argument('--category-weights', default='exam=30,fees=25,facilities=20,lecturer=15,other=10')
+        parser.add_argument('--anonymous-ratio', type=float, default=0.3, help='Share of anonymous complaints')
+        parser.add_argument('--assigned-ratio', type=float, default=0.6, help='Share of complaints with a department')
+        parser.add_argument('--departments', default=DEFAULT_DEPARTMENTS, help='Comma-separated department names')
+        parser.add_argument('--days', type=int, default=365, help='Spread created_at over this many past days')
+        parser.add_argument('--prefix', default='seed', help='Username prefix for generated accounts')
+        parser.add_argument('--password', default='seed-pass-123', help='Password for every generated account')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create batch')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for repeatable data')
+        parser.add_argument('--skip-index', action='store_true', help='Do not rebuild counters and search index')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.statuses = [choice for choice, _ in Complaint.STATUS_CHOICES]
+        self.categories = [choice for choice, _ in Complaint.CATEGORY_CHOICES]
+        self.status_weights = parse_weights(options['status_weights'], self.statuses)
+        self.category_weights = parse_weights(options['category_weights'], self.categories)
+
+        departments = [
+            Department.objects.get_or_create(name=name.strip())[0].pk
+            for name in options['departments'].split(',') if name.strip()
+        ]
+        # Hashing is deliberately slow, so every generated account shares one hash
+        password = make_password(options['password'])
+
+        start = User.objects.filter(username__startswith=options['prefix']).count()
+        self.create_users(options['prefix'], start, options['admins'], 'admin', password)
+        student_ids = self.create_users(options['prefix'], start + options['admins'], options['students'], 'student', password)
+        if not student_ids and options['anonymous_ratio'] < 1:
+            raise CommandError('Non-anonymous complaints need at least one student; pass --students or --anonymous-ratio 1')
+
+        created = self.create_complaints(options, student_ids, departments)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {options['admins']} admins, {len(student_ids)} students and {created} complaints."
+        ))
+
+        if not options['skip_index']:
+            self.stdout.write('Rebuilding complaint counters and search index...')
+            stats.rebuild()
+            search.reindex()
+            self.stdout.write(self.style.SUCCESS('Counters and search index rebuilt.'))
+
+    def batches(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def create_users(self, prefix, start, count, role, password):
+        """Bulk create accounts with verified profiles; returns the new user ids"""
+        user_ids = []
+        now = timezone.now()
+        numbers = range(start, start + count)
+        for batch in self.batches(numbers):
+            users = [
+                User(
+                    username=f'{prefix}{number}',
+                    email=f'{prefix}{number}@example.com',
+                    password=password,
+                    is_staff=role == 'admin',
+                    date_joined=now,
+                )
+                for number in batch
+            ]
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                # Not every backend returns primary keys from bulk inserts
+                ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'id'))
+                Profile.objects.bulk_create([
+                    Profile(
+                        user_id=ids[f'{prefix}{number}'],
+                        role=role,
+                        student_id=f'{prefix.upper()}{number:07d}' if role == 'student' else None,
+                        full_name=f'{role.title()} {number}',
+                        email_verified=True,
+                    )
+                    for number in batch
+                ])
+            user_ids.extend(ids.values())
+        return user_ids
+
+    def complaint_rows(self, options, student_ids, departments):
+        rng = self.rng
+        now = timezone.now()
+        span = timedelta(days=options['days']).total_seconds()
+        for _ in range(options['complaints']):
+            anonymous = not student_ids or rng.random() < options['anonymous_ratio']
+            category = 'other' if anonymous else rng.choices(self.categories, self.category_weights)[0]
+            status = rng.choices(self.statuses, self.status_weights)[0]
+            created_at = now - timedelta(seconds=rng.random() * span)
+            updated_at = created_at
+            if status != 'pending':
+                updated_at = min(now, created_at + timedelta(hours=rng.random() * 24 * 14))
+            assigned = departments and (status != 'pending' or rng.random() < options['assigned_ratio'])
+            # The status log starts empty; its response times are filled in as complaints.history would have
+            first_response_at = None
+            if status != 'pending':
+                first_response_at = created_at + (updated_at - created_at) * rng.random()
+            elif assigned:
+                first_response_at = min(now, created_at + timedelta(hours=rng.random() * 48))
+            yield Complaint(
+                student_id=None if anonymous else rng.choice(student_ids),
+                type='anonymous' if anonymous else 'non_anonymous',
+                category=category,
+                title=rng.choice(TITLES[category]),
+                description=' '.join(rng.sample(DETAILS, 2)),
+                status=status,
+                assigned_to_id=rng.choice(departments) if assigned else None,
+                created_at=created_at,
+                updated_at=updated_at,
+                first_response_at=first_response_at,
+                resolved_at=updated_at if status in Complaint.RESOLVED_STATUSES else None,
+            )
+
+    def create_complaints(self, options, student_ids, departments):
+        created = 0
+        with explicit_timestamps():
+            for batch in self.batches(self.complaint_rows(options, student_ids, departments)):
+                Complaint.objects.bulk_create(batch)
+                created += len(batch)
+                self.stdout.write(f'  {created}/{options["complaints"]} complaints')
+        return created
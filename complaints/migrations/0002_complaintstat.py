@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:16
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    Complaint = apps.get_model('complaints', 'Complaint')
+    ComplaintStat = apps.get_model('complaints', 'ComplaintStat')
+    db_alias = schema_editor.connection.alias
+    counters = {}
+    rows = Complaint.objects.using(db_alias).values('status', 'type', 'category').annotate(total=Count('id')).order_by()
+    for row in rows:
+        key = (row['status'], row['type'], row['category'] or '')
+        counters[key] = counters.get(key, 0) + row['total']
+    ComplaintStat.objects.using(db_alias).bulk_create([
+        ComplaintStat(status=status, type=complaint_type, category=category, count=total)
+        for (status, complaint_type, category), total in counters.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_progress', 'In Progress'), ('resolved', 'Resolved'), ('closed', 'Closed')], max_length=20)),
+                ('type', models.CharField(choices=[('anonymous', 'Anonymous'), ('non_anonymous', 'Non-Anonymous')], max_length=20)),
+                ('category', models.CharField(blank=True, default='', max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('status', 'type', 'category'), name='complaint_stat_key_unique')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The full-text index as it was when this migration was written, per database vendor; kept here
+# rather than imported from complaints.search so later changes there cannot alter this migration
+DOCUMENT_TABLE = 'complaints_complaintsearchdocument'
+SQLITE_FTS_TABLE = 'complaints_search_fts'
+SQLITE_COLUMNS = 'title, description, student'
+POSTGRES_DOCUMENT = "to_tsvector('simple', title || ' ' || description || ' ' || student)"
+
+CREATE_INDEX = {
+    'sqlite': [
+        f"CREATE VIRTUAL TABLE {SQLITE_FTS_TABLE} USING fts5("
+        f"title, description, student, content='{DOCUMENT_TABLE}', content_rowid='complaint_id')",
+        f"CREATE TRIGGER {SQLITE_FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN "
+        f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, {SQLITE_COLUMNS}) "
+        f"VALUES (new.complaint_id, new.title, new.description, new.student); END",
+        f"CREATE TRIGGER {SQLITE_FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN "
+        f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, {SQLITE_COLUMNS}) "
+        f"VALUES ('delete', old.complaint_id, old.title, old.description, old.student); END",
+        f"CREATE TRIGGER {SQLITE_FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN "
+        f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, {SQLITE_COLUMNS}) "
+        f"VALUES ('delete', old.complaint_id, old.title, old.description, old.student); "
+        f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, {SQLITE_COLUMNS}) "
+        f"VALUES (new.complaint_id, new.title, new.description, new.student); END",
+    ],
+    'mysql': [
+        f"CREATE FULLTEXT INDEX complaints_search_fulltext ON {DOCUMENT_TABLE} (title, description, student)",
+    ],
+    'postgresql': [
+        f"CREATE INDEX complaints_search_tsv ON {DOCUMENT_TABLE} USING GIN (({POSTGRES_DOCUMENT}))",
+    ],
+}
+
+DROP_INDEX = {
+    'sqlite': [
+        f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ai",
+        f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ad",
+        f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_au",
+        f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}",
+    ],
+    'mysql': [
+        f"DROP INDEX complaints_search_fulltext ON {DOCUMENT_TABLE}",
+    ],
+    'postgresql': [
+        "DROP INDEX IF EXISTS complaints_search_tsv",
+    ],
+}
+
+
+def create_search_index(apps, schema_editor):
+    # Other databases are searched by substring, without an index
+    for sql in CREATE_INDEX.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    for sql in DROP_INDEX.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def populate_search_documents(apps, schema_editor):
+    Complaint = apps.get_model('complaints', 'Complaint')
+    ComplaintSearchDocument = apps.get_model('complaints', 'ComplaintSearchDocument')
+    db_alias = schema_editor.connection.alias
+    batch = []
+    complaints = Complaint.objects.using(db_alias).select_related('student').order_by('id')
+    for complaint in complaints.iterator(chunk_size=2000):
+        student = complaint.student
+        batch.append(ComplaintSearchDocument(
+            complaint_id=complaint.pk,
+            title=complaint.title,
+            description=complaint.description,
+            student=f"{student.username} {student.email}" if student else '',
+        ))
+        if len(batch) >= 2000:
+            ComplaintSearchDocument.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    ComplaintSearchDocument.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0002_complaintstat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintSearchDocument',
+            fields=[
+                ('complaint', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='complaints.complaint')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('student', models.CharField(blank=True, default='', help_text='Student username and email', max_length=400)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fold_assigned_to(apps, schema_editor):
+    """Create one Department per distinct free-text assignee (case-insensitive) and link complaints to it"""
+    Complaint = apps.get_model('complaints', 'Complaint')
+    Department = apps.get_model('complaints', 'Department')
+    db_alias = schema_editor.connection.alias
+    departments = {}
+    raw_values = (
+        Complaint.objects.using(db_alias)
+        .exclude(assigned_to__isnull=True)
+        .exclude(assigned_to='')
+        .order_by('assigned_to')
+        .values_list('assigned_to', flat=True)
+        .distinct()
+    )
+    for raw_value in raw_values:
+        name = ' '.join(raw_value.split())
+        if not name:
+            continue
+        key = name.casefold()
+        if key not in departments:
+            departments[key] = Department.objects.using(db_alias).create(name=name)
+        Complaint.objects.using(db_alias).filter(assigned_to=raw_value).update(department=departments[key])
+
+
+def unfold_assigned_to(apps, schema_editor):
+    Complaint = apps.get_model('complaints', 'Complaint')
+    Department = apps.get_model('complaints', 'Department')
+    db_alias = schema_editor.connection.alias
+    for department in Department.objects.using(db_alias).all():
+        Complaint.objects.using(db_alias).filter(department=department).update(assigned_to=department.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0004_complaint_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Department',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='complaint',
+            name='department',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='complaints.department'),
+        ),
+        migrations.RunPython(fold_assigned_to, unfold_assigned_to),
+        migrations.RemoveIndex(
+            model_name='complaint',
+            name='complaint_assigned_created_idx',
+        ),
+        migrations.RemoveField(
+            model_name='complaint',
+            name='assigned_to',
+        ),
+        migrations.RenameField(
+            model_name='complaint',
+            old_name='department',
+            new_name='assigned_to',
+        ),
+        migrations.AlterField(
+            model_name='complaint',
+            name='assigned_to',
+            field=models.ForeignKey(blank=True, help_text='Department assigned', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='complaints', to='complaints.department'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['assigned_to', '-created_at', '-id'], name='complaint_assigned_created_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:32
+
+import posixpath
+
+import complaints.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_attachments(apps, schema_editor):
+    Complaint = apps.get_model('complaints', 'Complaint')
+    AttachmentBlob = apps.get_model('complaints', 'AttachmentBlob')
+    db_alias = schema_editor.connection.alias
+    storage = complaints.storage.attachment_storage()
+    attached = Complaint.objects.using(db_alias).exclude(attachment='').exclude(attachment=None)
+    blobs = []
+    for name, total in attached.values_list('attachment').annotate(total=Count('id')).order_by():
+        attached.filter(attachment=name).update(attachment_name=posixpath.basename(name)[:255])
+        try:
+            size = storage.size(name)
+        except OSError:
+            size = 0
+        blobs.append(AttachmentBlob(name=name, size=size, ref_count=total))
+    AttachmentBlob.objects.using(db_alias).bulk_create(blobs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0005_department'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttachmentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='complaint',
+            name='attachment_name',
+            field=models.CharField(blank=True, default='', help_text='Original file name of the attachment', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='complaint',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=complaints.storage.attachment_storage, upload_to='complaints/'),
+        ),
+        migrations.RunPython(populate_attachments, migrations.RunPython.noop),
+    ]
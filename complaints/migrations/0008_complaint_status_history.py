@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-17 05:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def backfill_timestamps(apps, schema_editor):
+    """Complaints from before the status log only have updated_at, the latest possible time for either"""
+    Complaint = apps.get_model('complaints', 'Complaint')
+    db_alias = schema_editor.connection.alias
+    Complaint.objects.using(db_alias).filter(status__in=['resolved', 'closed']).update(resolved_at=F('updated_at'))
+    Complaint.objects.using(db_alias).filter(~Q(status='pending') | Q(assigned_to__isnull=False)).update(first_response_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0007_complaint_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complaint',
+            name='first_response_at',
+            field=models.DateTimeField(blank=True, help_text='First change of status or department', null=True),
+        ),
+        migrations.AddField(
+            model_name='complaint',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, help_text='When the complaint last became resolved or closed', null=True),
+        ),
+        migrations.CreateModel(
+            name='ComplaintStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('status', 'Status'), ('assigned_to', 'Department')], max_length=20)),
+                ('old_value', models.CharField(blank=True, help_text='Status key or department id', max_length=100, null=True)),
+                ('new_value', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('complaint', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='complaints.complaint')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['complaint', 'created_at', 'id'], name='status_event_timeline_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_timestamps, migrations.RunPython.noop),
+    ]
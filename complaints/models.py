@@ -1,5 +1,18 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .storage import attachment_storage
+from .thumbnails import is_image
+
+class Department(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
 
 class Complaint(models.Model):
     TYPE_CHOICES = (
@@ -19,20 +32,153 @@ class Complaint(models.Model):
         ('resolved', 'Resolved'),
         ('closed', 'Closed'),
     )
+    # Statuses that count as handled, for resolved_at and the resolution rates
+    RESOLVED_STATUSES = ('resolved', 'closed')
 
     student = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     type = models.CharField(max_length=20, choices=TYPE_CHOICES)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, null=True, blank=True)
     title = models.CharField(max_length=200)
     description = models.TextField()
-    attachment = models.FileField(upload_to="complaints/", null=True, blank=True)
+    attachment = models.FileField(upload_to="complaints/", storage=attachment_storage, null=True, blank=True)
+    attachment_name = models.CharField(max_length=255, blank=True, default='', help_text="Original file name of the attachment")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
-    assigned_to = models.CharField(max_length=100, null=True, blank=True, help_text="Department or person assigned")
+    assigned_to = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True, related_name='complaints', help_text="Department assigned")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Kept by complaints.history as the status log grows, so SLA reports need not replay it
+    first_response_at = models.DateTimeField(null=True, blank=True, help_text="First change of status or department")
+    resolved_at = models.DateTimeField(null=True, blank=True, help_text="When the complaint last became resolved or closed")
 
     class Meta:
         ordering = ['-created_at']
+        # Match the filter + newest-first shapes used by the dashboards and keyset pagination
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='complaint_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='complaint_status_created_idx'),
+            models.Index(fields=['type', '-created_at', '-id'], name='complaint_type_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='complaint_category_created_idx'),
+            models.Index(fields=['student', 'type', '-created_at', '-id'], name='complaint_student_type_idx'),
+            models.Index(fields=['assigned_to', '-created_at', '-id'], name='complaint_assigned_created_idx'),
+            # Finds the rows changed since the last rollup_complaints run
+            models.Index(fields=['updated_at'], name='complaint_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} - {self.title}"
+
+    @property
+    def attachment_is_image(self):
+        return bool(self.attachment) and is_image(self.attachment.name)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the values as loaded so signal handlers can tell what changed on save
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        # The snapshot no longer matches the refreshed values; the next save reads it again
+        self._loaded_values = None
+        super().refresh_from_db(*args, **kwargs)
+
+    def save(self, *args, **kwargs):
+        # Derived tables (e.g. ComplaintStat) are updated from signals inside this transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            return super().delete(*args, **kwargs)
+
+class ComplaintStat(models.Model):
+    """Running complaint count per (status, type, category), maintained by complaints.stats"""
+    status = models.CharField(max_length=20, choices=Complaint.STATUS_CHOICES)
+    type = models.CharField(max_length=20, choices=Complaint.TYPE_CHOICES)
+    category = models.CharField(max_length=20, blank=True, default='')
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['status', 'type', 'category'], name='complaint_stat_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.status}/{self.type}/{self.category or '-'}: {self.count}"
+
+class ComplaintStatusEvent(models.Model):
+    """One change of a complaint's status or department; rows are only ever added, see complaints.history"""
+    FIELD_CHOICES = (
+        ('status', 'Status'),
+        ('assigned_to', 'Department'),
+    )
+
+    # Covered by the timeline index below
+    complaint = models.ForeignKey(Complaint, on_delete=models.CASCADE, related_name='status_events', db_index=False)
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    old_value = models.CharField(max_length=100, null=True, blank=True, help_text="Status key or department id")
+    new_value = models.CharField(max_length=100, null=True, blank=True)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['complaint', 'created_at', 'id'], name='status_event_timeline_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.complaint_id} {self.field}: {self.old_value} -> {self.new_value}"
+
+class ComplaintDailyStats(models.Model):
+    """Complaints created on a day per (category, status, type), as they stand now; maintained by complaints.rollups"""
+    day = models.DateField()
+    category = models.CharField(max_length=20, blank=True, default='')
+    status = models.CharField(max_length=20, choices=Complaint.STATUS_CHOICES)
+    type = models.CharField(max_length=20, choices=Complaint.TYPE_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'complaint daily stats'
+        # Also the index for the trend queries, which filter on day and group by category and status
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category', 'status', 'type'], name='complaint_daily_stats_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status}/{self.type}/{self.category or '-'}: {self.count}"
+
+class RollupWatermark(models.Model):
+    """updated_at up to which a rollup has processed its source rows"""
+    name = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} through {self.processed_until}"
+
+class RollupDirtyDay(models.Model):
+    """A day to roll up again because a complaint created on it was deleted, which updated_at cannot show"""
+    day = models.DateField(unique=True)
+
+    def __str__(self):
+        return str(self.day)
+
+class ComplaintSearchDocument(models.Model):
+    """Denormalized text of a complaint, indexed by the database's full-text engine (see complaints.search)"""
+    complaint = models.OneToOneField(Complaint, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    student = models.CharField(max_length=400, blank=True, default='', help_text="Student username and email")
+
+    def __str__(self):
+        return f"Search document for complaint #{self.complaint_id}"
+
+class AttachmentBlob(models.Model):
+    """One stored attachment file and how many complaints reference it, maintained by complaints.attachments"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.type} - {self.title}"
\ No newline at end of file
+        return f"{self.name} ({self.ref_count} references)"
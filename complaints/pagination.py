@@ -0,0 +1,182 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+NEXT = 'next'
+PREVIOUS = 'prev'
+
+
+def encode_cursor(direction, **position):
+    payload = json.dumps({'d': direction, **position}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode an opaque cursor; malformed tokens decode to None (the first page)"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(cursor, dict) or cursor.get('d') not in (NEXT, PREVIOUS):
+        return None
+    return cursor
+
+
+class CursorPage:
+    """One page of results plus opaque cursors for its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, estimated_count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.estimated_count = estimated_count
+        self.last_cursor = encode_cursor(PREVIOUS)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __repr__(self):
+        return f"<CursorPage of {len(self)} items>"
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset pagination over a queryset ordered newest first by (created_at, id).
+
+    Each page is one indexed range scan of per_page + 1 rows, so page 500 costs the
+    same as page 1. Only the Last page needs the total, taken from estimated_count when given.
+    """
+
+    def __init__(self, queryset, per_page, estimated_count=None):
+        self.queryset = queryset.order_by('-created_at', '-id')
+        self.per_page = per_page
+        self.estimated_count = estimated_count
+
+    def _cursor_for(self, direction, complaint):
+        return encode_cursor(direction, k=[complaint.created_at.isoformat(), complaint.pk])
+
+    def _position(self, cursor):
+        try:
+            created_at, pk = cursor['k']
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (KeyError, TypeError, ValueError):
+            return None
+        if created_at is None:
+            return None
+        return created_at, pk
+
+    def _parse(self, token):
+        """(direction, position) for a cursor; a previous-cursor without a position asks for the last page"""
+        cursor = decode_cursor(token)
+        if cursor is None or 'k' not in cursor:
+            return (cursor or {}).get('d', NEXT), None
+        position = self._position(cursor)
+        if position is None:
+            # Tampered position: start over like any other malformed cursor
+            return NEXT, None
+        return cursor['d'], position
+
+    def _last_page_size(self, count):
+        # The rows left over after whole pages, so Last shows the page that following Next reaches
+        return (count - 1) % self.per_page + 1 if count else self.per_page
+
+    def _page_query(self, direction, position, size):
+        """The size + 1 row query for a cursor, reading backwards from it for previous-cursors"""
+        if direction == PREVIOUS:
+            queryset = self.queryset.reverse()
+            if position:
+                created_at, pk = position
+                queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+        else:
+            queryset = self.queryset
+            if position:
+                created_at, pk = position
+                queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        return queryset[:size + 1]
+
+    def _make_page(self, rows, direction, position, size):
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if direction == PREVIOUS:
+            rows = rows[::-1]
+            has_previous, has_next = has_more, position is not None
+        else:
+            has_previous, has_next = position is not None, has_more
+
+        return CursorPage(
+            rows,
+            next_cursor=self._cursor_for(NEXT, rows[-1]) if rows and has_next else None,
+            previous_cursor=self._cursor_for(PREVIOUS, rows[0]) if rows and has_previous else None,
+            estimated_count=self.estimated_count,
+        )
+
+    def get_page(self, token):
+        direction, position = self._parse(token)
+        size = self.per_page
+        if direction == PREVIOUS and position is None:
+            count = self.estimated_count if self.estimated_count is not None else self.queryset.count()
+            size = self._last_page_size(count)
+        rows = list(self._page_query(direction, position, size))
+        return self._make_page(rows, direction, position, size)
+
+    async def aget_page(self, token):
+        direction, position = self._parse(token)
+        size = self.per_page
+        if direction == PREVIOUS and position is None:
+            count = self.estimated_count if self.estimated_count is not None else await self.queryset.acount()
+            size = self._last_page_size(count)
+        rows = [row async for row in self._page_query(direction, position, size)]
+        return self._make_page(rows, direction, position, size)
+
+
+class RankedPaginator:
+    """Pages through a bounded, pre-ranked list of ids (e.g. full-text search hits) by position.
+
+    The ids must already pass the queryset's filters (see search.search_complaints' within);
+    the queryset only loads the rows of the current page.
+    """
+
+    def __init__(self, queryset, ranked_ids, per_page):
+        self.queryset = queryset
+        self.ranked_ids = list(ranked_ids)
+        self.per_page = per_page
+
+    def get_page(self, token):
+        cursor = decode_cursor(token)
+        total = len(self.ranked_ids)
+        last_offset = max((total - 1) // self.per_page * self.per_page, 0)
+        offset = 0
+        if cursor:
+            offset = cursor.get('o', last_offset if cursor['d'] == PREVIOUS else 0)
+            if not isinstance(offset, int) or not 0 <= offset <= last_offset:
+                offset = 0
+
+        page_ids = self.ranked_ids[offset:offset + self.per_page]
+        rows_by_id = self.queryset.order_by().in_bulk(page_ids)
+        rows = [rows_by_id[pk] for pk in page_ids if pk in rows_by_id]
+
+        next_offset = offset + self.per_page
+        return CursorPage(
+            rows,
+            next_cursor=encode_cursor(NEXT, o=next_offset) if next_offset < total else None,
+            previous_cursor=encode_cursor(PREVIOUS, o=max(offset - self.per_page, 0)) if offset else None,
+            estimated_count=total,
+        )
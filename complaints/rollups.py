@@ -0,0 +1,126 @@
+"""Daily complaint counts in ComplaintDailyStats, and the weekly trends read from them.
+
+A day's rows count the complaints created that day by (category, status, type) as they stand now,
+so they change whenever one of those complaints is updated. Each run recomputes only the days of
+complaints whose updated_at is past the watermark, plus days marked dirty by deletions; recomputing
+a day replaces its rows, so runs are idempotent.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Complaint, ComplaintDailyStats, RollupDirtyDay, RollupWatermark
+
+WATERMARK = 'complaint_daily_stats'
+DAYS_PER_QUERY = 31
+
+
+def day_range(day):
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
+
+
+def changed_days(since):
+    """Creation days of complaints updated after since; every day when since is None"""
+    complaints = Complaint.objects.all()
+    if since is not None:
+        complaints = complaints.filter(updated_at__gt=since)
+    return set(complaints.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct().order_by())
+
+
+def rollup_days(days):
+    """Replace the rows of the given days with fresh counts; returns the number of rows written"""
+    days = sorted(days)
+    written = 0
+    for start in range(0, len(days), DAYS_PER_QUERY):
+        chunk = days[start:start + DAYS_PER_QUERY]
+        created_on = Q()
+        for day in chunk:
+            day_start, day_end = day_range(day)
+            created_on |= Q(created_at__gte=day_start, created_at__lt=day_end)
+        counts = (
+            Complaint.objects.filter(created_on)
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'category', 'status', 'type')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        rows = [
+            ComplaintDailyStats(
+                day=row['day'], category=row['category'] or '', status=row['status'], type=row['type'], count=row['total'],
+            )
+            for row in counts
+        ]
+        ComplaintDailyStats.objects.filter(day__in=chunk).delete()
+        ComplaintDailyStats.objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+
+def run(full=False, overlap=datetime.timedelta(minutes=5)):
+    """Bring the rollups up to date and return (days recomputed, rows written, new watermark).
+
+    Rows are read from overlap before the previous watermark, so a transaction that saved a complaint
+    before the last run started but committed after it is still picked up.
+    """
+    started = timezone.now()
+    with transaction.atomic():
+        # Locked so concurrent runs take turns instead of rewriting the same days at once
+        watermark = RollupWatermark.objects.select_for_update().filter(name=WATERMARK).first()
+        if full or watermark is None:
+            days = changed_days(None)
+            ComplaintDailyStats.objects.all().delete()
+            dirty = list(RollupDirtyDay.objects.values_list('pk', flat=True))
+        else:
+            days = changed_days(watermark.processed_until - overlap)
+            dirty_days = dict(RollupDirtyDay.objects.values_list('pk', 'day'))
+            days.update(dirty_days.values())
+            dirty = list(dirty_days)
+        written = rollup_days(days)
+        RollupDirtyDay.objects.filter(pk__in=dirty).delete()
+        RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={'processed_until': started})
+    return len(days), written, started
+
+
+def mark_dirty(created_at):
+    RollupDirtyDay.objects.bulk_create(
+        [RollupDirtyDay(day=timezone.localdate(created_at))], ignore_conflicts=True,
+    )
+
+
+def weekly_trends(weeks, today=None):
+    """Complaints created per week (Monday first) by category and status, and the share resolved"""
+    today = today or timezone.localdate()
+    first_week = today - datetime.timedelta(days=today.weekday(), weeks=weeks - 1)
+    week_starts = [first_week + datetime.timedelta(weeks=number) for number in range(weeks)]
+    categories = {choice: [0] * weeks for choice, _ in Complaint.CATEGORY_CHOICES}
+    statuses = {choice: [0] * weeks for choice, _ in Complaint.STATUS_CHOICES}
+    totals = [0] * weeks
+
+    rows = (
+        ComplaintDailyStats.objects.filter(day__gte=first_week)
+        .values('day', 'category', 'status')
+        .annotate(total=Sum('count'))
+        .order_by()
+    )
+    for row in rows:
+        week = (row['day'] - first_week).days // 7
+        if week >= weeks:
+            continue
+        categories.setdefault(row['category'] or 'uncategorised', [0] * weeks)[week] += row['total']
+        statuses.setdefault(row['status'], [0] * weeks)[week] += row['total']
+        totals[week] += row['total']
+
+    resolved = [sum(statuses.get(status, [0] * weeks)[week] for status in Complaint.RESOLVED_STATUSES) for week in range(weeks)]
+    watermark = RollupWatermark.objects.filter(name=WATERMARK).values_list('processed_until', flat=True).first()
+    return {
+        'weeks': [week.isoformat() for week in week_starts],
+        'totals': totals,
+        'categories': categories,
+        'statuses': statuses,
+        'resolution_rate': [round(done / total * 100, 1) if total else None for done, total in zip(resolved, totals)],
+        'rolled_up_until': watermark.isoformat() if watermark else None,
+    }
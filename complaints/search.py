@@ -0,0 +1,356 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Complaint, ComplaintSearchDocument
+
+DOCUMENT_TABLE = ComplaintSearchDocument._meta.db_table
+SQLITE_FTS_TABLE = 'complaints_search_fts'
+MYSQL_FULLTEXT_INDEX = 'complaints_search_fulltext'
+POSTGRES_GIN_INDEX = 'complaints_search_tsv'
+POSTGRES_DOCUMENT = "to_tsvector('simple', title || ' ' || description || ' ' || student)"
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())[:10]
+
+
+def document_fields(complaint):
+    student = complaint.student
+    return {
+        'title': complaint.title,
+        'description': complaint.description,
+        'student': f"{student.username} {student.email}" if student else '',
+    }
+
+
+class SearchBackend:
+    """Stores one ComplaintSearchDocument per complaint; subclasses add the engine-specific index and query"""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    @property
+    def connection(self):
+        return connections[self.alias]
+
+    def create_index(self, schema_editor):
+        pass
+
+    def drop_index(self, schema_editor):
+        pass
+
+    def index(self, complaint):
+        ComplaintSearchDocument.objects.using(self.alias).update_or_create(
+            complaint_id=complaint.pk, defaults=document_fields(complaint)
+        )
+
+    def optimize(self):
+        pass
+
+    def search(self, query, limit, within=None):
+        """Return up to limit complaint ids matching query, best match first.
+
+        within, a Complaint queryset, narrows the matches before the limit is applied.
+        """
+        raise NotImplementedError
+
+    def match_ids(self, tokens):
+        """(sql, params) of a SELECT of every complaint id matching all tokens"""
+        raise NotImplementedError
+
+    def filter(self, queryset, query):
+        """queryset narrowed to the complaints matching query, however many there are"""
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+        return queryset.filter(id__in=RawSQL(*self.match_ids(tokens)))
+
+    def _within(self, within, column):
+        """An AND condition limiting column to the ids of the queryset within, and its params"""
+        if within is None:
+            return '', []
+        try:
+            sql, params = within.order_by().values('id').query.get_compiler(self.alias).as_sql()
+        except EmptyResultSet:
+            # within is .none(), e.g. filtered by an unknown department
+            return ' AND 1 = 0', []
+        return f' AND {column} IN ({sql})', list(params)
+
+    def _fetch_ids(self, sql, params):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """FTS5 external-content table over the document table, kept in sync by triggers"""
+
+    def create_index(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {SQLITE_FTS_TABLE} USING fts5("
+            f"title, description, student, content='{DOCUMENT_TABLE}', content_rowid='complaint_id')"
+        )
+        columns = 'title, description, student'
+        schema_editor.execute(
+            f"CREATE TRIGGER {SQLITE_FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN "
+            f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, {columns}) "
+            f"VALUES (new.complaint_id, new.title, new.description, new.student); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {SQLITE_FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN "
+            f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, {columns}) "
+            f"VALUES ('delete', old.complaint_id, old.title, old.description, old.student); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {SQLITE_FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN "
+            f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, {columns}) "
+            f"VALUES ('delete', old.complaint_id, old.title, old.description, old.student); "
+            f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, {columns}) "
+            f"VALUES (new.complaint_id, new.title, new.description, new.student); END"
+        )
+
+    def drop_index(self, schema_editor):
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}")
+
+    def optimize(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('optimize')")
+
+    def _match(self, tokens):
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def match_ids(self, tokens):
+        return f"SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s", [self._match(tokens)]
+
+    def search(self, query, limit, within=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        restrict, restrict_params = self._within(within, 'rowid')
+        return self._fetch_ids(
+            f"SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s{restrict} ORDER BY rank LIMIT %s",
+            [self._match(tokens), *restrict_params, limit],
+        )
+
+
+class MySQLFulltextBackend(SearchBackend):
+    """InnoDB FULLTEXT index over the document columns, queried in boolean mode for prefix matches.
+
+    A required term that the index cannot hold (a stopword, or a word outside the
+    innodb_ft_min/max_token_size range) makes a boolean query match nothing, so such tokens
+    are matched as substrings of the document columns instead.
+    """
+
+    def __init__(self, alias):
+        super().__init__(alias)
+        self._token_rules = None
+
+    def create_index(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE FULLTEXT INDEX {MYSQL_FULLTEXT_INDEX} ON {DOCUMENT_TABLE} (title, description, student)"
+        )
+
+    def drop_index(self, schema_editor):
+        schema_editor.execute(f"DROP INDEX {MYSQL_FULLTEXT_INDEX} ON {DOCUMENT_TABLE}")
+
+    def optimize(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"OPTIMIZE TABLE {DOCUMENT_TABLE}")
+            cursor.fetchall()
+
+    def token_rules(self):
+        """(min token size, max token size, stopwords) the FULLTEXT index was built with"""
+        if self._token_rules is None:
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT @@innodb_ft_min_token_size, @@innodb_ft_max_token_size, "
+                    "@@innodb_ft_enable_stopword, @@innodb_ft_server_stopword_table"
+                )
+                min_size, max_size, stopwords_enabled, stopword_table = cursor.fetchone()
+                stopwords = set()
+                if stopwords_enabled:
+                    if stopword_table:
+                        database, table = stopword_table.split('/')
+                        cursor.execute(f"SELECT value FROM `{database}`.`{table}`")
+                    else:
+                        cursor.execute("SELECT value FROM INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD")
+                    stopwords = {row[0].lower() for row in cursor.fetchall()}
+            self._token_rules = (min_size, max_size, stopwords)
+        return self._token_rules
+
+    def _condition(self, tokens):
+        """WHERE condition on the document table matching every token, with its params and the boolean query"""
+        min_size, max_size, stopwords = self.token_rules()
+        indexed = [token for token in tokens if min_size <= len(token) <= max_size and token not in stopwords]
+        match = ' '.join(f'+{token}*' for token in indexed)
+        conditions, params = [], []
+        if indexed:
+            conditions.append('MATCH(title, description, student) AGAINST (%s IN BOOLEAN MODE)')
+            params.append(match)
+        for token in tokens:
+            if token not in indexed:
+                pattern = '%' + token.replace('_', '\\_') + '%'
+                conditions.append('(title LIKE %s OR description LIKE %s OR student LIKE %s)')
+                params += [pattern] * 3
+        return ' AND '.join(conditions), params, match
+
+    def match_ids(self, tokens):
+        condition, params, _ = self._condition(tokens)
+        return f"SELECT complaint_id FROM {DOCUMENT_TABLE} WHERE {condition}", params
+
+    def search(self, query, limit, within=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        condition, params, match = self._condition(tokens)
+        restrict, restrict_params = self._within(within, 'complaint_id')
+        if match:
+            score, score_params = 'MATCH(title, description, student) AGAINST (%s IN BOOLEAN MODE)', [match]
+        else:
+            score, score_params = '0', []
+        return self._fetch_ids(
+            f"SELECT complaint_id, {score} AS score FROM {DOCUMENT_TABLE} WHERE {condition}{restrict} "
+            f"ORDER BY score DESC, complaint_id DESC LIMIT %s",
+            [*score_params, *params, *restrict_params, limit],
+        )
+
+
+class PostgreSQLBackend(SearchBackend):
+    """GIN index on a tsvector expression, ranked with ts_rank"""
+
+    def create_index(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE INDEX {POSTGRES_GIN_INDEX} ON {DOCUMENT_TABLE} USING GIN (({POSTGRES_DOCUMENT}))"
+        )
+
+    def drop_index(self, schema_editor):
+        schema_editor.execute(f"DROP INDEX IF EXISTS {POSTGRES_GIN_INDEX}")
+
+    def optimize(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {DOCUMENT_TABLE}")
+
+    def _tsquery(self, tokens):
+        return ' & '.join(f'{token}:*' for token in tokens)
+
+    def match_ids(self, tokens):
+        return (
+            f"SELECT complaint_id FROM {DOCUMENT_TABLE} WHERE {POSTGRES_DOCUMENT} @@ to_tsquery('simple', %s)",
+            [self._tsquery(tokens)],
+        )
+
+    def search(self, query, limit, within=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        tsquery = self._tsquery(tokens)
+        restrict, restrict_params = self._within(within, 'complaint_id')
+        return self._fetch_ids(
+            f"SELECT complaint_id FROM {DOCUMENT_TABLE} "
+            f"WHERE {POSTGRES_DOCUMENT} @@ to_tsquery('simple', %s){restrict} "
+            f"ORDER BY ts_rank({POSTGRES_DOCUMENT}, to_tsquery('simple', %s)) DESC LIMIT %s",
+            [tsquery, *restrict_params, tsquery, limit],
+        )
+
+
+class SubstringBackend(SearchBackend):
+    """Fallback for engines without a full-text index: substring match on the single document table"""
+
+    def _documents(self, tokens):
+        documents = ComplaintSearchDocument.objects.using(self.alias)
+        for token in tokens:
+            documents = documents.filter(
+                Q(title__icontains=token) | Q(description__icontains=token) | Q(student__icontains=token)
+            )
+        return documents
+
+    def filter(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+        return queryset.filter(id__in=self._documents(tokens).values('complaint_id'))
+
+    def search(self, query, limit, within=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        documents = self._documents(tokens)
+        if within is not None:
+            documents = documents.filter(complaint_id__in=within.order_by().values('id'))
+        return list(documents.order_by('-complaint_id').values_list('complaint_id', flat=True)[:limit])
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTS5Backend,
+    'mysql': MySQLFulltextBackend,
+    'postgresql': PostgreSQLBackend,
+}
+
+_backends = {}
+
+
+def get_backend(alias=None):
+    """Search backend for the database alias, chosen by COMPLAINT_SEARCH_BACKEND or the database vendor"""
+    alias = alias or router.db_for_write(ComplaintSearchDocument)
+    if alias not in _backends:
+        backend_path = getattr(settings, 'COMPLAINT_SEARCH_BACKEND', None)
+        if backend_path:
+            backend_class = import_string(backend_path)
+        else:
+            backend_class = VENDOR_BACKENDS.get(connections[alias].vendor, SubstringBackend)
+        _backends[alias] = backend_class(alias)
+    return _backends[alias]
+
+
+def index_complaint(complaint):
+    get_backend().index(complaint)
+
+
+def search_complaints(query, limit=None, within=None):
+    """Ids of the best matches for query, best first, for ranked display.
+
+    Only the top COMPLAINT_SEARCH_MAX_RESULTS are returned; pass the dashboard's other filters as
+    within (a Complaint queryset) so they are applied before that cut, not after it.
+    """
+    limit = limit or getattr(settings, 'COMPLAINT_SEARCH_MAX_RESULTS', 500)
+    return get_backend(router.db_for_read(ComplaintSearchDocument)).search(query, limit, within)
+
+
+def filter_by_search(queryset, query):
+    """queryset narrowed to every complaint matching query, with no limit (exports, bulk actions)"""
+    return get_backend(queryset.db).filter(queryset, query)
+
+
+def reindex(batch_size=2000):
+    """Rebuild every search document from the complaints table; returns the number indexed"""
+    backend = get_backend()
+    ComplaintSearchDocument.objects.using(backend.alias).all().delete()
+    complaints = (
+        Complaint.objects.using(backend.alias)
+        .select_related('student')
+        .only('id', 'title', 'description', 'student__username', 'student__email')
+        .order_by('id')
+    )
+    batch = []
+    indexed = 0
+    for complaint in complaints.iterator(chunk_size=batch_size):
+        batch.append(ComplaintSearchDocument(complaint_id=complaint.pk, **document_fields(complaint)))
+        if len(batch) >= batch_size:
+            ComplaintSearchDocument.objects.using(backend.alias).bulk_create(batch)
+            indexed += len(batch)
+            batch = []
+    if batch:
+        ComplaintSearchDocument.objects.using(backend.alias).bulk_create(batch)
+        indexed += len(batch)
+    backend.optimize()
+    return indexed
@@ -0,0 +1,108 @@
+import mimetypes
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+
+from .storage import CHUNK_SIZE, is_content_addressed
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def attachment_etag(storage, name):
+    """Strong ETag: the digest for content-addressed files, otherwise size and modification time"""
+    if is_content_addressed(name):
+        return '"%s"' % posixpath.splitext(posixpath.basename(name))[0]
+    return '"%x-%x"' % (storage.size(name), int(storage.get_modified_time(name).timestamp()))
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single 'bytes=' range, None to send everything, or False if unsatisfiable"""
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # bytes=-N asks for the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def read_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_attachment(request, storage, name, filename=''):
+    """Response for a stored attachment after the caller has checked permissions.
+
+    With ATTACHMENT_SERVE_MODE 'accel' (nginx) or 'sendfile' (Apache/lighttpd) only headers are
+    returned and the proxy sends the bytes. Otherwise the file is streamed from here, honouring
+    If-None-Match/If-Modified-Since and single byte ranges.
+    """
+    filename = filename or posixpath.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    etag = attachment_etag(storage, name)
+    last_modified = int(storage.get_modified_time(name).timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    mode = getattr(settings, 'ATTACHMENT_SERVE_MODE', 'django')
+    if mode == 'accel':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(getattr(settings, 'ATTACHMENT_ACCEL_PREFIX', '/protected-media/') + name)
+    elif mode == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = storage.path(name)
+    else:
+        response = stream_file(request, storage, name, content_type, etag)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Content-Disposition'] = content_disposition_header(False, filename)
+    # Permission-checked content must not be stored by shared caches
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+def stream_file(request, storage, name, content_type, etag):
+    size = storage.size(name)
+    byte_range = parse_range(request.headers.get('Range'), size)
+    if_range = request.headers.get('If-Range')
+    if byte_range and if_range and if_range != etag:
+        # The client's partial copy is stale; send the whole file
+        byte_range = None
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            read_range(storage.open(name), start, length), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    else:
+        response = FileResponse(storage.open(name), content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,249 @@
+import os
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from . import attachments, fragments, history, live, rollups, search, stats, thumbnails
+from .departments import invalidate_department_cache
+from .models import Complaint, ComplaintSearchDocument, ComplaintStatusEvent, Department
+
+SEARCH_FIELDS = ('title', 'description', 'student_id')
+
+# Sent by complaints.bulk.bulk_update inside its transaction, with
+# changes=[(complaint_id, field, old_value, new_value), ...], updated_at and actor
+complaints_bulk_updated = Signal()
+
+
+def _loaded_values(instance):
+    return getattr(instance, '_loaded_values', None) or {}
+
+
+def _loaded_stat_key(instance):
+    loaded = _loaded_values(instance)
+    if any(field not in loaded for field in stats.STAT_FIELDS):
+        return None
+    return stats.stat_key(loaded)
+
+
+def _changed(instance, fields):
+    loaded = _loaded_values(instance)
+    return any(field not in loaded or loaded[field] != getattr(instance, field) for field in fields)
+
+
+def _file_name(value):
+    """Stored name of a FieldFile or of a raw column value"""
+    return getattr(value, 'name', value) or ''
+
+
+# Fields whose old values move the status counters and the status log
+TRACKED_FIELDS = (*stats.STAT_FIELDS, *history.LOGGED_FIELDS)
+
+
+def _may_change_tracked(instance, update_fields):
+    loaded = _loaded_values(instance)
+    fields = TRACKED_FIELDS
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields or field.removesuffix('_id') in update_fields]
+    return any(field not in loaded or loaded[field] != getattr(instance, field) for field in fields)
+
+
+@receiver(pre_save, sender=Complaint)
+def load_original_values(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    # The values loaded with the instance may be stale by now. When a tracked field changes, read the row
+    # again and lock it until Complaint.save commits, so concurrent saves cannot both move the counters
+    # from the same old values; other saves keep the loaded values
+    if raw or instance._state.adding or not _may_change_tracked(instance, update_fields):
+        return
+    attnames = [field.attname for field in sender._meta.concrete_fields]
+    original = (
+        sender._default_manager.db_manager(using).select_for_update()
+        .filter(pk=instance.pk).values(*attnames).first()
+    )
+    if original is not None:
+        instance._loaded_values = original
+
+
+@receiver(pre_save, sender=Complaint)
+def stamp_response_times(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    now = timezone.now()
+    if instance._state.adding:
+        if instance.status in Complaint.RESOLVED_STATUSES and instance.resolved_at is None:
+            instance.resolved_at = now
+        return
+    loaded = _loaded_values(instance)
+    changes = [
+        (attname, loaded[attname], getattr(instance, attname))
+        for attname in history.LOGGED_FIELDS
+        if attname in loaded and loaded[attname] != getattr(instance, attname)
+    ]
+    history.stamp(instance, changes, now)
+    instance._status_changes = (changes, now)
+
+
+@receiver(post_save, sender=Complaint)
+def update_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_key = None if created else _loaded_stat_key(instance)
+    stats.record_change(old_key, stats.stat_key(instance))
+
+
+@receiver(post_save, sender=Complaint)
+def update_search_document(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or _changed(instance, SEARCH_FIELDS):
+        search.index_complaint(instance)
+
+
+@receiver(pre_save, sender=Complaint)
+def remember_attachment_name(sender, instance, raw=False, **kwargs):
+    # An uncommitted file is a fresh upload still carrying the name the student gave it
+    if not raw and instance.attachment and not instance.attachment._committed:
+        instance.attachment_name = os.path.basename(instance.attachment.name)[:255]
+
+
+@receiver(post_save, sender=Complaint)
+def update_attachment_references(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = _loaded_values(instance)
+    if not created and 'attachment' not in loaded:
+        return
+    old_name = '' if created else _file_name(loaded['attachment'])
+    new_name = _file_name(instance.attachment)
+    if old_name != new_name:
+        attachments.add_reference(new_name)
+        attachments.release_reference(old_name)
+        if thumbnails.is_image(new_name):
+            transaction.on_commit(lambda: thumbnails.schedule(new_name))
+
+
+@receiver(post_save, sender=Complaint)
+def invalidate_fragments_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    student_ids = {instance.student_id, _loaded_values(instance).get('student_id')} - {None}
+    fragments.invalidate(fragments.ADMIN, *[fragments.user_scope(student_id) for student_id in student_ids])
+
+
+@receiver(post_save, sender=Complaint)
+def publish_live_changes(sender, instance, created, raw=False, **kwargs):
+    # Connected before log_status_changes, which clears _status_changes
+    if raw:
+        return
+    if created:
+        live.publish_on_commit('created', lambda: live.complaint_data(instance))
+        return
+    changes, _ = getattr(instance, '_status_changes', ((), None))
+    if changes:
+        complaint_id = instance.pk
+        live.publish_on_commit('updated', lambda: live.change_data(
+            [(complaint_id, attname, old, new) for attname, old, new in changes],
+            assigned_to=instance.assigned_to if instance.assigned_to_id else None,
+        ))
+
+
+@receiver(post_save, sender=Complaint)
+def log_status_changes(sender, instance, created, raw=False, **kwargs):
+    changes, at = getattr(instance, '_status_changes', ((), None))
+    instance._status_changes = ((), None)
+    if raw or created or not changes:
+        return
+    # changed_by is set by ComplaintStatusForm.save; saves from elsewhere are logged without an actor
+    actor = getattr(instance, 'changed_by', None)
+    ComplaintStatusEvent.objects.bulk_create([
+        history.event(instance.pk, attname, old, new, actor, at) for attname, old, new in changes
+    ])
+
+
+@receiver(post_save, sender=Complaint)
+def remember_saved_values(sender, instance, raw=False, **kwargs):
+    # Connected last so the handlers above still see the pre-save snapshot
+    instance._loaded_values = {
+        field.attname: getattr(instance, field.attname) for field in sender._meta.concrete_fields
+    }
+
+
+@receiver(post_delete, sender=Complaint)
+def update_stats_on_delete(sender, instance, **kwargs):
+    stats.record_change(_loaded_stat_key(instance) or stats.stat_key(instance), None)
+
+
+@receiver(post_delete, sender=Complaint)
+def mark_rollup_day_on_delete(sender, instance, **kwargs):
+    # Deleted rows leave no updated_at behind for rollup_complaints to find
+    if instance.created_at is not None:
+        rollups.mark_dirty(instance.created_at)
+
+
+@receiver(post_delete, sender=Complaint)
+def release_attachment_on_delete(sender, instance, **kwargs):
+    attachments.release_reference(_file_name(instance.attachment))
+
+
+@receiver(post_delete, sender=Complaint)
+def invalidate_fragments_on_delete(sender, instance, **kwargs):
+    scopes = [fragments.ADMIN]
+    if instance.student_id:
+        scopes.append(fragments.user_scope(instance.student_id))
+    fragments.invalidate(*scopes)
+
+
+@receiver(post_delete, sender=Complaint)
+def publish_live_delete(sender, instance, **kwargs):
+    # Read now: the payload is built after commit, when the instance no longer has its pk
+    complaint_id, status = instance.pk, _loaded_values(instance).get('status', instance.status)
+    live.publish_on_commit('deleted', lambda: {'ids': [complaint_id], 'moved': {status: 1}})
+
+
+@receiver(complaints_bulk_updated)
+def log_bulk_status_changes(sender, changes, updated_at, actor=None, **kwargs):
+    history.record_bulk(changes, updated_at, actor)
+
+
+@receiver(complaints_bulk_updated)
+def publish_live_bulk_changes(sender, changes, **kwargs):
+    live.publish_on_commit('updated', lambda: live.change_data(changes))
+
+
+@receiver(complaints_bulk_updated)
+def invalidate_fragments_on_bulk_update(sender, changes, **kwargs):
+    complaint_ids = list({complaint_id for complaint_id, _, _, _ in changes})
+    student_ids = set()
+    for start in range(0, len(complaint_ids), 5000):
+        student_ids.update(
+            Complaint.objects.filter(pk__in=complaint_ids[start:start + 5000], student__isnull=False)
+            .values_list('student_id', flat=True).distinct().order_by()
+        )
+    fragments.invalidate(fragments.ADMIN, *[fragments.user_scope(student_id) for student_id in student_ids])
+
+
+@receiver(post_save, sender=User)
+def start_user_fragments(sender, instance, created, raw=False, **kwargs):
+    # A new account must not pick up fragments cached for an earlier user with the same id
+    if created and not raw:
+        fragments.invalidate(fragments.user_scope(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def update_student_search_documents(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or created:
+        return
+    if update_fields is not None and not {'username', 'email'} & set(update_fields):
+        return
+    ComplaintSearchDocument.objects.filter(complaint__student=instance).update(
+        student=f"{instance.username} {instance.email}"
+    )
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def clear_department_cache(sender, **kwargs):
+    invalidate_department_cache()
+    fragments.invalidate(fragments.DEPARTMENTS)
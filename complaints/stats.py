@@ -0,0 +1,114 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+
+from .models import Complaint, ComplaintStat
+
+STAT_FIELDS = ('status', 'type', 'category')
+
+
+def stat_key(values):
+    """Counter key (status, type, category) for a complaint instance or a values() dict"""
+    if isinstance(values, Complaint):
+        values = {field: getattr(values, field) for field in STAT_FIELDS}
+    return (values['status'], values['type'], values['category'] or '')
+
+
+def adjust(key, delta):
+    """Add delta to the counter row for key, creating the row on first use"""
+    if not delta:
+        return
+    status, complaint_type, category = key
+    lookup = {'status': status, 'type': complaint_type, 'category': category}
+    updated = ComplaintStat.objects.filter(**lookup).update(count=F('count') + delta)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            ComplaintStat.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        # Another transaction created the row first
+        ComplaintStat.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def record_change(old_key, new_key):
+    """Move one complaint from old_key to new_key (either may be None)"""
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        adjust(old_key, -1)
+    if new_key is not None:
+        adjust(new_key, 1)
+
+
+def _status_totals(rows):
+    counts = {status: 0 for status, _ in Complaint.STATUS_CHOICES}
+    for row in rows:
+        counts[row['status']] = row['total'] or 0
+    counts['total'] = sum(counts.values())
+    return counts
+
+
+def _status_rows():
+    return ComplaintStat.objects.values('status').annotate(total=Sum('count')).order_by()
+
+
+def status_counts():
+    """Complaint totals per status plus an overall 'total', read from the counters table in one query"""
+    return _status_totals(_status_rows())
+
+
+async def astatus_counts():
+    return _status_totals([row async for row in _status_rows()])
+
+
+def _matching_stats(filters):
+    if any(value and field not in STAT_FIELDS for field, value in filters.items()):
+        return None
+    return ComplaintStat.objects.filter(**{field: value for field, value in filters.items() if value})
+
+
+def count_matching(**filters):
+    """Exact complaint count for filters on status/type/category, or None if other filters are involved"""
+    stats = _matching_stats(filters)
+    if stats is None:
+        return None
+    return stats.aggregate(total=Sum('count'))['total'] or 0
+
+
+async def acount_matching(**filters):
+    stats = _matching_stats(filters)
+    if stats is None:
+        return None
+    return (await stats.aaggregate(total=Sum('count')))['total'] or 0
+
+
+def _lock_counters():
+    """Make adjust() in other transactions wait for the rebuild, and the rebuild for those already under way"""
+    if connection.vendor == 'postgresql':
+        # Also covers counter rows another transaction has inserted but not committed
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {ComplaintStat._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+    # Deleting first takes SQLite's write lock and MySQL's locks on every row and gap of the table
+    ComplaintStat.objects.all().delete()
+
+
+def rebuild():
+    """Recompute every counter from the Complaint table; returns the number of counter rows"""
+    with transaction.atomic():
+        # Counted only once no other writer can move the counters, so none of its changes is lost
+        _lock_counters()
+        rows = (
+            Complaint.objects.values(*STAT_FIELDS)
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        counters = {}
+        for row in rows:
+            key = stat_key(row)
+            counters[key] = counters.get(key, 0) + row['total']
+
+        ComplaintStat.objects.bulk_create([
+            ComplaintStat(status=status, type=complaint_type, category=category, count=total)
+            for (status, complaint_type, category), total in counters.items()
+        ])
+    return len(counters)
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+
+CHUNK_SIZE = 64 * 1024
+
+
+def attachment_storage():
+    """Storage used by Complaint.attachment, configured as STORAGES['attachments']"""
+    return storages['attachments']
+
+
+def is_content_addressed(name):
+    """Whether name looks like a path written by ContentAddressedStorage"""
+    parts = name.split('/')
+    digest = posixpath.splitext(parts[-1])[0]
+    return len(parts) >= 3 and len(digest) == 64 and parts[-3:-1] == [digest[:2], digest[2:4]]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that keeps each distinct file once, named by its SHA-256 digest.
+
+    The digest is computed chunk by chunk while the upload is copied to a temporary file next to
+    MEDIA_ROOT, which is then moved into place as <upload_to>/ab/cd/<digest><ext>. Saving bytes
+    that are already stored returns the existing name and discards the copy.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content, so a collision means the file is already stored
+        return name
+
+    def digest_name(self, name, digest):
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest[2:4], digest + extension)
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'temporary_file_path'):
+            # Large uploads are already on disk; hash them in place and move rather than copy
+            with open(content.temporary_file_path(), 'rb') as source:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            temp_path = None
+        else:
+            os.makedirs(self.location, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix='.upload-', dir=self.location)
+            try:
+                with os.fdopen(fd, 'wb') as temp_file:
+                    for chunk in content.chunks(CHUNK_SIZE):
+                        if isinstance(chunk, str):
+                            chunk = chunk.encode()
+                        digest.update(chunk)
+                        temp_file.write(chunk)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+
+        name = self.digest_name(name, digest.hexdigest())
+        full_path = self.path(name)
+        # Until the saving transaction commits, a release elsewhere must not delete the file reused here;
+        # the check comes after the lock, so a file deleted while waiting for it is written again
+        from .attachments import lock_blob
+        lock_blob(name)
+        if os.path.exists(full_path):
+            if temp_path:
+                os.remove(temp_path)
+            return name
+
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if temp_path:
+            os.replace(temp_path, full_path)
+        else:
+            file_move_safe(content.temporary_file_path(), full_path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
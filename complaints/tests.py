@@ -1,3 +1,1014 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import gzip
+import io
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+from PIL import Image
+
+from accounts.models import Profile
+from ventsystem import urls as project_urls
+from . import async_views, attachments, export, live, rollups, search, stats, thumbnails
+from .bulk import bulk_update
+from .pagination import NEXT, PREVIOUS, CursorPaginator, encode_cursor
+from .models import AttachmentBlob, Complaint, ComplaintDailyStats, ComplaintStat, ComplaintStatusEvent, Department
+from .storage import attachment_storage, is_content_addressed
+
+# Tiny lookup tables that are expected to be read in full
+SMALL_TABLES = {'complaints_complaintstat'}
+# Ranking full-text hits by relevance sorts them, even when FTS5 hides the sort inside its virtual table
+RANKED_SEARCH_TABLES = ('complaints_search_fts', 'complaints_complaintsearchdocument')
+
+
+def plan_problems(sql):
+    """Run EXPLAIN for a captured SELECT and describe any full table scan or sort step"""
+    sorts_allowed = any(table in sql for table in RANKED_SEARCH_TABLES)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            details = [row[-1] for row in cursor.fetchall()]
+            problems = []
+            for detail in details:
+                if detail.startswith('SCAN ') and 'USING' not in detail and 'VIRTUAL TABLE' not in detail:
+                    table = detail.split()[1]
+                    if table not in SMALL_TABLES:
+                        problems.append(detail)
+                if 'TEMP B-TREE' in detail and not sorts_allowed:
+                    problems.append(detail)
+            return problems
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql)
+            columns = [column[0] for column in cursor.description]
+            problems = []
+            for row in cursor.fetchall():
+                row = dict(zip(columns, row))
+                if row['type'] == 'ALL' and row['table'] not in SMALL_TABLES:
+                    problems.append(f"full scan of {row['table']}")
+                if 'filesort' in (row.get('Extra') or '') and not sorts_allowed:
+                    problems.append(f"filesort on {row['table']}")
+            return problems
+        if connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN ' + sql)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            problems = []
+            for line in plan.splitlines():
+                line = line.strip(' ->')
+                if line.startswith('Seq Scan on') and line.split()[3] not in SMALL_TABLES:
+                    problems.append(line)
+                if line.startswith('Sort ') and not sorts_allowed:
+                    problems.append(line)
+            return problems
+    return []
+
+
+class QueryPlanTests(TestCase):
+    """Every query issued by the complaint views should be served by an index, without a sort step"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('planadmin', 'planadmin@example.com', 'pass12345')
+        Profile.objects.create(user=cls.admin, full_name='Plan Admin', role='admin', email_verified=True)
+        cls.student = User.objects.create_user('planstudent', 'planstudent@example.com', 'pass12345')
+        Profile.objects.create(user=cls.student, full_name='Plan Student', role='student', email_verified=True)
+
+        statuses = [choice for choice, _ in Complaint.STATUS_CHOICES]
+        categories = [choice for choice, _ in Complaint.CATEGORY_CHOICES]
+        cls.departments = [Department.objects.create(name=name) for name in ('Registry', 'Bursary', 'Estates')]
+        combinations = itertools.cycle(itertools.product(
+            statuses, categories, ['anonymous', 'non_anonymous'], cls.departments + [None]
+        ))
+        for number, (status, category, complaint_type, department) in zip(range(300), combinations):
+            Complaint.objects.create(
+                student=cls.student if complaint_type == 'non_anonymous' else None,
+                type=complaint_type,
+                category=category,
+                status=status,
+                assigned_to=department,
+                title=f'Complaint {number}',
+                description=f'Seeded complaint number {number} about {category}',
+            )
+        cls.complaint = Complaint.objects.filter(student=cls.student).first()
+
+    def assertIndexedQueries(self, url, params=None, user=None):
+        self.client.force_login(user or self.admin)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            problems = plan_problems(sql)
+            self.assertFalse(problems, f'{url} {params}: {problems}\n{sql}')
+        return response
+
+    def test_admin_dashboard_filters(self):
+        url = reverse('admin_dashboard')
+        filter_sets = [
+            {},
+            {'status': 'pending'},
+            {'type': 'anonymous'},
+            {'category': 'fees'},
+            {'type': 'non_anonymous', 'category': 'exam', 'status': 'resolved'},
+            {'assigned_to': str(self.departments[0].id)},
+            {'assigned_to': str(self.departments[1].id), 'status': 'pending'},
+            {'search': 'seeded'},
+            {'search': 'fees', 'status': 'closed'},
+        ]
+        for params in filter_sets:
+            with self.subTest(params=params):
+                response = self.assertIndexedQueries(url, params)
+                next_cursor = response.context['page_obj'].next_cursor
+                if next_cursor:
+                    self.assertIndexedQueries(url, {**params, 'cursor': next_cursor})
+
+    def test_student_pages(self):
+        self.assertIndexedQueries(reverse('student_dashboard'), user=self.student)
+        response = self.assertIndexedQueries(reverse('my_complaints'), user=self.student)
+        self.assertIndexedQueries(
+            reverse('my_complaints'), {'cursor': response.context['page_obj'].next_cursor}, user=self.student
+        )
+
+    def test_complaint_detail(self):
+        url = reverse('complaint_detail', args=[self.complaint.id])
+        self.assertIndexedQueries(url)
+        self.assertIndexedQueries(url, user=self.student)
+
+    def test_trends_read_only_the_rollups(self):
+        rollups.run()
+        response = self.assertIndexedQueries(reverse('complaint_trends'))
+        self.assertEqual(sum(response.json()['totals']), 300)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('searchadmin', 'searchadmin@example.com', 'pass12345')
+        Profile.objects.create(user=cls.admin, full_name='Search Admin', role='admin', email_verified=True)
+        cls.resolved = Complaint.objects.create(
+            type='anonymous', category='fees', status='resolved', title='Broken projector', description='Room 4',
+        )
+        cls.chairs = [
+            Complaint.objects.create(
+                type='anonymous', category='exam', title=f'Broken chair {number}', description='Broken, broken and broken',
+            ).id
+            for number in range(4)
+        ]
+        cls.library = Complaint.objects.create(type='anonymous', category='other', title='Library hours', description='Too short')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_prefix_matches_best_first(self):
+        ids = search.search_complaints('brok')
+        self.assertEqual(set(ids), {self.resolved.id, *self.chairs})
+        self.assertEqual(ids[-1], self.resolved.id)
+        self.assertEqual(search.search_complaints('library hours'), [self.library.id])
+        self.assertEqual(search.search_complaints('!!'), [])
+
+    @override_settings(COMPLAINT_SEARCH_MAX_RESULTS=2)
+    def test_dashboard_filters_apply_before_the_ranked_cut(self):
+        url = reverse('admin_dashboard')
+        # The resolved complaint ranks last, so it would not be among two unfiltered hits
+        response = self.client.get(url, {'search': 'broken', 'status': 'resolved'})
+        self.assertEqual([complaint.id for complaint in response.context['page_obj']], [self.resolved.id])
+        response = self.client.get(url, {'search': 'broken'})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        response = self.client.get(url, {'search': 'broken', 'assigned_to': 'No such department'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    @override_settings(COMPLAINT_SEARCH_MAX_RESULTS=2)
+    def test_exports_and_bulk_actions_are_not_capped(self):
+        response = self.client.get(reverse('export_complaints'), {'search': 'broken', 'format': 'ndjson'})
+        exported = [json.loads(line)['id'] for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(sorted(exported), sorted([self.resolved.id, *self.chairs]))
+
+        response = self.client.post(
+            reverse('bulk_update_complaints') + '?search=broken+chair',
+            {'select_all': '1', 'status': 'closed'},
+            HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(response.json()['selected'], 4)
+        self.assertEqual(set(Complaint.objects.filter(status='closed').values_list('id', flat=True)), set(self.chairs))
+
+    def test_substring_backend(self):
+        backend = search.SubstringBackend('default')
+        self.assertEqual(
+            set(backend.filter(Complaint.objects.all(), 'broken chair').values_list('id', flat=True)), set(self.chairs)
+        )
+        self.assertEqual(backend.search('broken', 10, within=Complaint.objects.filter(status='resolved')), [self.resolved.id])
+
+    def test_mysql_matches_unindexable_words_as_substrings(self):
+        backend = search.MySQLFulltextBackend('default')
+        backend._token_rules = (3, 84, {'the'})
+        condition, params, match = backend._condition(['the', 'projector', 'x_'])
+        self.assertEqual(match, '+projector*')
+        self.assertEqual(condition.count('MATCH('), 1)
+        self.assertEqual(params, ['+projector*'] + ['%the%'] * 3 + ['%x\\_%'] * 3)
+        condition, params, match = backend._condition(['on'])
+        self.assertEqual(match, '')
+        self.assertNotIn('MATCH(', condition)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(8):
+            Complaint.objects.create(type='anonymous', category='other', title=f'Page {number}', description='Paging')
+        # Ties on created_at are broken by id
+        Complaint.objects.filter(title__in=['Page 2', 'Page 3', 'Page 4']).update(
+            created_at=timezone.now() - datetime.timedelta(hours=1),
+        )
+        cls.expected = list(Complaint.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def paginator(self, **kwargs):
+        return CursorPaginator(Complaint.objects.all(), 3, **kwargs)
+
+    def ids(self, page):
+        return [complaint.id for complaint in page]
+
+    def walk(self, page, cursor_name):
+        pages = [self.ids(page)]
+        while getattr(page, cursor_name):
+            page = self.paginator().get_page(getattr(page, cursor_name))
+            pages.append(self.ids(page))
+        return pages
+
+    def test_next(self):
+        pages = self.walk(self.paginator().get_page(None), 'next_cursor')
+        self.assertEqual(pages, [self.expected[0:3], self.expected[3:6], self.expected[6:8]])
+
+    def test_last_then_previous(self):
+        for kwargs in ({}, {'estimated_count': len(self.expected)}):
+            with self.subTest(**kwargs):
+                last = self.paginator(**kwargs).get_page(encode_cursor(PREVIOUS))
+                self.assertEqual(self.ids(last), self.expected[6:8])
+                self.assertFalse(last.has_next())
+                pages = self.walk(last, 'previous_cursor')
+                self.assertEqual(pages, [self.expected[6:8], self.expected[3:6], self.expected[0:3]])
+
+    def test_next_after_previous(self):
+        last = self.paginator().get_page(encode_cursor(PREVIOUS))
+        middle = self.paginator().get_page(last.previous_cursor)
+        self.assertEqual(self.ids(middle), self.expected[3:6])
+        self.assertEqual(self.ids(self.paginator().get_page(middle.next_cursor)), self.expected[6:8])
+
+    def test_exact_multiple_of_page_size(self):
+        paginator = CursorPaginator(Complaint.objects.filter(id__in=self.expected[:6]), 3)
+        self.assertEqual(self.ids(paginator.get_page(paginator.get_page(None).last_cursor)), self.expected[3:6])
+
+    def test_malformed_cursors(self):
+        tampered = encode_cursor(PREVIOUS, k=['not a date', self.expected[4]])
+        for token in ('garbage', '!!!', encode_cursor('sideways'), encode_cursor(NEXT, k='x'), tampered):
+            with self.subTest(token=token):
+                page = self.paginator().get_page(token)
+                self.assertEqual(self.ids(page), self.expected[0:3])
+                self.assertFalse(page.has_previous())
+
+    async def test_async_last(self):
+        last = await self.paginator().aget_page(encode_cursor(PREVIOUS))
+        self.assertEqual(self.ids(last), self.expected[6:8])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('exportadmin', 'exportadmin@example.com', 'pass12345')
+        Profile.objects.create(user=cls.admin, full_name='Export Admin', role='admin', email_verified=True)
+        cls.department = Department.objects.create(name='Bursary')
+        for number in range(7):
+            Complaint.objects.create(
+                type='anonymous', category='fees' if number % 2 else 'exam',
+                status='resolved' if number < 3 else 'pending',
+                assigned_to=cls.department if number % 3 == 0 else None,
+                title=f'Refund request {number}' if number % 2 else f'Exam clash {number}',
+                description='Export fixture',
+            )
+        # Ties on created_at must not drop or repeat rows at chunk boundaries
+        Complaint.objects.filter(title__in=['Exam clash 2', 'Refund request 3', 'Exam clash 4']).update(
+            created_at=timezone.now() - datetime.timedelta(days=1),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_complaints'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def newest_first(self, complaints):
+        return list(complaints.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_csv(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual([int(row['id']) for row in rows], self.newest_first(Complaint.objects.all()))
+        self.assertEqual({row['assigned_to'] for row in rows}, {'Bursary', ''})
+
+    def test_ndjson(self):
+        response, body = self.export(format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], self.newest_first(Complaint.objects.all()))
+        self.assertEqual(rows[0]['description'], 'Export fixture')
+
+    def test_gzip(self):
+        response, body = self.export(format='ndjson', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.ndjson.gz"'))
+        self.assertEqual(gzip.decompress(body), self.export(format='ndjson')[1])
+
+    def test_chunk_boundaries(self):
+        expected = self.newest_first(Complaint.objects.all())
+        for chunk_size in (1, 2, 3, len(expected), len(expected) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                rows = export.iter_rows(Complaint.objects.all(), chunk_size=chunk_size)
+                self.assertEqual([row['id'] for row in rows], expected)
+
+    def test_matches_dashboard_filters(self):
+        for params in ({'status': 'resolved'}, {'category': 'fees', 'assigned_to': 'Bursary'}, {'search': 'refund'}):
+            with self.subTest(params=params):
+                dashboard = self.client.get(reverse('admin_dashboard'), params).context['page_obj']
+                _, body = self.export(format='ndjson', **params)
+                exported = [json.loads(line)['id'] for line in body.decode().splitlines()]
+                self.assertTrue(exported)
+                self.assertEqual(sorted(exported), sorted(complaint.id for complaint in dashboard))
+
+    def test_formulas_are_escaped(self):
+        Complaint.objects.create(
+            type='anonymous', category='other', title='=HYPERLINK("http://example.com")',
+            description='@SUM(A1:A2)', student=self.admin,
+        )
+        _, body = self.export()
+        row = next(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual(row['title'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(row['description'], "'@SUM(A1:A2)")
+        self.assertEqual(row['student_username'], 'exportadmin')
+        _, body = self.export(format='ndjson')
+        self.assertEqual(json.loads(body.decode().splitlines()[0])['title'], '=HYPERLINK("http://example.com")')
+
+
+class ComplaintStatsTests(TestCase):
+    def setUp(self):
+        self.complaint = Complaint.objects.create(type='anonymous', category='exam', title='Exam clash', description='Stats')
+
+    def counters(self):
+        return {
+            (stat.status, stat.type, stat.category): stat.count
+            for stat in ComplaintStat.objects.exclude(count=0)
+        }
+
+    def assertCountersMatch(self, expected):
+        self.assertEqual(self.counters(), expected)
+        stats.rebuild()
+        self.assertEqual(self.counters(), expected)
+
+    def test_create(self):
+        Complaint.objects.create(type='non_anonymous', title='No category', description='Stats')
+        self.assertCountersMatch({('pending', 'anonymous', 'exam'): 1, ('pending', 'non_anonymous', ''): 1})
+
+    def test_status_change(self):
+        self.complaint.status = 'resolved'
+        self.complaint.save()
+        self.assertCountersMatch({('resolved', 'anonymous', 'exam'): 1})
+
+    def test_category_change(self):
+        self.complaint.category = 'fees'
+        self.complaint.save(update_fields=['category'])
+        self.assertCountersMatch({('pending', 'anonymous', 'fees'): 1})
+
+    def test_delete(self):
+        self.complaint.delete()
+        self.assertCountersMatch({})
+
+    def test_stale_instance(self):
+        # Loaded before another save changed the row; its snapshot still says pending
+        stale = Complaint.objects.get(pk=self.complaint.pk)
+        self.complaint.status = 'resolved'
+        self.complaint.save()
+        stale.status = 'closed'
+        with CaptureQueriesContext(connection) as captured:
+            stale.save()
+        if connection.features.has_select_for_update:
+            self.assertTrue(any(' FOR UPDATE' in query['sql'] for query in captured.captured_queries))
+        self.assertCountersMatch({('closed', 'anonymous', 'exam'): 1})
+
+    def test_save_without_tracked_changes_reads_nothing(self):
+        complaint = Complaint.objects.get(pk=self.complaint.pk)
+        complaint.title = 'Exam clash, renamed'
+        with CaptureQueriesContext(connection) as captured:
+            complaint.save()
+        complaint_table = connection.ops.quote_name('complaints_complaint')
+        self.assertFalse([
+            query for query in captured.captured_queries
+            if query['sql'].startswith('SELECT') and f'FROM {complaint_table}' in query['sql']
+        ])
+        self.assertCountersMatch({('pending', 'anonymous', 'exam'): 1})
+
+    def test_rebuild_command(self):
+        ComplaintStat.objects.update(count=5)
+        out = io.StringIO()
+        call_command('rebuild_complaint_stats', stdout=out)
+        self.assertIn('covering 1 complaints', out.getvalue())
+        self.assertEqual(self.counters(), {('pending', 'anonymous', 'exam'): 1})
+
+
+class BulkUpdateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('bulkadmin', 'bulkadmin@example.com', 'pass12345')
+        Profile.objects.create(user=cls.admin, full_name='Bulk Admin', role='admin', email_verified=True)
+        cls.department = Department.objects.create(name='Registry')
+        for number in range(6):
+            Complaint.objects.create(
+                type='anonymous',
+                category='fees' if number % 2 else 'exam',
+                status='resolved' if number == 0 else 'pending',
+                title=f'Complaint {number}',
+                description='Bulk update fixture',
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_selected_ids(self):
+        complaints = list(Complaint.objects.order_by('id'))
+        ids = [complaint.id for complaint in complaints[:3]]
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(
+                reverse('bulk_update_complaints'),
+                {'complaint_ids': ids, 'status': 'resolved', 'assigned_to': str(self.department.id)},
+                HTTP_ACCEPT='application/json',
+            )
+        self.assertEqual(response.json(), {'selected': 3, 'status': 2, 'assigned_to': 3})
+        complaint_update = 'UPDATE ' + connection.ops.quote_name('complaints_complaint')
+        updates = [query for query in captured.captured_queries if query['sql'].startswith(complaint_update)]
+        self.assertEqual(len(updates), 2)
+
+        self.assertEqual(Complaint.objects.filter(status='resolved').count(), 3)
+        self.assertEqual(Complaint.objects.filter(assigned_to=self.department).count(), 3)
+        self.assertEqual(stats.status_counts()['resolved'], 3)
+        self.assertEqual(stats.status_counts()['pending'], 3)
+        updated = Complaint.objects.get(pk=ids[1])
+        self.assertGreater(updated.updated_at, complaints[1].updated_at)
+
+    def test_select_all_matching_filters(self):
+        response = self.client.post(
+            reverse('bulk_update_complaints') + '?category=fees',
+            {'select_all': '1', 'status': 'closed'},
+        )
+        self.assertRedirects(response, reverse('admin_dashboard') + '?category=fees')
+        self.assertEqual(Complaint.objects.filter(status='closed').count(), 3)
+        self.assertFalse(Complaint.objects.filter(status='closed', category='exam').exists())
+        self.assertEqual(stats.status_counts()['closed'], 3)
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('rollupadmin', 'rollupadmin@example.com', 'pass12345')
+        Profile.objects.create(user=cls.admin, full_name='Rollup Admin', role='admin', email_verified=True)
+        today = timezone.localdate()
+        cls.days = [today - datetime.timedelta(days=offset) for offset in (0, 1, 8)]
+        for number, (day, category, status) in enumerate(itertools.product(
+            cls.days, ['fees', 'exam'], ['pending', 'resolved']
+        )):
+            complaint = Complaint.objects.create(
+                type='anonymous', category=category, status=status, title=f'Rollup {number}', description='Counted',
+            )
+            Complaint.objects.filter(pk=complaint.pk).update(
+                created_at=timezone.make_aware(datetime.datetime.combine(day, datetime.time(12)))
+            )
+
+    def daily(self, day):
+        rows = ComplaintDailyStats.objects.filter(day=day).values('category', 'status').annotate(total=Sum('count'))
+        return {(row['category'], row['status']): row['total'] for row in rows}
+
+    def test_incremental_runs_recompute_changed_days(self):
+        days, _, _ = rollups.run()
+        self.assertEqual(days, 3)
+        self.assertEqual(self.daily(self.days[2]), {('exam', 'pending'): 1, ('exam', 'resolved'): 1,
+                                                    ('fees', 'pending'): 1, ('fees', 'resolved'): 1})
+        self.assertEqual(rollups.run(overlap=datetime.timedelta(0))[0], 0)
+
+        complaint = Complaint.objects.get(title='Rollup 8')
+        complaint.status = 'resolved'
+        complaint.save()
+        Complaint.objects.get(title='Rollup 1').delete()
+        self.assertEqual(rollups.run(overlap=datetime.timedelta(0))[0], 2)
+        self.assertEqual(self.daily(self.days[2]), {('exam', 'pending'): 1, ('exam', 'resolved'): 1, ('fees', 'resolved'): 2})
+        self.assertEqual(self.daily(self.days[0]), {('exam', 'pending'): 1, ('exam', 'resolved'): 1, ('fees', 'pending'): 1})
+
+        # A rerun, full or not, gives the same rows
+        before = list(ComplaintDailyStats.objects.order_by('day', 'category', 'status').values_list('day', 'category', 'status', 'count'))
+        rollups.run(full=True)
+        after = list(ComplaintDailyStats.objects.order_by('day', 'category', 'status').values_list('day', 'category', 'status', 'count'))
+        self.assertEqual(before, after)
+
+    def test_trends_endpoint(self):
+        call_command('rollup_complaints', stdout=io.StringIO())
+        self.client.force_login(self.admin)
+        trends = self.client.get(reverse('complaint_trends'), {'weeks': 3}).json()
+        self.assertEqual(len(trends['weeks']), 3)
+        self.assertEqual(sum(trends['totals']), 12)
+        self.assertEqual(sum(trends['categories']['fees']), 6)
+        self.assertEqual(sum(trends['statuses']['resolved']), 6)
+        self.assertIn(50.0, trends['resolution_rate'])
+        self.assertIsNotNone(trends['rolled_up_until'])
+
+
+class StatusHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('historyadmin', 'historyadmin@example.com', 'pass12345')
+        Profile.objects.create(user=cls.admin, full_name='History Admin', role='admin', email_verified=True)
+        cls.department = Department.objects.create(name='Bursary')
+        cls.complaints = [
+            Complaint.objects.create(type='anonymous', category='fees', title=f'History {number}', description='Logged')
+            for number in range(3)
+        ]
+
+    def test_single_changes_are_logged_with_their_author(self):
+        complaint = self.complaints[0]
+        url = reverse('complaint_detail', args=[complaint.id])
+        self.client.force_login(self.admin)
+        self.client.post(url, {'status': 'in_progress', 'assigned_to': str(self.department.id)})
+        complaint.refresh_from_db()
+        responded = complaint.first_response_at
+        self.assertIsNotNone(responded)
+        self.assertIsNone(complaint.resolved_at)
+
+        self.client.post(url, {'status': 'resolved', 'assigned_to': str(self.department.id)})
+        complaint.refresh_from_db()
+        self.assertEqual(complaint.first_response_at, responded)
+        self.assertIsNotNone(complaint.resolved_at)
+        events = list(complaint.status_events.order_by('id').values_list('field', 'old_value', 'new_value', 'actor'))
+        self.assertEqual(events, [
+            ('status', 'pending', 'in_progress', self.admin.id),
+            ('assigned_to', None, str(self.department.id), self.admin.id),
+            ('status', 'in_progress', 'resolved', self.admin.id),
+        ])
+        response = self.client.get(url)
+        self.assertContains(response, 'In Progress &rarr; Resolved')
+        self.assertContains(response, 'Unassigned &rarr; Bursary')
+
+        complaint.status = 'pending'
+        complaint.save()
+        complaint.refresh_from_db()
+        self.assertIsNone(complaint.resolved_at)
+        self.assertIsNone(complaint.status_events.latest('id').actor)
+
+    def test_bulk_changes_are_logged(self):
+        ids = [complaint.id for complaint in self.complaints]
+        bulk_update(Complaint.objects.filter(pk__in=ids[:2]), status='resolved', actor=self.admin)
+        resolved = dict(Complaint.objects.filter(pk__in=ids).values_list('id', 'resolved_at'))
+        self.assertIsNotNone(resolved[ids[0]])
+        self.assertIsNone(resolved[ids[2]])
+
+        bulk_update(Complaint.objects.filter(pk__in=ids), status='closed', assigned_to=self.department)
+        after = {row[0]: row[1:] for row in Complaint.objects.values_list('id', 'resolved_at', 'first_response_at')}
+        # Already resolved complaints keep their resolution time; the third is resolved now
+        self.assertEqual(after[ids[0]][0], resolved[ids[0]])
+        self.assertGreater(after[ids[2]][0], resolved[ids[0]])
+        self.assertTrue(all(first_response is not None for _, first_response in after.values()))
+        self.assertEqual(ComplaintStatusEvent.objects.filter(field='status').count(), 5)
+        self.assertEqual(ComplaintStatusEvent.objects.filter(field='assigned_to', actor=None).count(), 3)
+
+        bulk_update(Complaint.objects.filter(pk=ids[0]), status='in_progress')
+        self.assertIsNone(Complaint.objects.get(pk=ids[0]).resolved_at)
+
+        output = io.StringIO()
+        call_command('sla_report', '--by', 'department', '--json', stdout=output)
+        report = {row['department']: row for row in json.loads(output.getvalue())}
+        self.assertEqual(report['Bursary']['complaints'], 3)
+        self.assertEqual(report['Bursary']['responded'], 3)
+        self.assertEqual(report['Bursary']['resolved'], 2)
+
+
+class LiveEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Estates')
+
+    def setUp(self):
+        self.published = []
+        channel = live.channel()
+        for patcher in (
+            mock.patch.object(channel, 'wanted', return_value=True),
+            mock.patch.object(channel, 'publish', lambda kind, data: self.published.append((kind, data))),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_changes_are_published_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            complaint = Complaint.objects.create(type='anonymous', category='exam', title='Exam clash', description='Two papers')
+        self.assertEqual(self.published[0][0], 'created')
+        self.assertEqual(self.published[0][1]['status'], 'pending')
+        self.assertEqual(self.published[0][1]['department'], {'id': None, 'name': None})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            complaint.status = 'in_progress'
+            complaint.assigned_to = self.department
+            complaint.save()
+            self.assertEqual(len(self.published), 1)
+        self.assertEqual(self.published[1], ('updated', {
+            'ids': [complaint.id], 'moved': {'pending': 1}, 'status': 'in_progress', 'status_display': 'In Progress',
+            'department': {'id': self.department.id, 'name': 'Estates'},
+        }))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_update(Complaint.objects.all(), status='resolved')
+        self.assertEqual(self.published[2][1]['moved'], {'in_progress': 1})
+
+        complaint_id = complaint.id
+        complaint.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            complaint.delete()
+        self.assertEqual(self.published[3], ('deleted', {'ids': [complaint_id], 'moved': {'resolved': 1}}))
+
+    def test_payload_is_built_after_commit_when_wanted(self):
+        complaint = Complaint.objects.create(type='anonymous', category='exam', title='Exam clash', description='Two papers')
+        complaint = Complaint.objects.select_related('assigned_to').get(pk=complaint.pk)
+        department_table = connection.ops.quote_name('complaints_department')
+        for wanted in (False, True):
+            with self.subTest(wanted=wanted), mock.patch.object(live.channel(), 'wanted', return_value=wanted):
+                self.published.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    with self.captureOnCommitCallbacks(execute=True):
+                        complaint.assigned_to = self.department if complaint.assigned_to_id is None else None
+                        complaint.save()
+                self.assertEqual(len(self.published), int(wanted))
+                self.assertFalse([query for query in captured.captured_queries if department_table in query['sql']])
+
+    def test_large_bulk_updates_send_no_ids(self):
+        Complaint.objects.bulk_create([
+            Complaint(type='anonymous', category='other', title=f'Bulk {number}', description='Bulk') for number in range(3)
+        ])
+        with self.settings(LIVE_EVENTS_MAX_IDS=2), self.captureOnCommitCallbacks(execute=True):
+            bulk_update(Complaint.objects.all(), assigned_to=self.department)
+        self.assertEqual(self.published, [('updated', {
+            'ids': None, 'moved': {}, 'department': {'id': self.department.id, 'name': 'Estates'},
+        })])
+
+
+class LiveBrokerTests(SimpleTestCase):
+    async def test_reconnecting_dashboards_get_missed_events(self):
+        broker = live.Broker(history=3)
+        for number in range(5):
+            broker.deliver('updated', {'ids': [number]})
+        self.assertEqual([event.id for event in broker.missed_since(f'{broker.epoch}-2')], [f'{broker.epoch}-3', f'{broker.epoch}-4', f'{broker.epoch}-5'])
+        self.assertEqual(broker.missed_since(f'{broker.epoch}-5'), [])
+        self.assertIsNone(broker.missed_since(f'{broker.epoch}-1'))
+        self.assertIsNone(broker.missed_since('restarted-5'))
+
+        with mock.patch.object(live, 'broker', broker):
+            body = live.stream(f'{broker.epoch}-4')
+            self.assertEqual(await anext(body), 'retry: 3000\n\n')
+            self.assertEqual(await anext(body), f'id: {broker.epoch}-5\nevent: updated\ndata: {{"ids": [4]}}\n\n')
+            broker.deliver('deleted', {'ids': [6]})
+            self.assertIn('event: deleted', await anext(body))
+            await body.aclose()
+        self.assertFalse(broker.has_subscribers())
+
+    async def test_slow_dashboards_are_told_to_resync(self):
+        broker = live.Broker(queue_size=2)
+        with mock.patch.object(live, 'broker', broker):
+            body = live.stream()
+            await anext(body)
+            for number in range(3):
+                broker.deliver('updated', {'ids': [number]})
+            await asyncio.sleep(0)
+            self.assertIn('event: resync', await anext(body))
+            await body.aclose()
+
+
+class SeedAndBenchmarkTests(TestCase):
+    def test_seed_then_benchmark(self):
+        call_command(
+            'seed_vent', '--students', '4', '--admins', '1', '--complaints', '60', '--seed', '7',
+            '--status-weights', 'pending=1,closed=1', '--batch-size', '25', stdout=io.StringIO(),
+        )
+        self.assertEqual(Profile.objects.filter(role='student', user__username__startswith='seed').count(), 4)
+        self.assertEqual(Complaint.objects.count(), 60)
+        self.assertFalse(Complaint.objects.filter(status__in=['in_progress', 'resolved']).exists())
+        self.assertFalse(Complaint.objects.filter(type='non_anonymous', student=None).exists())
+        self.assertEqual(stats.status_counts()['total'], 60)
+
+        output = io.StringIO()
+        call_command(
+            'benchmark_views', '--iterations', '2', '--warmup', '0',
+            '--scenarios', 'admin_dashboard,my_complaints,submit_anonymous', stdout=output,
+        )
+        report = json.loads(output.getvalue())
+        self.assertEqual(set(report['results']), {'admin_dashboard', 'my_complaints', 'submit_anonymous'})
+        self.assertEqual(report['results']['admin_dashboard']['status'], [200])
+        self.assertGreater(report['results']['my_complaints']['queries'], 0)
+        self.assertLessEqual(report['results']['admin_dashboard']['p50_ms'], report['results']['admin_dashboard']['p99_ms'])
+        # Submissions are rolled back after timing
+        self.assertEqual(Complaint.objects.count(), 60)
+
+
+class AttachmentStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create(self, filename, content):
+        return Complaint.objects.create(
+            type='anonymous', category='other', title='Evidence', description='Photo attached',
+            attachment=SimpleUploadedFile(filename, content),
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.create('Byte.jpg', b'same photo bytes')
+        second = self.create('Byte.JPG', b'same photo bytes')
+        self.assertEqual(first.attachment.name, second.attachment.name)
+        self.assertTrue(is_content_addressed(first.attachment.name))
+        self.assertEqual(second.attachment_name, 'Byte.JPG')
+        self.assertEqual(AttachmentBlob.objects.get().ref_count, 2)
+
+        path = first.attachment.path
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(AttachmentBlob.objects.exists())
+
+    def test_release_overlapping_reupload(self):
+        first = self.create('Byte.jpg', b'same photo bytes')
+        path = first.attachment.path
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+        lock_blob = attachments.lock_blob
+
+        def released_meanwhile(name):
+            # The release's delete commits while the re-upload waits for the row lock
+            for callback in callbacks:
+                callback()
+            lock_blob(name)
+
+        with mock.patch.object(attachments, 'lock_blob', released_meanwhile):
+            second = self.create('Byte.jpg', b'same photo bytes')
+        self.assertEqual(second.attachment.name, first.attachment.name)
+        self.assertTrue(os.path.exists(path))
+        blob = AttachmentBlob.objects.get()
+        self.assertEqual((blob.ref_count, blob.size), (1, len(b'same photo bytes')))
+
+    def test_dedupe_existing_attachments(self):
+        os.makedirs(os.path.join(self.media_root, 'complaints'))
+        for filename in ('Byte.jpg', 'Byte_1A6QDZV.jpg'):
+            with open(os.path.join(self.media_root, 'complaints', filename), 'wb') as f:
+                f.write(b'legacy photo bytes')
+        for filename in ('Byte.jpg', 'Byte_1A6QDZV.jpg'):
+            complaint = self.create('placeholder.txt', b'x')
+            Complaint.objects.filter(pk=complaint.pk).update(attachment=f'complaints/{filename}')
+
+        call_command('dedupe_attachments', stdout=io.StringIO())
+
+        names = set(Complaint.objects.values_list('attachment', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_content_addressed(name))
+        self.assertEqual(AttachmentBlob.objects.get().ref_count, 2)
+        storage = attachment_storage()
+        self.assertFalse(storage.exists('complaints/Byte.jpg'))
+        with storage.open(name) as f:
+            self.assertEqual(f.read(), b'legacy photo bytes')
+
+
+class AttachmentDownloadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('fileowner', 'fileowner@example.com', 'pass12345')
+        Profile.objects.create(user=cls.owner, full_name='File Owner', role='student', email_verified=True)
+        cls.other = User.objects.create_user('fileother', 'fileother@example.com', 'pass12345')
+        Profile.objects.create(user=cls.other, full_name='File Other', role='student', email_verified=True)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.complaint = Complaint.objects.create(
+            student=self.owner, type='non_anonymous', category='fees', title='Receipt', description='See attached',
+            attachment=SimpleUploadedFile('receipt.pdf', b'0123456789' * 10),
+        )
+        self.url = reverse('complaint_attachment', args=[self.complaint.id])
+
+    def test_only_permitted_users_can_download(self):
+        self.client.force_login(self.other)
+        self.assertRedirects(self.client.get(self.url), reverse('student_dashboard'))
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789' * 10)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('receipt.pdf', response['Content-Disposition'])
+
+    def test_range_and_conditional_requests(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-14')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 5-14/100')
+        self.assertEqual(b''.join(response.streaming_content), b'5678901234')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=200-').status_code, 416)
+
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    @override_settings(ATTACHMENT_SERVE_MODE='accel')
+    def test_proxy_handoff(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.complaint.attachment.name)
+        self.assertEqual(response.content, b'')
+
+
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('thumbadmin', 'thumbadmin@example.com', 'pass12345')
+        Profile.objects.create(user=cls.admin, full_name='Thumb Admin', role='admin', email_verified=True)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        photo = io.BytesIO()
+        Image.new('RGB', (1200, 800), 'orange').save(photo, 'JPEG')
+        self.complaint = Complaint.objects.create(
+            type='anonymous', category='facilities', title='Broken window', description='Photo attached',
+            attachment=SimpleUploadedFile('window.jpg', photo.getvalue()),
+        )
+        self.client.force_login(self.admin)
+
+    def test_thumbnail_generated_on_first_request(self):
+        response = self.client.get(reverse('complaint_thumbnail', args=[self.complaint.id, 'thumb']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as thumbnail:
+            self.assertEqual(thumbnail.size, (160, 107))
+
+        dashboard = self.client.get(reverse('admin_dashboard'))
+        self.assertContains(dashboard, reverse('complaint_thumbnail', args=[self.complaint.id, 'thumb']))
+
+    def test_command_creates_every_size(self):
+        call_command('generate_thumbnails', stdout=io.StringIO())
+        for size in thumbnails.SIZES:
+            self.assertTrue(default_storage.exists(thumbnails.derivative_name(self.complaint.attachment.name, size)))
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('fragstudent', 'fragstudent@example.com', 'pass12345')
+        Profile.objects.create(user=cls.student, full_name='Fragment Student', role='student', email_verified=True)
+        Complaint.objects.create(
+            student=cls.student, type='non_anonymous', category='exam',
+            title='Exam timetable clash', description='Two exams at once',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+
+    def check_cached_and_invalidated(self):
+        for name in ('student_dashboard', 'my_complaints'):
+            with CaptureQueriesContext(connection) as first:
+                self.client.get(reverse(name))
+            with CaptureQueriesContext(connection) as second:
+                response = self.client.get(reverse(name))
+            self.assertLess(len(second), len(first), name)
+            self.assertContains(response, 'Exam timetable clash')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Complaint.objects.create(
+                student=self.student, type='non_anonymous', category='facilities',
+                title='Broken heater', description='Room 12 is cold',
+            )
+        for name in ('student_dashboard', 'my_complaints'):
+            self.assertContains(self.client.get(reverse(name)), 'Broken heater')
+
+    @override_settings(CACHE_SHARED=True, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_locmem_cache(self):
+        self.check_cached_and_invalidated()
+
+    def test_file_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        with override_settings(CACHE_SHARED=True, CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir,
+        }}):
+            self.check_cached_and_invalidated()
+
+    @override_settings(CACHE_SHARED=False, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_unshared_cache_is_not_used(self):
+        for name in ('student_dashboard', 'my_complaints'):
+            self.assertContains(self.client.get(reverse(name)), 'Exam timetable clash')
+        # Another process changing the data cannot reach this one's cache, so nothing may have been kept
+        Complaint.objects.filter(title='Exam timetable clash').update(title='Renamed elsewhere')
+        for name in ('student_dashboard', 'my_complaints'):
+            self.assertContains(self.client.get(reverse(name)), 'Renamed elsewhere')
+
+
+class AsyncPagesURLConf:
+    """The project's URLs with the async page views in front, as ASYNC_VIEWS=True routes them"""
+    urlpatterns = [
+        path('dashboard/', async_views.student_dashboard, name='student_dashboard'),
+        path('admin/', async_views.admin_dashboard, name='admin_dashboard'),
+        path('my-complaints/', async_views.my_complaints, name='my_complaints'),
+        path('complaint/<int:complaint_id>/', async_views.complaint_detail, name='complaint_detail'),
+        path('admin/live/', async_views.live_events, name='live_events'),
+    ] + project_urls.urlpatterns
+
+
+@override_settings(ROOT_URLCONF=AsyncPagesURLConf, PERF_SAMPLE_RATE=1.0, PERF_SLOW_REQUEST_MS=10000)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('asyncadmin', 'asyncadmin@example.com', 'pass12345')
+        Profile.objects.create(user=cls.admin, full_name='Async Admin', role='admin', email_verified=True)
+        cls.student = User.objects.create_user('asyncstudent', 'asyncstudent@example.com', 'pass12345')
+        Profile.objects.create(user=cls.student, full_name='Async Student', role='student', email_verified=True)
+        cls.complaint = Complaint.objects.create(
+            student=cls.student, type='non_anonymous', category='fees',
+            title='Fee payment not reflected', description='Paid last week',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_admin_pages(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse('admin_dashboard'))
+        self.assertContains(response, 'Fee payment not reflected')
+        self.assertContains(response, reverse('live_events'))
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+        response = await self.async_client.post(
+            reverse('complaint_detail', args=[self.complaint.id]), {'status': 'resolved', 'assigned_to': ''}
+        )
+        self.assertRedirects(response, reverse('complaint_detail', args=[self.complaint.id]), fetch_redirect_response=False)
+        await self.complaint.arefresh_from_db()
+        self.assertEqual(self.complaint.status, 'resolved')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    async def test_admin_dashboard_without_cached_departments(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse('admin_dashboard'))
+        self.assertContains(response, 'Department: no change')
+
+    @mock.patch.object(live, 'broker', live.Broker())
+    async def test_live_events_stream(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse('live_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = aiter(response.streaming_content)
+        self.assertEqual(await anext(body), b'retry: 3000\n\n')
+        # The stream is subscribed once its first chunk has been sent
+        live.broker.deliver('updated', {'ids': [self.complaint.id], 'moved': {}})
+        self.assertIn(f'data: {{"ids": [{self.complaint.id}]'.encode(), await anext(body))
+
+    @override_settings(CACHE_SHARED=True, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    async def test_student_pages_skip_cached_queries(self):
+        await self.async_client.aforce_login(self.student)
+        for name in ('student_dashboard', 'my_complaints'):
+            first = await self.async_client.get(reverse(name))
+            second = await self.async_client.get(reverse(name))
+            self.assertContains(second, 'Fee payment not reflected')
+            queries = [int(re.search(r'"(\d+) queries"', response['Server-Timing']).group(1)) for response in (first, second)]
+            self.assertLess(queries[1], queries[0], name)
+        response = await self.async_client.get(reverse('complaint_detail', args=[self.complaint.id]))
+        self.assertContains(response, 'Paid last week')
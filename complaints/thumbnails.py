@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import os
+import posixpath
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .storage import attachment_storage, is_content_addressed
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+
+# Bounding boxes for each derivative; the aspect ratio is kept
+SIZES = {
+    'thumb': (160, 160),
+    'preview': (1024, 1024),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def is_image(name):
+    return posixpath.splitext(name or '')[1].lower() in IMAGE_EXTENSIONS
+
+
+def image_format():
+    return getattr(settings, 'THUMBNAIL_FORMAT', 'WEBP').upper()
+
+
+def derivative_name(name, size):
+    """Name in the default storage of one derivative of the stored attachment name"""
+    if is_content_addressed(name):
+        key = posixpath.splitext(posixpath.basename(name))[0]
+    else:
+        key = hashlib.sha256(name.encode()).hexdigest()
+    extension = '.webp' if image_format() == 'WEBP' else '.jpg'
+    return f'thumbnails/{size}/{key[:2]}/{key}{extension}'
+
+
+def render(source, size):
+    """Resized, re-encoded image bytes for an open attachment file"""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(SIZES[size], Image.Resampling.LANCZOS)
+        output_format = image_format()
+        if output_format == 'JPEG':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        output = BytesIO()
+        image.save(output, output_format, quality=getattr(settings, 'THUMBNAIL_QUALITY', 80), optimize=True)
+    return output.getvalue()
+
+
+def generate(name, size, force=False):
+    """Create one derivative if missing; returns its name, or None when the attachment cannot be read as an image"""
+    target = derivative_name(name, size)
+    if not force and default_storage.exists(target):
+        return target
+    try:
+        with attachment_storage().open(name) as source:
+            data = render(source, size)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.warning('Cannot create %s thumbnail of %s: %s', size, name, e)
+        return None
+
+    # Write beside the target and rename, so readers never see a partial file
+    path = default_storage.path(target)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.thumb-', dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as temp_file:
+        temp_file.write(data)
+    os.replace(temp_path, path)
+    return target
+
+
+def generate_all(name, force=False):
+    return {size: generate(name, size, force=force) for size in SIZES}
+
+
+def _generate_in_background(name):
+    try:
+        generate_all(name)
+    except Exception:
+        logger.exception('Thumbnail generation failed for %s', name)
+
+
+def schedule(name):
+    """Create all derivatives of an image attachment on a background thread"""
+    global _executor
+    if not is_image(name):
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'THUMBNAIL_WORKERS', 2), thread_name_prefix='thumbnails'
+            )
+    _executor.submit(_generate_in_background, name)
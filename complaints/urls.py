@@ -1,16 +1,29 @@
+from django.conf import settings
 from django.urls import path
 from django.shortcuts import redirect
-from . import views
+from . import async_views, views
+
+# Read-heavy pages in their native async form, for ASGI deployments
+pages = async_views if settings.ASYNC_VIEWS else views
 
 def redirect_to_login(request):
     return redirect('login')
 
 urlpatterns = [
     path('', redirect_to_login, name='home'),
-    path('dashboard/', views.student_dashboard, name='student_dashboard'),
-    path('admin/', views.admin_dashboard, name='admin_dashboard'),
+    path('dashboard/', pages.student_dashboard, name='student_dashboard'),
+    path('admin/', pages.admin_dashboard, name='admin_dashboard'),
+    path('admin/bulk/', views.bulk_update_complaints, name='bulk_update_complaints'),
+    path('admin/export/', views.export_complaints, name='export_complaints'),
+    path('admin/trends/', views.complaint_trends, name='complaint_trends'),
     path('submit/non-anonymous/', views.submit_non_anonymous_complaint, name='submit_non_anonymous'),
     path('submit/anonymous/', views.submit_anonymous_complaint, name='submit_anonymous'),
-    path('my-complaints/', views.my_complaints, name='my_complaints'),
-    path('complaint/<int:complaint_id>/', views.complaint_detail, name='complaint_detail'),
-]
\ No newline at end of file
+    path('my-complaints/', pages.my_complaints, name='my_complaints'),
+    path('complaint/<int:complaint_id>/', pages.complaint_detail, name='complaint_detail'),
+    path('complaint/<int:complaint_id>/attachment/', views.complaint_attachment, name='complaint_attachment'),
+    path('complaint/<int:complaint_id>/attachment/<str:size>/', views.complaint_thumbnail, name='complaint_thumbnail'),
+]
+
+if settings.ASYNC_VIEWS:
+    # Server-Sent Events hold their connection open, which only an ASGI server can afford
+    urlpatterns.append(path('admin/live/', async_views.live_events, name='live_events'))
\ No newline at end of file
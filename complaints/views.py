@@ -1,45 +1,46 @@
+import os
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from .models import Complaint
-from .forms import NonAnonymousComplaintForm, AnonymousComplaintForm, ComplaintStatusForm
-from accounts.models import Profile
+from . import fragments, history, rollups, stats, thumbnails
+from .bulk import UNCHANGED, bulk_update
+from .export import CONTENT_TYPES, export_stream
+from .departments import department_choices, resolve_department_id
+from .pagination import CursorPaginator, RankedPaginator
+from .search import filter_by_search, search_complaints
+from .serving import serve_attachment
+from .forms import NonAnonymousComplaintForm, AnonymousComplaintForm, ComplaintStatusForm, BulkActionForm
+from accounts.decorators import admin_required, request_role, student_required
+from ventsystem.routers import read_alias, reads_from_replica
 
 def home(request):
     """Home page view"""
     return render(request, 'home.html')
 
-@login_required
+@student_required
 def student_dashboard(request):
-    try:
-        profile = request.user.profile
-        if profile.is_admin():
-            return redirect('admin_dashboard')
-    except Profile.DoesNotExist:
-        pass
-    
-    user_complaints = Complaint.objects.filter(
+    student_complaints = Complaint.objects.filter(
         student=request.user, 
         type='non_anonymous'
-    ).order_by('-created_at')[:5]
+    )
     
+    # Querysets and callables are only evaluated if the cached fragments are missing
     context = {
-        'user_complaints': user_complaints,
-        'total_complaints': user_complaints.count(),
+        'user_complaints': student_complaints.order_by('-created_at', '-id')[:5],
+        'total_complaints': student_complaints.count,
+        **fragments.context(fragments.user_scope(request.user.id)),
     }
     return render(request, 'complaints/student_dashboard.html', context)
 
-@login_required
+@student_required
 def submit_non_anonymous_complaint(request):
-    try:
-        profile = request.user.profile
-        if profile.is_admin():
-            return redirect('admin_dashboard')
-    except Profile.DoesNotExist:
-        pass
-    
     if request.method == 'POST':
         form = NonAnonymousComplaintForm(request.POST, request.FILES)
         if form.is_valid():
@@ -54,15 +55,8 @@ def submit_non_anonymous_complaint(request):
     
     return render(request, 'complaints/submit_non_anonymous.html', {'form': form})
 
-@login_required
+@student_required
 def submit_anonymous_complaint(request):
-    try:
-        profile = request.user.profile
-        if profile.is_admin():
-            return redirect('admin_dashboard')
-    except Profile.DoesNotExist:
-        pass
-    
     if request.method == 'POST':
         form = AnonymousComplaintForm(request.POST, request.FILES)
         if form.is_valid():
@@ -78,120 +72,221 @@ def submit_anonymous_complaint(request):
     
     return render(request, 'complaints/submit_anonymous.html', {'form': form})
 
-@login_required
+@student_required
 def my_complaints(request):
-    try:
-        profile = request.user.profile
-        if profile.is_admin():
-            return redirect('admin_dashboard')
-    except Profile.DoesNotExist:
-        pass
-    
-    complaints = Complaint.objects.filter(
+    complaints = Complaint.objects.select_related('assigned_to').filter(
         student=request.user, 
         type='non_anonymous'
-    ).order_by('-created_at')
+    )
     
-    paginator = Paginator(complaints, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    cursor = request.GET.get('cursor')
+    paginator = CursorPaginator(complaints, 10)
+    context = {
+        'page_obj': SimpleLazyObject(lambda: paginator.get_page(cursor)),
+        'cursor': cursor or '',
+        **fragments.context(fragments.user_scope(request.user.id), fragments.DEPARTMENTS),
+    }
+    return render(request, 'complaints/my_complaints.html', context)
+
+COMPLAINT_FILTERS = ('type', 'category', 'status', 'search', 'assigned_to')
+
+def get_complaint_filters(params):
+    """Admin dashboard filter values from a query dict, '' when unset"""
+    return {key: params.get(key, '') for key in COMPLAINT_FILTERS}
+
+def filter_complaints(filters):
+    """Complaints matching the admin dashboard filters, apart from search which is ranked separately"""
+    complaints = Complaint.objects.select_related('assigned_to')
     
-    return render(request, 'complaints/my_complaints.html', {'page_obj': page_obj})
+    if filters['type']:
+        complaints = complaints.filter(type=filters['type'])
+    if filters['category']:
+        complaints = complaints.filter(category=filters['category'])
+    if filters['status']:
+        complaints = complaints.filter(status=filters['status'])
+    if filters['assigned_to']:
+        department_id = resolve_department_id(filters['assigned_to'])
+        complaints = complaints.filter(assigned_to_id=department_id) if department_id else complaints.none()
+    return complaints
 
-@login_required
+def filtered(complaints):
+    """complaints if any dashboard filter narrows it, else None; search_complaints skips the check then"""
+    return complaints if complaints.query.where else None
+
+def matching_complaints(filters):
+    """Every complaint matching the admin dashboard filters, search included"""
+    complaints = filter_complaints(filters)
+    if filters['search']:
+        complaints = filter_by_search(complaints, filters['search'])
+    return complaints
+
+@admin_required
+@reads_from_replica
 def admin_dashboard(request):
-    try:
-        profile = request.user.profile
-        if not profile.is_admin():
-            return redirect('student_dashboard')
-    except Profile.DoesNotExist:
-        return redirect('student_dashboard')
-    
-    
-    complaint_type = request.GET.get('type', '')
-    category = request.GET.get('category', '')
-    status = request.GET.get('status', '')
-    search = request.GET.get('search', '')
-    assigned_to = request.GET.get('assigned_to', '')
+    current_filters = get_complaint_filters(request.GET)
+    complaints = filter_complaints(current_filters)
+    search = current_filters['search']
+
+    if search:
+        # Ranked ids come from the full-text index; keep that order instead of newest-first
+        paginator = RankedPaginator(complaints, search_complaints(search, within=filtered(complaints)), 15)
+    else:
+        estimated_count = stats.count_matching(**current_filters)
+        paginator = CursorPaginator(complaints, 15, estimated_count=estimated_count)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
-    complaints = Complaint.objects.all()
+    # All stat cards come from the maintained counters table in one query, skipped when cached
+    status_counts = SimpleLazyObject(stats.status_counts)
     
-    if complaint_type:
-        complaints = complaints.filter(type=complaint_type)
-    if category:
-        complaints = complaints.filter(category=category)
-    if status:
-        complaints = complaints.filter(status=status)
-    if assigned_to:
-        complaints = complaints.filter(assigned_to__icontains=assigned_to)
-    if search:
-        complaints = complaints.filter(
-            Q(title__icontains=search) | 
-            Q(description__icontains=search) |
-            Q(student__username__icontains=search) |
-            Q(student__email__icontains=search)
-        )
-    
-    complaints = complaints.order_by('-created_at')
-
-    paginator = Paginator(complaints, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    total_complaints = Complaint.objects.count()
-    pending_complaints = Complaint.objects.filter(status='pending').count()
-    in_progress_complaints = Complaint.objects.filter(status='in_progress').count()
-    resolved_complaints = Complaint.objects.filter(status='resolved').count()
-    closed_complaints = Complaint.objects.filter(status='closed').count()
-    
-    # Get unique assigned departments for filter
-    assigned_departments = Complaint.objects.exclude(assigned_to__isnull=True).exclude(assigned_to='').values_list('assigned_to', flat=True).distinct()
+    # Departments for the filter dropdown come from the cached lookup table
+    assigned_departments = department_choices()
     context = {
         'page_obj': page_obj,
-        'total_complaints': total_complaints,
-        'pending_complaints': pending_complaints,
-        'in_progress_complaints': in_progress_complaints,
-        'resolved_complaints': resolved_complaints,
-        'closed_complaints': closed_complaints,
+        'status_counts': status_counts,
         'assigned_departments': assigned_departments,
-        'current_filters': {
-            'type': complaint_type,
-            'category': category,
-            'status': status,
-            'search': search,
-            'assigned_to': assigned_to,
-        }
+        'current_filters': current_filters,
+        'bulk_form': BulkActionForm(),
+        **fragments.context(fragments.ADMIN),
     }
     return render(request, 'complaints/admin_dashboard.html', context)
 
+def can_view_complaint(request, complaint):
+    """Admins see every complaint; students only their own non-anonymous ones"""
+    role = request_role(request)
+    if role == 'admin':
+        return True
+    return role is not None and complaint.student_id == request.user.id and complaint.type != 'anonymous'
+
 @login_required
 def complaint_detail(request, complaint_id):
-    complaint = get_object_or_404(Complaint, id=complaint_id)
+    complaint = get_object_or_404(Complaint.objects.select_related('assigned_to'), id=complaint_id)
     
-    try:
-        profile = request.user.profile
-        if profile.is_admin():
-            pass
-        else:
-            if complaint.student != request.user or complaint.type == 'anonymous':
-                messages.error(request, 'You do not have permission to view this complaint.')
-                return redirect('student_dashboard')
-    except Profile.DoesNotExist:
+    if not can_view_complaint(request, complaint):
         messages.error(request, 'You do not have permission to view this complaint.')
         return redirect('student_dashboard')
+    is_admin = request_role(request) == 'admin'
     
-    if request.method == 'POST':
+    if request.method == 'POST' and is_admin:
         form = ComplaintStatusForm(request.POST, instance=complaint)
         if form.is_valid():
-            form.save()
+            form.save(actor=request.user)
             messages.success(request, 'Complaint status updated successfully!')
             return redirect('complaint_detail', complaint_id=complaint.id)
     else:
         form = ComplaintStatusForm(instance=complaint)
     
+    events = complaint.status_events.select_related('actor').order_by('created_at', 'id')
     context = {
         'complaint': complaint,
         'form': form,
-        'is_admin': profile.is_admin() if hasattr(request.user, 'profile') else False,
+        'is_admin': is_admin,
+        'timeline': history.timeline(events, dict(department_choices()), show_actor=is_admin),
     }
-    return render(request, 'complaints/complaint_detail.html', context)
\ No newline at end of file
+    return render(request, 'complaints/complaint_detail.html', context)
+
+@login_required
+def complaint_attachment(request, complaint_id):
+    complaint = get_object_or_404(Complaint.objects.only('id', 'student_id', 'type', 'attachment', 'attachment_name'), id=complaint_id)
+    if not can_view_complaint(request, complaint):
+        messages.error(request, 'You do not have permission to view this complaint.')
+        return redirect('student_dashboard')
+    if not complaint.attachment:
+        raise Http404('This complaint has no attachment.')
+    try:
+        return serve_attachment(request, complaint.attachment.storage, complaint.attachment.name, complaint.attachment_name)
+    except FileNotFoundError:
+        raise Http404('The attachment file is missing.')
+
+@login_required
+def complaint_thumbnail(request, complaint_id, size):
+    complaint = get_object_or_404(Complaint.objects.only('id', 'student_id', 'type', 'attachment', 'attachment_name'), id=complaint_id)
+    if not can_view_complaint(request, complaint):
+        raise Http404('No such thumbnail.')
+    if size not in thumbnails.SIZES or not complaint.attachment_is_image:
+        raise Http404('No such thumbnail.')
+    # Normally created in the background after upload; fill the gap on first request otherwise
+    name = thumbnails.generate(complaint.attachment.name, size)
+    if name is None:
+        raise Http404('The attachment could not be read as an image.')
+    stem = os.path.splitext(complaint.attachment_name or 'attachment')[0]
+    filename = f"{stem}-{size}{os.path.splitext(name)[1]}"
+    return serve_attachment(request, default_storage, name, filename)
+
+@admin_required
+@reads_from_replica
+def export_complaints(request):
+    # The rows are streamed after the view returns, so the database is chosen now
+    complaints = matching_complaints(get_complaint_filters(request.GET)).using(read_alias())
+    
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in CONTENT_TYPES:
+        export_format = 'csv'
+    compress = request.GET.get('gzip') == '1'
+    
+    filename = f"complaints-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+    content_type = CONTENT_TYPES[export_format]
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+    
+    response = StreamingHttpResponse(
+        export_stream(complaints, export_format=export_format, compress=compress),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@admin_required
+@reads_from_replica
+def complaint_trends(request):
+    # Served from the daily rollups, so the cost does not grow with the complaints table
+    try:
+        weeks = min(max(int(request.GET.get('weeks', 12)), 1), 52)
+    except ValueError:
+        weeks = 12
+    return JsonResponse(rollups.weekly_trends(weeks))
+
+@admin_required
+def bulk_update_complaints(request):
+    # The form posts to this URL with the dashboard's query string, so filters arrive in GET
+    dashboard_url = f"{reverse('admin_dashboard')}?{request.GET.urlencode()}"
+    if request.method != 'POST':
+        return redirect(dashboard_url)
+    
+    wants_json = 'application/json' in request.headers.get('Accept', '')
+    form = BulkActionForm(request.POST)
+    if not form.is_valid():
+        errors = [error for field_errors in form.errors.values() for error in field_errors]
+        if wants_json:
+            return JsonResponse({'errors': errors}, status=400)
+        for error in errors:
+            messages.error(request, error)
+        return redirect(dashboard_url)
+    
+    if form.cleaned_data['select_all']:
+        complaints = matching_complaints(get_complaint_filters(request.GET))
+    else:
+        complaints = Complaint.objects.filter(pk__in=form.cleaned_data['complaint_ids'])
+    
+    assigned_to = form.cleaned_data['assigned_to']
+    if not assigned_to:
+        assigned_to = UNCHANGED
+    elif assigned_to == 'none':
+        assigned_to = None
+    else:
+        assigned_to = int(assigned_to)
+    
+    counts = bulk_update(
+        complaints,
+        status=form.cleaned_data['status'] or None,
+        assigned_to=assigned_to,
+        actor=request.user,
+    )
+    if wants_json:
+        return JsonResponse(counts)
+    messages.success(
+        request,
+        f"{counts['selected']} complaint(s) selected: {counts['status']} status change(s), "
+        f"{counts['assigned_to']} reassignment(s)."
+    )
+    return redirect(dashboard_url)
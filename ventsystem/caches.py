@@ -0,0 +1,55 @@
+"""The CACHES entry built from CACHE_URL.
+
+locmem://[name]            memory of the current process only
+file:///path/to/dir        files on local disk, shared by the processes on one host only
+redis://host:6379/0        Redis (needs the redis package), shared by every host
+memcached://host:11211     Memcached through pymemcache; several servers separated by commas
+dummy://                   no caching
+"""
+import os
+from urllib.parse import unquote, urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+PROCESS_LOCAL_BACKENDS = {BACKENDS['locmem']}
+
+
+def cache_config(url):
+    parts = urlsplit(url)
+    if parts.scheme not in BACKENDS:
+        raise ImproperlyConfigured(
+            f"CACHE_URL scheme must be one of {', '.join(sorted(BACKENDS))}, not {parts.scheme!r}"
+        )
+    config = {'BACKEND': BACKENDS[parts.scheme]}
+    if parts.scheme == 'locmem':
+        config['LOCATION'] = parts.netloc or 'vent'
+    elif parts.scheme == 'file':
+        if not parts.path:
+            raise ImproperlyConfigured('A file:// CACHE_URL needs a directory, e.g. file:///var/tmp/vent-cache')
+        config['LOCATION'] = unquote(parts.path)
+    elif parts.scheme in ('redis', 'rediss'):
+        config['LOCATION'] = url
+    elif parts.scheme == 'memcached':
+        config['LOCATION'] = parts.netloc.split(',')
+
+    config['TIMEOUT'] = int(os.getenv('CACHE_TIMEOUT', 300))
+    if os.getenv('CACHE_KEY_PREFIX'):
+        config['KEY_PREFIX'] = os.getenv('CACHE_KEY_PREFIX')
+    return config
+
+
+def is_shared(config):
+    """Whether every process sees the same cache, which cached sessions and invalidation rely on.
+
+    A file cache counts as shared: it is only configured explicitly, for a single host.
+    """
+    return config['BACKEND'] not in PROCESS_LOCAL_BACKENDS
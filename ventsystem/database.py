@@ -0,0 +1,98 @@
+"""DATABASES entries built from a database URL plus the DB_* environment variables.
+
+PostgreSQL connections come from a psycopg pool (Django 5.1+) when psycopg_pool is installed; each
+process keeps DB_POOL_MIN_SIZE to DB_POOL_MAX_SIZE open connections and requests borrow one for their
+duration. MySQL and SQLite have no pool in Django, so their connections are kept open between
+requests for DB_CONN_MAX_AGE seconds instead, one per worker thread. Health checks make a reused
+connection that the server has dropped get replaced instead of failing the next request.
+"""
+import importlib.util
+import os
+
+import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
+
+POOLED_ENGINES = ('django.db.backends.postgresql',)
+
+
+def env_flag(name, default):
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return value.lower() in ('true', '1', 'yes', 'on')
+
+
+def env_seconds(name, default):
+    """Seconds from the environment; 'None' means no limit, as for CONN_MAX_AGE"""
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    if value == 'None':
+        return None
+    try:
+        return float(value) if '.' in value else int(value)
+    except ValueError:
+        raise ImproperlyConfigured(f'{name} must be a number of seconds or None, not {value!r}')
+
+
+def pool_available():
+    return importlib.util.find_spec('psycopg_pool') is not None
+
+
+def pool_options():
+    """Arguments for psycopg_pool.ConnectionPool"""
+    options = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        'timeout': env_seconds('DB_POOL_TIMEOUT', 10),
+        'max_lifetime': env_seconds('DB_POOL_MAX_LIFETIME', 1800),
+        'max_idle': env_seconds('DB_POOL_MAX_IDLE', 300),
+    }
+    if options['max_size'] < options['min_size']:
+        raise ImproperlyConfigured('DB_POOL_MAX_SIZE must not be smaller than DB_POOL_MIN_SIZE')
+    return options
+
+
+def database_config(url, conn_max_age=60):
+    """One DATABASES entry for url; conn_max_age is the default for DB_CONN_MAX_AGE"""
+    if not url:
+        return {}
+    config = dj_database_url.parse(
+        url,
+        conn_max_age=env_seconds('DB_CONN_MAX_AGE', conn_max_age),
+        conn_health_checks=env_flag('DB_CONN_HEALTH_CHECKS', True),
+    )
+    options = config.setdefault('OPTIONS', {})
+    connect_timeout = os.getenv('DB_CONNECT_TIMEOUT')
+    if connect_timeout and config['ENGINE'] != 'django.db.backends.sqlite3':
+        options['connect_timeout'] = int(connect_timeout)
+
+    if config['ENGINE'] in POOLED_ENGINES and env_flag('DB_POOL', pool_available()):
+        options['pool'] = pool_options()
+        # The pool owns connection reuse; Django refuses persistent connections on top of it
+        config['CONN_MAX_AGE'] = 0
+    return config
+
+
+def pool_settings(settings_dict):
+    """The pool arguments in a DATABASES entry, or None if it is not pooled"""
+    pool = settings_dict.get('OPTIONS', {}).get('pool')
+    if not pool:
+        return None
+    return pool if isinstance(pool, dict) else {}
+
+
+def replica_configs(environ, conn_max_age=60):
+    """A DATABASES entry per <NAME>_DATABASE_URL variable besides DATABASE_URL, keyed by the lower-cased name"""
+    replicas = {}
+    for name, url in sorted(environ.items()):
+        if not name.endswith('_DATABASE_URL') or not url:
+            continue
+        alias = name[:-len('_DATABASE_URL')].lower()
+        if alias == 'default':
+            raise ImproperlyConfigured('DEFAULT_DATABASE_URL is not allowed; the primary is DATABASE_URL')
+        config = database_config(url, conn_max_age)
+        # Tests read the primary's test database through the replica alias
+        config['TEST'] = {**config.get('TEST', {}), 'MIRROR': 'default'}
+        replicas[alias] = config
+    return replicas
@@ -0,0 +1,181 @@
+import json
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+
+logger = logging.getLogger('ventsystem.performance')
+
+# Metrics of the sampled request being handled in the current thread or task, if any
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Query, template and view timings collected for one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        # SQL text -> [executions, distinct parameter sets]
+        self.statements = {}
+
+    def record_query(self, sql, params, duration):
+        self.queries += 1
+        self.db_time += duration
+        seen = self.statements.setdefault(sql, [0, set()])
+        seen[0] += 1
+        try:
+            seen[1].add(hash(tuple(params)) if params is not None else None)
+        except TypeError:
+            seen[1].add(repr(params))
+
+    def repeated_queries(self, threshold):
+        """Statements run at least threshold times with differing parameters, the usual N+1 shape"""
+        return [
+            {'sql': sql, 'count': count}
+            for sql, (count, param_sets) in self.statements.items()
+            if count >= threshold and len(param_sets) > 1
+        ]
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper that adds each query's duration to the current request's metrics, if sampled"""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, None if many else params, time.perf_counter() - start)
+
+
+def install_query_timer(connection, **kwargs):
+    # Connections are per thread, and async views query from worker threads, so every connection
+    # carries the wrapper and the context variable decides which request a query belongs to
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def install_query_timers():
+    """Cover connections this thread opened before the connection_created hook was connected"""
+    for connection in connections.all():
+        install_query_timer(connection)
+
+
+_original_render = Template.render
+
+
+def _timed_render(self, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return _original_render(self, context)
+    # Included and extended templates render inside their parent; only time the outermost one
+    metrics.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        metrics.template_depth -= 1
+        if not metrics.template_depth:
+            metrics.template_time += time.perf_counter() - start
+
+
+def install():
+    """Hook query and template timing into Django; called when PerformanceMiddleware is created"""
+    connection_created.connect(install_query_timer, dispatch_uid='ventsystem.instrumentation')
+    Template.render = _timed_render
+
+
+def server_timing(metrics, view_time):
+    return ', '.join([
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f'tpl;dur={metrics.template_time * 1000:.1f}',
+        f'view;dur={view_time * 1000:.1f}',
+    ])
+
+
+class PerformanceMiddleware:
+    """Time a sample of requests: SQL count and time, template time and view time.
+
+    Sampled responses get a Server-Timing header. Requests slower than PERF_SLOW_REQUEST_MS, or
+    that repeat one statement PERF_N_PLUS_ONE_THRESHOLD times with different parameters, are
+    logged as JSON to the ventsystem.performance logger.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install()
+
+    def sampled(self):
+        sample_rate = getattr(settings, 'PERF_SAMPLE_RATE', 0)
+        return sample_rate and random.random() < sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        install_query_timers()
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        # The async ORM queries from the request's worker thread, which inherits the context below
+        await sync_to_async(install_query_timers)()
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, view_time):
+        response['Server-Timing'] = server_timing(metrics, view_time)
+        self.log(request, response, metrics, view_time)
+        return response
+
+    def log(self, request, response, metrics, view_time):
+        slow_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', 500)
+        repeated = metrics.repeated_queries(getattr(settings, 'PERF_N_PLUS_ONE_THRESHOLD', 5))
+        view_ms = view_time * 1000
+        if view_ms < slow_ms and not repeated:
+            return
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'view_ms': round(view_ms, 1),
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'template_ms': round(metrics.template_time * 1000, 1),
+            'queries': metrics.queries,
+            'repeated_queries': repeated,
+        }
+        logger.warning(json.dumps(record), extra={'performance': record})
@@ -0,0 +1,148 @@
+"""Send dashboard, export and statistics reads to read replicas; everything else uses the primary.
+
+Reads only go to a replica inside replica_reads() or a view decorated with reads_from_replica, and
+only when REPLICA_DATABASES lists any. A request that writes, and the same client's requests for
+REPLICA_STICKY_SECONDS afterwards, read from the primary so they see their own changes despite
+replication lag. Reads inside a transaction on the primary also stay there, as do the tables in
+PRIMARY_ONLY_MODELS.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'vent_primary_until'
+
+# Small tables whose rows are kept in shared caches (stat cards, department lookups). A replica that
+# has not caught up with the write behind an invalidation would get its stale rows cached, so these
+# are always read from the primary.
+PRIMARY_ONLY_MODELS = {'complaints.complaintstat', 'complaints.department'}
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# A mutable object rather than flags, so a write in a sync_to_async thread is seen by the request
+routing_state = ContextVar('routing_state', default=None)
+replica_scope = ContextVar('replica_scope', default=False)
+
+
+def replica_aliases():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def read_alias():
+    """The database a replica-safe read should use right now"""
+    replicas = replica_aliases()
+    state = routing_state.get()
+    if not replicas or (state is not None and (state.pinned or state.wrote)):
+        return DEFAULT_DB_ALIAS
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+@contextmanager
+def replica_reads():
+    token = replica_scope.set(True)
+    try:
+        yield
+    finally:
+        replica_scope.reset(token)
+
+
+def reads_from_replica(view):
+    """Run a sync or async view's queries inside replica_reads()"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            with replica_reads():
+                return await view(*args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with replica_reads():
+                return view(*args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from wherever the instance was loaded
+            return instance._state.db
+        if replica_scope.get() and model._meta.label_lower not in PRIMARY_ONLY_MODELS:
+            return read_alias()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the primary's schema through replication
+        return db == DEFAULT_DB_ALIAS
+
+
+class StickyPrimaryMiddleware:
+    """Pin a client to the primary for REPLICA_STICKY_SECONDS after a request of theirs writes"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replica_aliases():
+            return self.get_response(request)
+        state = self.state(request)
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.pin(state, response)
+
+    async def __acall__(self, request):
+        if not replica_aliases():
+            return await self.get_response(request)
+        state = self.state(request)
+        token = routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.pin(state, response)
+
+    def state(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        return RoutingState(pinned=pinned_until > time.time())
+
+    def pin(self, state, response):
+        if state.wrote:
+            window = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+            response.set_cookie(PIN_COOKIE, f'{time.time() + window:.0f}', max_age=window, httponly=True, samesite='Lax')
+        return response
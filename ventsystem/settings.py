@@ -1,7 +1,9 @@
 from pathlib import Path
 import os
 from dotenv import load_dotenv
-import dj_database_url
+
+from . import caches
+from .database import database_config, env_flag, replica_configs
 
 # Load environment variables from .env file
 load_dotenv()
@@ -24,11 +26,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ventsystem.instrumentation.PerformanceMiddleware',
+    'ventsystem.routers.StickyPrimaryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -39,25 +44,71 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compiled templates are kept in memory instead of being re-parsed on every render
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'ventsystem.wsgi.application'
+ASGI_APPLICATION = 'ventsystem.asgi.application'
+
+# Route the dashboards and complaint pages to their async views; enable when serving with uvicorn (ASGI)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
 
+# Live dashboard updates (async mode only): local:// keeps events within each process, a redis:// URL
+# shares them between processes; see complaints.live
+LIVE_EVENTS_URL = os.getenv('LIVE_EVENTS_URL', 'local://')
+LIVE_EVENTS_KEEPALIVE = int(os.getenv('LIVE_EVENTS_KEEPALIVE', 15))  # seconds
 
 
+
+# Pooling, persistent connections and health checks come from the DB_* variables; see ventsystem.database.
+# Async mode runs each request on a fresh thread, where a persistent connection would never be reused.
 DATABASES = {
-    'default': dj_database_url.config(default=os.getenv('DATABASE_URL'))
+    'default': database_config(os.getenv('DATABASE_URL'), conn_max_age=0 if ASYNC_VIEWS else 60)
+}
+
+# Read replicas: every other <NAME>_DATABASE_URL (e.g. REPLICA_DATABASE_URL) adds a database alias
+# '<name>' that serves dashboard, export and statistics reads; see ventsystem.routers
+DATABASES.update(replica_configs(os.environ, conn_max_age=0 if ASYNC_VIEWS else 60))
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['ventsystem.routers.PrimaryReplicaRouter']
+# After a request writes, the client reads from the primary for this long (covers replication lag)
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+# Shared by sessions, the user cache, dashboard fragments and lookups; see ventsystem.caches for URLs.
+# Without CACHE_URL each process caches in its own memory.
+CACHES = {
+    'default': caches.cache_config(os.getenv('CACHE_URL') or 'locmem://'),
 }
 
+# Cached users, departments and dashboard fragments are dropped on writes, which only works if the
+# deletion reaches every process. With a process-local cache they are not cached at all; set
+# CACHE_SHARED=True to override that when a single process serves the site.
+CACHE_SHARED = env_flag('CACHE_SHARED', caches.is_shared(CACHES['default']))
+
+# Sessions are read from the cache and written to both, so a request no longer selects its session row.
+# A session cached in one process's memory would go stale when another process changes it, so
+# without a shared cache sessions stay in the database.
+SESSION_ENGINE = os.getenv('SESSION_ENGINE') or (
+    'django.contrib.sessions.backends.cached_db' if CACHE_SHARED else 'django.contrib.sessions.backends.db'
+)
+
+# Template fragments are only cached with a shared cache; see complaints.fragments
+if not CACHE_SHARED:
+    CACHES['template_fragments'] = caches.cache_config('dummy://')
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -74,6 +125,10 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Loads the profile with the user; with a shared cache, keeps what requests need of both briefly
+AUTHENTICATION_BACKENDS = ['accounts.backends.ProfileBackend']
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', 60))  # seconds
+
 
 LANGUAGE_CODE = 'en-us'
 
@@ -92,6 +147,26 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Complaint attachments are stored once per distinct content, see complaints.storage
+    'attachments': {'BACKEND': 'complaints.storage.ContentAddressedStorage'},
+}
+
+# How complaint attachments are sent after the permission check: 'django' streams them from the
+# app, 'accel' hands off to nginx (X-Accel-Redirect), 'sendfile' to Apache/lighttpd (X-Sendfile)
+ATTACHMENT_SERVE_MODE = os.getenv('ATTACHMENT_SERVE_MODE', 'django')
+ATTACHMENT_ACCEL_PREFIX = os.getenv('ATTACHMENT_ACCEL_PREFIX', '/protected-media/')
+
+# Image attachment thumbnails (complaints.thumbnails), written under MEDIA_ROOT/thumbnails
+THUMBNAIL_FORMAT = os.getenv('THUMBNAIL_FORMAT', 'WEBP')  # or JPEG
+THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', 80))
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+# Dashboard fragments are also invalidated by signals, so the timeout only bounds memory use
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv('FRAGMENT_CACHE_TIMEOUT', 600))  # seconds
+
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
@@ -104,4 +179,31 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 
+# Outbox worker (python manage.py send_queued_email)
+EMAIL_OUTBOX_RATE_LIMIT = float(os.getenv('EMAIL_OUTBOX_RATE_LIMIT', 5))  # messages per second
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.getenv('EMAIL_OUTBOX_RETRY_DELAY', 60))  # seconds, doubled per attempt
+EMAIL_OUTBOX_MAX_BACKOFF = int(os.getenv('EMAIL_OUTBOX_MAX_BACKOFF', 3600))
+EMAIL_OUTBOX_RETENTION_DAYS = int(os.getenv('EMAIL_OUTBOX_RETENTION_DAYS', 30))  # sent messages are then purged
+
+# Request instrumentation (ventsystem.instrumentation)
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', 0))  # fraction of requests timed; off unless set
+PERF_SLOW_REQUEST_MS = float(os.getenv('PERF_SLOW_REQUEST_MS', 500))
+PERF_N_PLUS_ONE_THRESHOLD = int(os.getenv('PERF_N_PLUS_ONE_THRESHOLD', 5))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'ventsystem.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERF_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -16,8 +16,6 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
     # Move Django admin to a different path to free '/admin/' for custom dashboard
@@ -25,7 +23,3 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),
     path('', include('complaints.urls')),
 ]
-
-# Serve media files during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)